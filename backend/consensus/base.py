@@ -2,12 +2,36 @@
 
 DEFAULT_VALIDATORS_COUNT = 5
 DEFAULT_CONSENSUS_SLEEP_TIME = 5
+# With notifications enabled the full scan of pending transactions is only a safety net (e.g. for missed notifications)
+DEFAULT_PENDING_TRANSACTIONS_SCAN_TIME = 60
+# Claimed transactions are renewed on every scan, so the lease must outlive the scan period
+DEFAULT_CLAIM_LEASE_TIME = 5 * DEFAULT_PENDING_TRANSACTIONS_SCAN_TIME
+DEFAULT_CLAIM_BATCH_SIZE = 100
+# Transactions are only claimed while fewer than this are waiting in the queues, the rest stay pending in the database
+DEFAULT_MAX_QUEUED_TRANSACTIONS = 1000
+# Maximum number of transactions (of different contracts) being executed at the same time
+DEFAULT_CONSENSUS_MAX_CONCURRENCY = 10
+# Validators that don't finish in this time (in seconds) are left out of the vote, see `_exec_validators`
+DEFAULT_VALIDATOR_TIMEOUT = 600
+# Number of partitions contract addresses are spread over when several consensus workers share the database
+DEFAULT_CONSENSUS_PARTITIONS = 16
+# Consensus workers running in the JSON-RPC server process, 0 leaves all the processing to standalone workers (see `backend/consensus/worker.py`)
+DEFAULT_CONSENSUS_LOCAL_WORKERS = 1
+# Leader rotations executed in parallel, 1 runs them one after the other
+DEFAULT_CONSENSUS_SPECULATIVE_LEADERS = 1
+# A partition is only taken over once the claims of its previous owner have expired, so that its transactions are not executed out of order
+DEFAULT_PARTITION_LEASE_TIME = DEFAULT_CLAIM_LEASE_TIME
 
 import asyncio
 from collections import deque
+from enum import Enum
 import json
+import os
+import socket
+import time
 import traceback
 from typing import Callable, Iterator
+from uuid import uuid4
 
 from sqlalchemy.orm import Session
 from backend.consensus.vrf import get_validators_for_transaction
@@ -17,6 +41,11 @@ from backend.database_handler.transactions_processor import (
     TransactionsProcessor,
     TransactionStatus,
 )
+from backend.database_handler.transactions_listener import TransactionsListener
+from backend.database_handler.consensus_partitions import (
+    ConsensusPartitionsRegistry,
+    address_partition,
+)
 from backend.database_handler.accounts_manager import AccountsManager
 from backend.database_handler.types import ConsensusData
 from backend.domain.types import (
@@ -27,6 +56,8 @@ from backend.domain.types import (
     Validator,
 )
 from backend.node.base import Node
+from backend.node.genvm.base import GenVM
+from backend.node.genvm.llm_clients import close_llm_clients
 from backend.node.genvm.types import ExecutionMode, Receipt, Vote
 from backend.protocol_rpc.message_handler.base import MessageHandler
 from backend.protocol_rpc.message_handler.types import (
@@ -64,73 +95,298 @@ def node_factory(
     )
 
 
+def consensus_from_env(
+    get_session: Callable[[], Session],
+    msg_handler: MessageHandler,
+    transactions_listener: TransactionsListener | None = None,
+    owner: str | None = None,
+) -> "ConsensusAlgorithm":
+    """Creates a consensus worker configured by the `CONSENSUS_*` environment variables (see `.env.example`)"""
+    return ConsensusAlgorithm(
+        get_session,
+        msg_handler,
+        transactions_listener,
+        owner=owner,
+        max_concurrency=int(
+            os.getenv("CONSENSUS_MAX_CONCURRENCY", DEFAULT_CONSENSUS_MAX_CONCURRENCY)
+        ),
+        max_queued_transactions=int(
+            os.getenv(
+                "CONSENSUS_MAX_QUEUED_TRANSACTIONS", DEFAULT_MAX_QUEUED_TRANSACTIONS
+            )
+        ),
+        partition_count=int(
+            os.getenv("CONSENSUS_PARTITIONS", DEFAULT_CONSENSUS_PARTITIONS)
+        ),
+        validator_timeout=float(
+            os.getenv("CONSENSUS_VALIDATOR_TIMEOUT", DEFAULT_VALIDATOR_TIMEOUT)
+        ),
+        deterministic_validation=DeterministicValidationMode(
+            os.getenv(
+                "CONSENSUS_DETERMINISTIC_VALIDATION",
+                DeterministicValidationMode.COMMITTEE.value,
+            )
+        ),
+        speculative_leaders=int(
+            os.getenv(
+                "CONSENSUS_SPECULATIVE_LEADERS", DEFAULT_CONSENSUS_SPECULATIVE_LEADERS
+            )
+        ),
+    )
+
+
+class DeterministicValidationMode(Enum):
+    """How transactions whose leader execution didn't use non-deterministic primitives are validated"""
+
+    # Same as any other transaction, all validators re-execute it
+    COMMITTEE = "committee"
+    # Only one validator re-executes it and has to agree with the leader, since honest nodes necessarily get the same result
+    SINGLE_VALIDATOR = "single_validator"
+
+
 class ConsensusAlgorithm:
     def __init__(
         self,
         get_session: Callable[[], Session],
         msg_handler: MessageHandler,
+        transactions_listener: TransactionsListener | None = None,
+        owner: str | None = None,
+        max_concurrency: int = DEFAULT_CONSENSUS_MAX_CONCURRENCY,
+        max_queued_transactions: int = DEFAULT_MAX_QUEUED_TRANSACTIONS,
+        partition_count: int | None = None,
+        validator_timeout: float | None = DEFAULT_VALIDATOR_TIMEOUT,
+        deterministic_validation: DeterministicValidationMode = DeterministicValidationMode.COMMITTEE,
+        speculative_leaders: int = DEFAULT_CONSENSUS_SPECULATIVE_LEADERS,
     ):
         self.get_session = get_session
         self.msg_handler = msg_handler
+        self.transactions_listener = transactions_listener
+        # Identifies this consensus in the transactions and partitions it claims, it must be unique among the running consensus workers. A stable owner (e.g. set per container) releases the claims of its previous run on restart, otherwise they are taken over once their leases expire
+        self.owner = owner or default_owner()
         self.queues: dict[str, asyncio.Queue] = {}
-
-    def run_crawl_snapshot_loop(self):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(self._crawl_snapshot())
-        loop.close()
+        self.queued_transaction_hashes: set[str] = set()
+        # Claimed by us and not committed yet, their claims are renewed with the queued ones
+        self.executing_transaction_hashes: set[str] = set()
+        self.max_queued_transactions = max_queued_transactions
+        # One worker per address with queued transactions, see `_process_queue`
+        self.workers: dict[str, asyncio.Task] = {}
+        self.concurrency_limit = asyncio.Semaphore(max_concurrency)
+        # When set, this consensus only claims the transactions of the partitions it holds, see `ConsensusPartitionsRegistry`
+        self.partition_count = partition_count
+        self.partitions: list[int] | None = None
+        self.validator_timeout = validator_timeout
+        self.deterministic_validation = deterministic_validation
+        # Number of leader rotations executed in parallel, trading LLM calls for latency when the first leaders fail to reach consensus
+        self.speculative_leaders = speculative_leaders
 
     async def _crawl_snapshot(self):
+        # Our queues are empty, so whatever we claimed in a previous run has to be claimed again
+        with self.get_session() as session:
+            TransactionsProcessor(session).release_transaction_claims(self.owner)
+            session.commit()
+
+        if self.transactions_listener is None:
+            # Without notifications we can only poll
+            while True:
+                self._acquire_partitions()
+                self._renew_claims()
+                await self._claim_pending_transactions()
+                await asyncio.sleep(DEFAULT_CONSENSUS_SLEEP_TIME)
+
+        with self.transactions_listener as listener:
+            # Start listening before the first scan so that no transaction falls in between
+            next_scan_at = time.monotonic()
+            while True:
+                if time.monotonic() >= next_scan_at:
+                    self._acquire_partitions()
+                    self._renew_claims()
+                    claimed_all = await self._claim_pending_transactions()
+                    next_scan_at = time.monotonic() + (
+                        DEFAULT_PENDING_TRANSACTIONS_SCAN_TIME
+                        if claimed_all
+                        # The queues are full, notifications of the transactions left behind are lost so we have to scan for them
+                        else DEFAULT_CONSENSUS_SLEEP_TIME
+                    )
+
+                transaction_hashes = await listener.wait_for_transactions(
+                    timeout=max(next_scan_at - time.monotonic(), 0)
+                )
+                if transaction_hashes:
+                    if not await self._claim_pending_transactions(transaction_hashes):
+                        next_scan_at = min(
+                            next_scan_at,
+                            time.monotonic() + DEFAULT_CONSENSUS_SLEEP_TIME,
+                        )
+
+    async def _claim_pending_transactions(
+        self, transaction_hashes: list[str] | None = None
+    ) -> bool:
+        """Claim and enqueue pending transactions until there are no more or the queues are full. Returns False in the latter case."""
         while True:
+            limit = min(
+                DEFAULT_CLAIM_BATCH_SIZE,
+                self.max_queued_transactions - len(self.queued_transaction_hashes),
+            )
+            if limit <= 0:
+                return False
+
             with self.get_session() as session:
-                chain_snapshot = ChainSnapshot(session)
-                pending_transactions = chain_snapshot.get_pending_transactions()
-                for transaction in pending_transactions:
-                    transaction = transaction_from_dict(transaction)
-                    address = transaction.to_address or transaction.from_address
+                transactions = TransactionsProcessor(
+                    session
+                ).claim_pending_transactions(
+                    self.owner,
+                    DEFAULT_CLAIM_LEASE_TIME,
+                    limit,
+                    transaction_hashes,
+                    self.partitions,
+                    self.partition_count,
+                )
+                session.commit()
+            await self._enqueue_transactions(transactions)
 
-                    if address not in self.queues:
-                        self.queues[address] = asyncio.Queue()
-                    await self.queues[address].put(transaction)
-            await asyncio.sleep(DEFAULT_CONSENSUS_SLEEP_TIME)
+            if len(transactions) < limit:
+                return True
+
+    def _acquire_partitions(self):
+        if self.partition_count is None:
+            return
+        with self.get_session() as session:
+            registry = ConsensusPartitionsRegistry(session)
+            partitions = registry.acquire_partitions(
+                self.owner, self.partition_count, DEFAULT_PARTITION_LEASE_TIME
+            )
+
+            # Hand over what exceeds our fair share (e.g. after another worker joined), but only partitions we are not executing transactions for
+            excess = len(partitions) - registry.get_fair_share(
+                self.owner, self.partition_count
+            )
+            busy_partitions = {
+                address_partition(address, self.partition_count)
+                for address in self.workers
+            }
+            released = [
+                partition
+                for partition in reversed(partitions)
+                if partition not in busy_partitions
+            ][: max(excess, 0)]
+            registry.release_partitions(self.owner, released)
+            session.commit()
+
+        self.partitions = [
+            partition for partition in partitions if partition not in released
+        ]
+
+    def _unregister(self):
+        # Hand our partitions and the transactions we claimed over to the remaining workers right away, instead of waiting for the leases to expire
+        with self.get_session() as session:
+            TransactionsProcessor(session).release_transaction_claims(self.owner)
+            if self.partition_count is not None:
+                ConsensusPartitionsRegistry(session).unregister(self.owner)
+            session.commit()
+        self.partitions = None
+
+    def _renew_claims(self):
+        transaction_hashes = (
+            self.queued_transaction_hashes | self.executing_transaction_hashes
+        )
+        if not transaction_hashes:
+            return
+        with self.get_session() as session:
+            TransactionsProcessor(session).renew_transaction_claims(
+                self.owner,
+                DEFAULT_CLAIM_LEASE_TIME,
+                list(transaction_hashes),
+            )
+            session.commit()
+
+    def _release_claims(self, transaction_hashes: list[str]):
+        """Let other workers claim transactions we won't process, instead of leaving them until their leases expire"""
+        with self.get_session() as session:
+            TransactionsProcessor(session).release_transaction_claims(
+                self.owner, transaction_hashes
+            )
+            session.commit()
+
+    async def _enqueue_transactions(self, transactions: list[dict]):
+        for transaction in transactions:
+            transaction = transaction_from_dict(transaction)
+            if (
+                transaction.hash in self.queued_transaction_hashes
+                or transaction.hash in self.executing_transaction_hashes
+            ):
+                # Claimed again by us after its lease expired, it's already ours and on its way
+                continue
+            address = transaction.to_address or transaction.from_address
+
+            if address not in self.queues:
+                self.queues[address] = asyncio.Queue()
+            self.queued_transaction_hashes.add(transaction.hash)
+            await self.queues[address].put(transaction)
+
+            if address not in self.workers:
+                self.workers[address] = asyncio.create_task(
+                    self._process_queue(address)
+                )
 
     def run_consensus_loop(self):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(self._run_consensus())
-        loop.close()
+        try:
+            loop.run_until_complete(self._run_consensus())
+        finally:
+            self._unregister()
+            loop.run_until_complete(close_llm_clients())
+            loop.close()
 
     async def _run_consensus(self):
-        asyncio.set_event_loop(asyncio.new_event_loop())
-        # watch out! as ollama uses GPU resources and webrequest aka selenium uses RAM
+        # The crawler feeds the queues and starts their workers, there is nothing else to wait for
+        await self._crawl_snapshot()
+
+    async def _process_queue(self, address: str):
+        """
+        Execute the transactions queued for `address` one after the other, in FIFO order.
+
+        The next transaction starts as soon as the previous one is committed, independently of what other addresses are doing.
+        The worker exits once the queue is drained and is started again by `_enqueue_transactions`.
+        """
+        queue = self.queues[address]
+        try:
+            # Nothing is awaited between the last `empty()` check and the removal of the worker, so no transaction can be left behind
+            while not queue.empty():
+                # watch out! as ollama uses GPU resources and webrequest aka selenium uses RAM
+                async with self.concurrency_limit:
+                    # This worker is the only consumer of the queue, so it can't have been drained meanwhile
+                    transaction = queue.get_nowait()
+                    self.queued_transaction_hashes.discard(transaction.hash)
+                    self.executing_transaction_hashes.add(transaction.hash)
+                    try:
+                        await self._exec_transaction_with_session(transaction)
+                    except Exception as e:
+                        print("Error running consensus", e)
+                        print(traceback.format_exc())
+                        # The session was rolled back, the transaction is still pending and claimed by us
+                        self._release_claims([transaction.hash])
+                    finally:
+                        self.executing_transaction_hashes.discard(transaction.hash)
+        finally:
+            del self.workers[address]
+            # Don't keep a queue around for every address ever seen
+            if queue.empty():
+                del self.queues[address]
+
+    async def _exec_transaction_with_session(self, transaction: Transaction):
+        # sessions cannot be shared between coroutines, we need to create a new session for each coroutine
+        # https://docs.sqlalchemy.org/en/20/orm/session_basics.html#is-the-session-thread-safe-is-asyncsession-safe-to-share-in-concurrent-tasks
         # TODO: async sessions would be a good idea to not block the current thread
-        while True:
-            try:
-                async with asyncio.TaskGroup() as tg:
-                    for queue in [q for q in self.queues.values() if not q.empty()]:
-                        # sessions cannot be shared between coroutines, we need to create a new session for each coroutine
-                        # https://docs.sqlalchemy.org/en/20/orm/session_basics.html#is-the-session-thread-safe-is-asyncsession-safe-to-share-in-concurrent-tasks
-                        transaction = await queue.get()
-                        with self.get_session() as session:
-
-                            async def exec_transaction_with_session_handling():
-                                await self.exec_transaction(
-                                    transaction,
-                                    TransactionsProcessor(session),
-                                    ChainSnapshot(session),
-                                    AccountsManager(session),
-                                    lambda contract_address, session=session: ContractSnapshot(
-                                        contract_address, session
-                                    ),
-                                )
-                                session.commit()
-
-                            tg.create_task(exec_transaction_with_session_handling())
-
-            except Exception as e:
-                print("Error running consensus", e)
-                print(traceback.format_exc())
-            await asyncio.sleep(DEFAULT_CONSENSUS_SLEEP_TIME)
+        with self.get_session() as session:
+            await self.exec_transaction(
+                transaction,
+                TransactionsProcessor(session),
+                ChainSnapshot(session),
+                AccountsManager(session),
+                lambda contract_address: ContractSnapshot(contract_address, session),
+            )
+            session.commit()
 
     async def exec_transaction(
         self,
@@ -152,15 +408,6 @@ class ConsensusAlgorithm:
         ] = node_factory,
     ):
         msg_handler = self.msg_handler
-        if (
-            transactions_processor.get_transaction_by_hash(transaction.hash)["status"]
-            != TransactionStatus.PENDING.value
-        ):
-            # This is a patch for a TOCTOU problem we have https://github.com/yeagerai/genlayer-simulator/issues/387
-            # Problem: Pending transactions are checked by `_crawl_snapshot`, which appends them to queues. These queues are consumed by `_run_consensus`, which processes the transactions. This means that a transaction can be processed multiple times, since `_crawl_snapshot` can append the same transaction to the queue multiple times.
-            # Partial solution: This patch checks if the transaction is still pending before processing it. This is not the best solution, but we'll probably refactor the whole consensus algorithm in the short term.
-            print(" ~ ~ ~ ~ ~ TRANSACTION ALREADY IN PROCESS: ", transaction)
-            return
 
         print(" ~ ~ ~ ~ ~ EXECUTING TRANSACTION: ", transaction)
 
@@ -178,139 +425,161 @@ class ConsensusAlgorithm:
                 "No validators found for transaction, waiting for next round: ",
                 transaction,
             )
+            # It's picked up again by the next scan, by whichever worker claims it
+            transactions_processor.release_transaction_claims(
+                self.owner, [transaction.hash]
+            )
             return
 
         involved_validators = get_validators_for_transaction(
             all_validators, DEFAULT_VALIDATORS_COUNT
         )
 
-        for validators in rotate(involved_validators):
-            consensus_data = ConsensusData(
-                final=False,
-                votes={},
-                leader_receipt=None,
-                validators=[],
-            )
-            transactions_processor.set_transaction_result(
-                transaction.hash,
-                consensus_data.to_dict(),
-            )
-            # Update transaction status
-            ConsensusAlgorithm.dispatch_transaction_status_update(
-                transactions_processor,
-                transaction.hash,
-                TransactionStatus.PROPOSING,
-                msg_handler,
-            )
-            transactions_processor.create_rollup_transaction(transaction.hash)
-
-            [leader, *remaining_validators] = validators
+        # Rounds are consumed in rotation order, but up to `speculative_leaders` of them execute at the same time, see `_exec_round`
+        rotations = rotate(involved_validators)
+        rounds: deque[
+            tuple[list[dict], ContractSnapshot, asyncio.Future, asyncio.Task]
+        ] = deque()
 
+        def start_next_round():
+            validators = next(rotations, None)
+            if validators is None:
+                return
             if transaction.leader_only:
-                remaining_validators = []
-
-            num_validators = len(remaining_validators) + 1
-
+                validators = validators[:1]
             contract_snapshot = contract_snapshot_factory(transaction.to_address)
-
-            # Create Leader
-            leader_node = node_factory(
-                leader,
-                ExecutionMode.LEADER,
-                contract_snapshot,
-                None,
-                msg_handler,
-                contract_snapshot_factory,
-            )
-
-            # Leader executes transaction
-            leader_receipt = await leader_node.exec_transaction(transaction)
-            votes = {leader["address"]: leader_receipt.vote.value}
-            consensus_data.votes = votes
-            consensus_data.leader_receipt = leader_receipt
-            transactions_processor.set_transaction_result(
-                transaction.hash,
-                consensus_data.to_dict(),
+            leader_receipt_future = asyncio.get_running_loop().create_future()
+            round_task = asyncio.create_task(
+                self._exec_round(
+                    transaction,
+                    validators,
+                    contract_snapshot,
+                    leader_receipt_future,
+                    contract_snapshot_factory,
+                    node_factory,
+                )
             )
-            # Update transaction status
-            ConsensusAlgorithm.dispatch_transaction_status_update(
-                transactions_processor,
-                transaction.hash,
-                TransactionStatus.COMMITTING,
-                msg_handler,
+            rounds.append(
+                (validators, contract_snapshot, leader_receipt_future, round_task)
             )
-            transactions_processor.create_rollup_transaction(transaction.hash)
 
-            # Create Validators
-            validator_nodes = [
-                node_factory(
-                    validator,
-                    ExecutionMode.VALIDATOR,
-                    contract_snapshot,
-                    leader_receipt,
+        for _ in range(self.speculative_leaders):
+            start_next_round()
+
+        try:
+            while rounds:
+                # The round stays in `rounds` until it's consumed, so that it's cleaned up if it raises
+                validators, contract_snapshot, leader_receipt_future, round_task = (
+                    rounds[0]
+                )
+                consensus_data = ConsensusData(
+                    final=False,
+                    votes={},
+                    leader_receipt=None,
+                    validators=[],
+                )
+                transactions_processor.set_transaction_result(
+                    transaction.hash,
+                    consensus_data.to_dict(),
+                )
+                # Update transaction status
+                ConsensusAlgorithm.dispatch_transaction_status_update(
+                    transactions_processor,
+                    transaction.hash,
+                    TransactionStatus.PROPOSING,
                     msg_handler,
-                    contract_snapshot_factory,
                 )
-                for validator in remaining_validators
-            ]
-
-            # Validators execute transaction
-            validation_tasks = [
-                (
-                    validator.exec_transaction(transaction)
-                )  # watch out! as ollama uses GPU resources and webrequest aka selenium uses RAM
-                for validator in validator_nodes
-            ]
-            validation_results = await asyncio.gather(*validation_tasks)
-
-            ConsensusAlgorithm.dispatch_transaction_status_update(
-                transactions_processor,
-                transaction.hash,
-                TransactionStatus.REVEALING,
-                msg_handler,
-            )
+                transactions_processor.create_rollup_transaction(transaction.hash)
+
+                leader = validators[0]
 
-            for i, validation_result in enumerate(validation_results):
-                votes[validator_nodes[i].address] = validation_result.vote.value
-                single_reveal_votes = {
-                    leader["address"]: leader_receipt.vote.value,
-                    validator_nodes[i].address: validation_result.vote.value,
-                }
-                consensus_data.votes = single_reveal_votes
-                consensus_data.validators = [validation_result]
+                # Leader executes transaction
+                leader_receipt = await leader_receipt_future
+                votes = {leader["address"]: leader_receipt.vote.value}
+                consensus_data.votes = votes
+                consensus_data.leader_receipt = leader_receipt
                 transactions_processor.set_transaction_result(
                     transaction.hash,
                     consensus_data.to_dict(),
                 )
+                # Update transaction status
+                ConsensusAlgorithm.dispatch_transaction_status_update(
+                    transactions_processor,
+                    transaction.hash,
+                    TransactionStatus.COMMITTING,
+                    msg_handler,
+                )
                 transactions_processor.create_rollup_transaction(transaction.hash)
 
-            if (
-                len([vote for vote in votes.values() if vote == Vote.AGREE.value])
-                >= num_validators // 2
-            ):
-                break  # Consensus reached
+                # Validators execute transaction
+                validations, agree_threshold = await round_task
+                validation_results = [receipt for _, receipt in validations]
 
-            print(
-                "Consensus not reached for transaction, rotating leader: ", transaction
-            )
+                ConsensusAlgorithm.dispatch_transaction_status_update(
+                    transactions_processor,
+                    transaction.hash,
+                    TransactionStatus.REVEALING,
+                    msg_handler,
+                )
 
-        else:  # this block is executed if the loop above is not broken
-            print("Consensus not reached for transaction: ", transaction)
-            msg_handler.send_message(
-                LogEvent(
-                    "consensus_failed",
-                    EventType.ERROR,
-                    EventScope.CONSENSUS,
-                    "Failed to reach consensus",
+                for validator_node, validation_result in validations:
+                    votes[validator_node.address] = validation_result.vote.value
+                    single_reveal_votes = {
+                        leader["address"]: leader_receipt.vote.value,
+                        validator_node.address: validation_result.vote.value,
+                    }
+                    consensus_data.votes = single_reveal_votes
+                    consensus_data.validators = [validation_result]
+                    transactions_processor.set_transaction_result(
+                        transaction.hash,
+                        consensus_data.to_dict(),
+                    )
+                    transactions_processor.create_rollup_transaction(transaction.hash)
+
+                if (
+                    len([vote for vote in votes.values() if vote == Vote.AGREE.value])
+                    >= agree_threshold
+                ):
+                    break  # Consensus reached
+
+                print(
+                    "Consensus not reached for transaction, rotating leader: ",
+                    transaction,
                 )
+                rounds.popleft()
+                start_next_round()
+
+            else:  # this block is executed if the loop above is not broken
+                print("Consensus not reached for transaction: ", transaction)
+                msg_handler.send_message(
+                    LogEvent(
+                        "consensus_failed",
+                        EventType.ERROR,
+                        EventScope.CONSENSUS,
+                        "Failed to reach consensus",
+                    )
+                )
+                ConsensusAlgorithm.dispatch_transaction_status_update(
+                    transactions_processor,
+                    transaction.hash,
+                    TransactionStatus.UNDETERMINED,
+                    msg_handler,
+                )
+                return
+        finally:
+            # Discard the speculative rounds that are no longer needed, or left behind by a round that raised
+            for _, _, _, round_task in rounds:
+                round_task.cancel()
+            await asyncio.gather(
+                *(round_task for _, _, _, round_task in rounds), return_exceptions=True
             )
-            ConsensusAlgorithm.dispatch_transaction_status_update(
-                transactions_processor,
-                transaction.hash,
-                TransactionStatus.UNDETERMINED,
-                msg_handler,
-            )
-            return
+            for _, _, leader_receipt_future, _ in rounds:
+                # Leaders that failed before being cancelled, their errors are the ones of their rounds
+                if (
+                    leader_receipt_future.done()
+                    and not leader_receipt_future.cancelled()
+                ):
+                    leader_receipt_future.exception()
 
         ConsensusAlgorithm.dispatch_transaction_status_update(
             transactions_processor,
@@ -340,11 +609,16 @@ class ConsensusAlgorithm:
             new_contract = {
                 "id": transaction.data["contract_address"],
                 "data": {
-                    "state": leader_receipt.contract_state,
                     "code": transaction.data["contract_code"],
+                    # Schema lookups of deployed contracts don't need the GenVM
+                    "schema": GenVM.get_contract_schema(
+                        transaction.data["contract_code"]
+                    ),
                 },
             }
-            contract_snapshot.register_contract(new_contract)
+            contract_snapshot.register_contract(
+                new_contract, leader_receipt.contract_state
+            )
 
             msg_handler.send_message(
                 LogEvent(
@@ -391,6 +665,135 @@ class ConsensusAlgorithm:
                 triggered_by_hash=transaction.hash,
             )
 
+    async def _exec_round(
+        self,
+        transaction: Transaction,
+        validators: list[dict],
+        contract_snapshot: ContractSnapshot,
+        leader_receipt_future: asyncio.Future,
+        contract_snapshot_factory: Callable[[str], ContractSnapshot],
+        node_factory: Callable[..., Node],
+    ) -> tuple[list[tuple[Node, Receipt]], int]:
+        """
+        Execute one round of the consensus: the first of `validators` leads and the rest validate its receipt.
+
+        The leader receipt is published in `leader_receipt_future` as soon as it is available. This only computes the round, recording it is left to `exec_transaction`, so that rounds running speculatively are recorded in order, or not at all when an earlier round reaches consensus.
+        Returns the validators that finished with their receipts, and the number of agreeing votes needed to accept the transaction.
+        """
+        [leader, *remaining_validators] = validators
+        num_validators = len(remaining_validators) + 1
+
+        try:
+            leader_node = node_factory(
+                leader,
+                ExecutionMode.LEADER,
+                contract_snapshot,
+                None,
+                self.msg_handler,
+                contract_snapshot_factory,
+            )
+            leader_receipt = await leader_node.exec_transaction(transaction)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                leader_receipt_future.cancel()
+            else:
+                leader_receipt_future.set_exception(e)
+            raise
+        leader_receipt_future.set_result(leader_receipt)
+
+        agree_threshold = num_validators // 2
+        if (
+            not leader_receipt.nondeterministic
+            and self.deterministic_validation
+            == DeterministicValidationMode.SINGLE_VALIDATOR
+            and remaining_validators
+        ):
+            # Re-executing a deterministic transaction on the whole committee adds nothing, one validator has to reproduce the leader's result
+            remaining_validators = remaining_validators[:1]
+            agree_threshold = 2
+
+        validator_nodes = [
+            node_factory(
+                validator,
+                ExecutionMode.VALIDATOR,
+                contract_snapshot,
+                leader_receipt,
+                self.msg_handler,
+                contract_snapshot_factory,
+            )
+            for validator in remaining_validators
+        ]
+        validations = await self._exec_validators(
+            transaction, validator_nodes, leader_receipt, agree_threshold
+        )
+        return validations, agree_threshold
+
+    async def _exec_validators(
+        self,
+        transaction: Transaction,
+        validator_nodes: list[Node],
+        leader_receipt: Receipt,
+        agree_threshold: int,
+    ) -> list[tuple[Node, Receipt]]:
+        """
+        Execute the transaction on all validators concurrently, and stop waiting for them as soon as the vote is settled.
+
+        The vote is settled once the validators that finished reach `agree_threshold` (the number of agreeing votes, leader's included, needed to accept the transaction) by themselves (the leader's vote is not enough to skip validation), or once the threshold can't be reached even if all remaining validators agree.
+        Validators still running at that point, or running for longer than `validator_timeout`, are cancelled and left out of the vote.
+        Returns the validators that finished with their receipts, in the order of `validator_nodes`.
+        """
+        leader_agrees = int(leader_receipt.vote == Vote.AGREE)
+
+        # watch out! as ollama uses GPU resources and webrequest aka selenium uses RAM
+        validator_by_task = {
+            asyncio.create_task(
+                asyncio.wait_for(
+                    validator.exec_transaction(transaction), self.validator_timeout
+                )
+            ): validator
+            for validator in validator_nodes
+        }
+        receipts: dict[Node, Receipt] = {}
+        pending = set(validator_by_task)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    validator = validator_by_task[task]
+                    try:
+                        receipts[validator] = task.result()
+                    except asyncio.TimeoutError:
+                        print(
+                            f"Validator {validator.address} timed out executing transaction: ",
+                            transaction,
+                        )
+
+                agrees = len(
+                    [
+                        receipt
+                        for receipt in receipts.values()
+                        if receipt.vote == Vote.AGREE
+                    ]
+                )
+                if (
+                    agrees >= agree_threshold
+                    or agrees + leader_agrees + len(pending) < agree_threshold
+                ):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            # Wait for the cancellations to go through, validators blocked in a thread are detached and their result is discarded
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        return [
+            (validator, receipts[validator])
+            for validator in validator_nodes
+            if validator in receipts
+        ]
+
     @staticmethod
     def execute_transfer(
         transaction: Transaction,
@@ -472,6 +875,11 @@ class ConsensusAlgorithm:
         )
 
 
+def default_owner() -> str:
+    # Several workers can run on the same host, or in the same process
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+
+
 def rotate(nodes: list) -> Iterator[list]:
     nodes = deque(nodes)
     for _ in range(len(nodes)):
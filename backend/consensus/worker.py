@@ -0,0 +1,52 @@
+# backend/consensus/worker.py
+
+# Standalone consensus worker, to scale the consensus horizontally next to the JSON-RPC server.
+# Workers share the database with the server and split the contract addresses between them, see `ConsensusPartitionsRegistry`.
+# The JSON-RPC server runs `CONSENSUS_LOCAL_WORKERS` consensus loops itself (1 by default). Set it to 0 to only run the API there and leave all the processing to these workers.
+# Usage: python -m backend.consensus.worker [--owner <worker id>]
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+from flask_socketio import SocketIO
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from backend.consensus.base import consensus_from_env
+from backend.database_handler.transactions_listener import TransactionsListener
+from backend.protocol_rpc.configuration import GlobalConfiguration
+from backend.protocol_rpc.message_handler.base import MessageHandler
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Run a consensus worker")
+    parser.add_argument(
+        "--owner",
+        help="Identifier of the worker, unique among the workers. A stable one releases the claims of the previous run on restart (defaults to a new unique id)",
+    )
+    args = parser.parse_args()
+
+    message_queue = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    if not message_queue:
+        parser.error(
+            "SOCKETIO_MESSAGE_QUEUE must be set so that the events of the worker reach the JSON-RPC server clients"
+        )
+
+    engine = create_engine(GlobalConfiguration.get_database_uri(), pool_size=20)
+    msg_handler = MessageHandler(
+        SocketIO(message_queue=message_queue), config=GlobalConfiguration()
+    )
+    consensus = consensus_from_env(
+        lambda: Session(engine, expire_on_commit=False),
+        msg_handler,
+        TransactionsListener(engine),
+        owner=args.owner,
+    )
+    consensus.run_consensus_loop()
+
+
+if __name__ == "__main__":
+    main()
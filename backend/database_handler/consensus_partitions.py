@@ -0,0 +1,143 @@
+# database_handler/consensus_partitions.py
+
+import hashlib
+import math
+from datetime import timedelta
+
+from sqlalchemy import BigInteger, ColumnElement, cast, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import BIT, insert
+from sqlalchemy.orm import Session
+
+from .models import ConsensusPartitions, ConsensusWorkers, Transactions
+
+
+# Contract addresses are spread over partitions by the first 32 bits of the md5 of the address.
+# The same function is implemented in SQL (to filter transactions) and in Python (to know which partition an in-memory transaction belongs to), they must be kept in sync.
+def address_partition(address: str, partition_count: int) -> int:
+    return int(hashlib.md5(address.encode("utf-8")).hexdigest()[:8], 16) % (
+        partition_count
+    )
+
+
+def transaction_partition_expression(partition_count: int) -> ColumnElement[int]:
+    address = func.coalesce(Transactions.to_address, Transactions.from_address)
+    first_32_bits = cast(
+        cast(literal("x") + func.substr(func.md5(address), 1, 8), BIT(32)),
+        BigInteger,
+    )
+    return first_32_bits % partition_count
+
+
+class ConsensusPartitionsRegistry:
+    """
+    Leases of the partitions of contract addresses among consensus workers.
+
+    A partition is owned by at most one worker at a time, which is the only one claiming its transactions. This keeps the transactions of each contract in order even with several workers.
+    Owners renew their leases periodically, leases of dead workers expire and their partitions are taken over by the remaining ones.
+    Workers also keep a heartbeat in `consensus_workers`, so that the ones holding too many partitions notice newcomers and hand partitions over.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def _ensure_partitions(self, partition_count: int):
+        self.session.execute(
+            insert(ConsensusPartitions)
+            .values([{"partition": partition} for partition in range(partition_count)])
+            .on_conflict_do_nothing(index_elements=["partition"])
+        )
+
+    def _heartbeat(self, owner: str, lease_expires_at):
+        self.session.execute(
+            insert(ConsensusWorkers)
+            .values(owner=owner, lease_expires_at=lease_expires_at)
+            .on_conflict_do_update(
+                index_elements=["owner"],
+                set_={"lease_expires_at": lease_expires_at},
+            )
+        )
+
+    def acquire_partitions(
+        self, owner: str, partition_count: int, lease_duration: float
+    ) -> list[int]:
+        """
+        Renew the leases `owner` holds and take free or expired partitions until `owner` holds its fair share.
+        Returns the partitions `owner` holds, which may be more than its fair share (see `release_partitions`).
+        """
+        lease_expires_at = func.now() + timedelta(seconds=lease_duration)
+        self._heartbeat(owner, lease_expires_at)
+        self._ensure_partitions(partition_count)
+
+        owned = (
+            self.session.query(ConsensusPartitions)
+            .filter(
+                ConsensusPartitions.partition < partition_count,
+                ConsensusPartitions.owner == owner,
+            )
+            .all()
+        )
+        for partition in owned:
+            partition.lease_expires_at = lease_expires_at
+
+        missing = self.get_fair_share(owner, partition_count) - len(owned)
+        if missing > 0:
+            acquired = (
+                self.session.query(ConsensusPartitions)
+                .filter(
+                    ConsensusPartitions.partition < partition_count,
+                    or_(
+                        ConsensusPartitions.owner.is_(None),
+                        ConsensusPartitions.lease_expires_at < func.now(),
+                    ),
+                )
+                .order_by(ConsensusPartitions.partition)
+                .limit(missing)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for partition in acquired:
+                partition.owner = owner
+                partition.lease_expires_at = lease_expires_at
+            owned += acquired
+
+        self.session.flush()
+        return sorted(partition.partition for partition in owned)
+
+    def get_fair_share(self, owner: str, partition_count: int) -> int:
+        """Number of partitions each live worker (those with a valid heartbeat, plus `owner`) should hold."""
+        live_owners = set(
+            self.session.scalars(
+                select(ConsensusWorkers.owner).where(
+                    ConsensusWorkers.lease_expires_at >= func.now()
+                )
+            )
+        )
+        live_owners.add(owner)
+        return math.ceil(partition_count / len(live_owners))
+
+    def release_partitions(self, owner: str, partitions: list[int]):
+        self.session.query(ConsensusPartitions).filter(
+            ConsensusPartitions.owner == owner,
+            ConsensusPartitions.partition.in_(partitions),
+        ).update(
+            {
+                ConsensusPartitions.owner: None,
+                ConsensusPartitions.lease_expires_at: None,
+            },
+            synchronize_session=False,
+        )
+
+    def unregister(self, owner: str):
+        """Release every partition of `owner` and remove its heartbeat, so that the remaining workers take over right away."""
+        self.session.query(ConsensusPartitions).filter(
+            ConsensusPartitions.owner == owner
+        ).update(
+            {
+                ConsensusPartitions.owner: None,
+                ConsensusPartitions.lease_expires_at: None,
+            },
+            synchronize_session=False,
+        )
+        self.session.query(ConsensusWorkers).filter(
+            ConsensusWorkers.owner == owner
+        ).delete(synchronize_session=False)
@@ -1,6 +1,8 @@
 # database_handler/contract_snapshot.py
 from .models import CurrentState
-from sqlalchemy.orm import Session
+from .state_codec import compress_state, decompress_state, state_hash
+from backend.node.genvm.state_cache import state_cache
+from sqlalchemy.orm import Session, defer
 
 
 # TODO: should ContractSnapshot be a dataclass with just the contract data? Snapshots shouldn't be allowed to be modified, so it doesn't make sense to modify the database
@@ -9,7 +11,8 @@ class ContractSnapshot:
     """
     Warning: if you initialize this class with a contract_address:
     - The contract_address must exist in the database.
-    - `self.contract_data`, `self.contract_code` and `self.cencoded_state` will be loaded from the database **only once** at initialization.
+    - `self.contract_data`, `self.contract_code` and `self.state_hash` will be loaded from the database **only once** at initialization.
+    - `self.state` will be loaded from the database **only once**, the first time it's read. Reads of cached states don't need it (see `state_cache`).
     """
 
     def __init__(self, contract_address: str, session: Session):
@@ -21,13 +24,36 @@ class ContractSnapshot:
             contract_account = self._load_contract_account()
             self.contract_data = contract_account.data
             self.contract_code = self.contract_data["code"]
-            self.encoded_state = self.contract_data["state"]
+            self.state_hash = contract_account.state_hash
+
+    @property
+    def state(self) -> bytes | None:
+        """Pickled contract instance"""
+        if "_state" not in self.__dict__:
+            row = (
+                self.session.query(
+                    CurrentState.state,
+                    CurrentState.state_codec,
+                    CurrentState.state_hash,
+                )
+                .filter(CurrentState.id == self.contract_address)
+                .one()
+            )
+            self._state = (
+                decompress_state(row.state, row.state_codec)
+                if row.state is not None
+                else None
+            )
+            # The state may have been updated since the snapshot was taken
+            self.state_hash = row.state_hash
+        return self._state
 
     def _load_contract_account(self) -> CurrentState:
         """Load and return the current state of the contract from the database."""
 
         result = (
             self.session.query(CurrentState)
+            .options(defer(CurrentState.state))
             .filter(CurrentState.id == self.contract_address)
             .one_or_none()
         )
@@ -37,24 +63,34 @@ class ContractSnapshot:
 
         return result
 
-    def register_contract(self, contract: dict):
+    def register_contract(self, contract: dict, state: bytes | None):
         """Register a new contract in the database."""
         current_contract = (
             self.session.query(CurrentState).filter_by(id=contract["id"]).one()
         )
 
         current_contract.data = contract["data"]
+        self._set_state(current_contract, state)
         self.session.commit()
 
-    def update_contract_state(self, new_state: str):
+    def update_contract_state(self, new_state: bytes | None):
         """Update the state of the contract in the database."""
-        new_contract_nada = {
-            "code": self.contract_data["code"],
-            "state": new_state,
-        }
+        if new_state is not None and state_hash(new_state) == self.state_hash:
+            # e.g. the method didn't modify the contract, there's nothing to write
+            return
 
         contract = (
             self.session.query(CurrentState).filter_by(id=self.contract_address).one()
         )
-        contract.data = new_contract_nada
+        self._set_state(contract, new_state)
         self.session.commit()
+        # Unpickled instances of the previous states won't be read anymore
+        state_cache.invalidate(self.contract_address)
+
+    @staticmethod
+    def _set_state(contract: CurrentState, state: bytes | None):
+        if state is None:
+            contract.state = contract.state_hash = contract.state_codec = None
+            return
+        contract.state, contract.state_codec = compress_state(state)
+        contract.state_hash = state_hash(state)
@@ -0,0 +1,96 @@
+"""add binary contract state
+
+Revision ID: e4b9a1c6d2f7
+Revises: c7f1e0d2a9b3
+Create Date: 2024-11-20 11:26:13.508412
+
+"""
+
+import base64
+import hashlib
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4b9a1c6d2f7"
+down_revision: Union[str, None] = "c7f1e0d2a9b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+current_state = sa.table(
+    "current_state",
+    sa.column("id", sa.String),
+    sa.column("data", postgresql.JSONB),
+    sa.column("state", sa.LargeBinary),
+    sa.column("state_hash", sa.String),
+    sa.column("state_codec", sa.String),
+)
+
+
+def upgrade() -> None:
+    op.add_column("current_state", sa.Column("state", sa.LargeBinary(), nullable=True))
+    op.add_column(
+        "current_state", sa.Column("state_hash", sa.String(length=64), nullable=True)
+    )
+    op.add_column(
+        "current_state", sa.Column("state_codec", sa.String(length=16), nullable=True)
+    )
+
+    # Move the base64 states out of `data`. zlib is always available, the codec is stored with each state anyway
+    connection = op.get_bind()
+    contracts = connection.execute(
+        sa.select(current_state.c.id, current_state.c.data).where(
+            current_state.c.data.has_key("state")
+        )
+    ).all()
+    for contract_id, data in contracts:
+        data = dict(data)
+        encoded_state = data.pop("state")
+        state = base64.b64decode(encoded_state) if encoded_state else None
+        connection.execute(
+            current_state.update()
+            .where(current_state.c.id == contract_id)
+            .values(
+                data=data,
+                state=zlib.compress(state, 1) if state is not None else None,
+                state_hash=(
+                    hashlib.sha256(state).hexdigest() if state is not None else None
+                ),
+                state_codec="zlib" if state is not None else None,
+            )
+        )
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    contracts = connection.execute(
+        sa.select(
+            current_state.c.id,
+            current_state.c.data,
+            current_state.c.state,
+            current_state.c.state_codec,
+        ).where(current_state.c.state.is_not(None))
+    ).all()
+    for contract_id, data, state, state_codec in contracts:
+        if state_codec == "zlib":
+            state = zlib.decompress(state)
+        elif state_codec != "none":
+            raise Exception(
+                f"Can't downgrade state of contract {contract_id} compressed with {state_codec}"
+            )
+        connection.execute(
+            current_state.update()
+            .where(current_state.c.id == contract_id)
+            .values(
+                data={**data, "state": base64.b64encode(state).decode("ascii")},
+            )
+        )
+
+    op.drop_column("current_state", "state_codec")
+    op.drop_column("current_state", "state_hash")
+    op.drop_column("current_state", "state")
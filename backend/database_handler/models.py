@@ -6,7 +6,9 @@ from sqlalchemy import (
     CheckConstraint,
     DateTime,
     Enum,
+    Index,
     Integer,
+    LargeBinary,
     PrimaryKeyConstraint,
     String,
     UniqueConstraint,
@@ -53,6 +55,10 @@ class CurrentState(Base):
     id: Mapped[str] = mapped_column(String(255), primary_key=True)
     data: Mapped[dict] = mapped_column(JSONB)
     balance: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Pickled contract instance, compressed with `state_codec`. Kept out of `data` so that updates don't rewrite the code
+    state: Mapped[Optional[bytes]] = mapped_column(LargeBinary, default=None)
+    state_hash: Mapped[Optional[str]] = mapped_column(String(64), default=None)
+    state_codec: Mapped[Optional[str]] = mapped_column(String(16), default=None)
     updated_at: Mapped[Optional[datetime.datetime]] = mapped_column(
         DateTime(True),
         init=False,
@@ -67,6 +73,12 @@ class Transactions(Base):
         CheckConstraint("type = ANY (ARRAY[0, 1, 2])", name="transactions_type_check"),
         PrimaryKeyConstraint("hash", name="transactions_pkey"),
         CheckConstraint("value >= 0", name="value_unsigned_int"),
+        # Pending transactions are counted on every submission and claimed oldest first
+        Index(
+            "transactions_pending_created_at_idx",
+            "created_at",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
     )
 
     hash: Mapped[str] = mapped_column(String(66), primary_key=True, unique=True)
@@ -114,6 +126,12 @@ class Transactions(Base):
         init=False,
     )
 
+    # Set when a consensus worker claims the pending transaction, so that it is only processed once
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(255), default=None)
+    claim_expires_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime(True), default=None
+    )
+
 
 class RollupTransactions(Base):
     __tablename__ = "rollup_transactions"
@@ -191,3 +209,26 @@ class LLMProviderDBModel(Base):
         server_default=func.current_timestamp(),
         onupdate=func.current_timestamp(),
     )
+
+
+class ConsensusPartitions(Base):
+    __tablename__ = "consensus_partitions"
+    __table_args__ = (
+        PrimaryKeyConstraint("partition", name="consensus_partitions_pkey"),
+    )
+
+    partition: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=False
+    )
+    owner: Mapped[Optional[str]] = mapped_column(String(255), default=None)
+    lease_expires_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime(True), default=None
+    )
+
+
+class ConsensusWorkers(Base):
+    __tablename__ = "consensus_workers"
+    __table_args__ = (PrimaryKeyConstraint("owner", name="consensus_workers_pkey"),)
+
+    owner: Mapped[str] = mapped_column(String(255), primary_key=True)
+    lease_expires_at: Mapped[datetime.datetime] = mapped_column(DateTime(True))
@@ -0,0 +1,73 @@
+# backend/database_handler/state_codec.py
+
+"""
+Storage format of contract states.
+
+States are the pickled contract instances. They are stored as raw bytes in `current_state.state`, compressed with the codec set in `CONTRACT_STATE_COMPRESSION`:
+- `none`
+- `zlib` (default, no extra dependencies)
+- `zstd` (requires `zstandard`)
+- `lz4` (requires `lz4`)
+
+The codec used for each state is stored next to it, so the setting can be changed at any time. `current_state.state_hash` is the SHA-256 of the uncompressed state.
+"""
+
+import hashlib
+import os
+import zlib
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_CONTRACT_STATE_COMPRESSION = "zlib"
+
+
+def _zstd():
+    import zstandard
+
+    return zstandard
+
+
+def _lz4():
+    import lz4.frame
+
+    return lz4.frame
+
+
+_compressors = {
+    "none": lambda data: data,
+    "zlib": lambda data: zlib.compress(data, 1),
+    "zstd": lambda data: _zstd().ZstdCompressor().compress(data),
+    "lz4": lambda data: _lz4().compress(data),
+}
+
+_decompressors = {
+    "none": lambda data: data,
+    "zlib": zlib.decompress,
+    "zstd": lambda data: _zstd().ZstdDecompressor().decompress(data),
+    "lz4": lambda data: _lz4().decompress(data),
+}
+
+
+def get_state_codec() -> str:
+    codec = os.getenv("CONTRACT_STATE_COMPRESSION", DEFAULT_CONTRACT_STATE_COMPRESSION)
+    if codec not in _compressors:
+        raise ValueError(f"Unknown CONTRACT_STATE_COMPRESSION {codec}")
+    return codec
+
+
+def state_hash(state: bytes) -> str:
+    return hashlib.sha256(state).hexdigest()
+
+
+def compress_state(state: bytes) -> tuple[bytes, str]:
+    """Returns the compressed state and the codec used"""
+    codec = get_state_codec()
+    return _compressors[codec](state), codec
+
+
+def decompress_state(data: bytes, codec: str) -> bytes:
+    if codec not in _decompressors:
+        raise ValueError(f"Unknown contract state codec {codec}")
+    return _decompressors[codec](data)
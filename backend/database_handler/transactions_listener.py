@@ -0,0 +1,75 @@
+# database_handler/transactions_listener.py
+
+import asyncio
+
+from sqlalchemy import Engine
+
+from .transactions_processor import NEW_TRANSACTION_CHANNEL
+
+
+class TransactionsListener:
+    """
+    Listens to the Postgres notifications published by `TransactionsProcessor.insert_transaction`.
+
+    Notifications are only delivered to connections in autocommit mode, so a dedicated connection is taken from the engine's pool and kept for the whole life of the listener.
+    """
+
+    def __init__(self, engine: Engine, channel: str = NEW_TRANSACTION_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self.connection = None
+
+    def __enter__(self):
+        self.listen()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def listen(self):
+        self.connection = self.engine.raw_connection()
+        dbapi_connection = self.connection.dbapi_connection
+        dbapi_connection.autocommit = True
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel};")
+
+    def close(self):
+        if self.connection is None:
+            return
+        dbapi_connection = self.connection.dbapi_connection
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"UNLISTEN {self.channel};")
+        dbapi_connection.autocommit = False
+        self.connection.close()  # returns the connection to the pool
+        self.connection = None
+
+    def _consume_notifications(self) -> list[str]:
+        dbapi_connection = self.connection.dbapi_connection
+        dbapi_connection.poll()
+        transaction_hashes = [
+            notification.payload for notification in dbapi_connection.notifies
+        ]
+        dbapi_connection.notifies.clear()
+        return transaction_hashes
+
+    async def wait_for_transactions(self, timeout: float) -> list[str]:
+        """
+        Wait until new transactions are notified or `timeout` seconds have passed.
+        Returns the hashes of the notified transactions, in the order they were committed.
+        """
+        transaction_hashes = self._consume_notifications()
+        if transaction_hashes:
+            return transaction_hashes
+
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        fileno = self.connection.dbapi_connection.fileno()
+        loop.add_reader(fileno, readable.set)
+        try:
+            await asyncio.wait_for(readable.wait(), timeout)
+        except TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fileno)
+
+        return self._consume_notifications()
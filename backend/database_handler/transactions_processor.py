@@ -4,13 +4,18 @@ import rlp
 
 from .models import Transactions, RollupTransactions
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, func, select
 
 from .models import TransactionStatus
+from .consensus_partitions import transaction_partition_expression
 from eth_utils import to_bytes, keccak, is_address
 import json
 import base64
 import time
+from datetime import timedelta
+
+# Postgres channel where the hash of every newly inserted transaction is published
+NEW_TRANSACTION_CHANNEL = "new_transaction"
 
 
 class TransactionAddressFilter(Enum):
@@ -146,9 +151,7 @@ class TransactionsProcessor:
             v=None,
             leader_only=leader_only,
             triggered_by=(
-                self.session.query(Transactions).filter_by(hash=triggered_by_hash).one()
-                if triggered_by_hash
-                else None
+                self._get_transaction(triggered_by_hash) if triggered_by_hash else None
             ),
         )
 
@@ -158,6 +161,11 @@ class TransactionsProcessor:
 
         self.create_rollup_transaction(new_transaction.hash)
 
+        # Wake up the consensus crawler. Postgres only delivers the notification once the transaction is committed
+        self.session.execute(
+            select(func.pg_notify(NEW_TRANSACTION_CHANNEL, new_transaction.hash))
+        )
+
         return new_transaction.hash
 
     def get_transaction_by_hash(self, transaction_hash: str) -> dict | None:
@@ -172,24 +180,119 @@ class TransactionsProcessor:
 
         return self._parse_transaction_data(transaction)
 
+    def claim_pending_transactions(
+        self,
+        owner: str,
+        lease_duration: float,
+        limit: int,
+        transaction_hashes: list[str] | None = None,
+        partitions: list[int] | None = None,
+        partition_count: int | None = None,
+    ) -> list[dict]:
+        """
+        Atomically claim up to `limit` pending transactions for `owner`, oldest first.
+        If `partitions` is given, only transactions whose contract address belongs to them are claimed (see `consensus_partitions`).
+
+        A pending transaction can be claimed if nobody claimed it yet or if the lease of its owner expired (e.g. the owner died before processing it).
+        Rows are locked with `FOR UPDATE SKIP LOCKED`, so concurrent claimers never block on, nor get, each other's transactions.
+        The claim is only visible to others once the session is committed.
+        """
+        query = self.session.query(Transactions).filter(
+            Transactions.status == TransactionStatus.PENDING,
+            or_(
+                Transactions.claimed_by.is_(None),
+                Transactions.claim_expires_at < func.now(),
+            ),
+        )
+        if transaction_hashes is not None:
+            query = query.filter(Transactions.hash.in_(transaction_hashes))
+        if partitions is not None:
+            query = query.filter(
+                transaction_partition_expression(partition_count).in_(partitions)
+            )
+
+        transactions = (
+            query.order_by(Transactions.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+        for transaction in transactions:
+            transaction.claimed_by = owner
+            transaction.claim_expires_at = func.now() + timedelta(
+                seconds=lease_duration
+            )
+        self.session.flush()
+
+        return [
+            self._parse_transaction_data(transaction) for transaction in transactions
+        ]
+
+    def renew_transaction_claims(
+        self, owner: str, lease_duration: float, transaction_hashes: list[str]
+    ):
+        """Extend the lease of the pending transactions `owner` claimed and has not processed yet."""
+        self.session.query(Transactions).filter(
+            Transactions.hash.in_(transaction_hashes),
+            Transactions.claimed_by == owner,
+            Transactions.status == TransactionStatus.PENDING,
+        ).update(
+            {
+                Transactions.claim_expires_at: func.now()
+                + timedelta(seconds=lease_duration)
+            },
+            synchronize_session=False,
+        )
+
+    def release_transaction_claims(
+        self, owner: str, transaction_hashes: list[str] | None = None
+    ):
+        """
+        Release the pending transactions claimed by `owner`, e.g. when it restarts and its queues are lost.
+        If `transaction_hashes` is given, only those are released.
+        """
+        query = self.session.query(Transactions).filter(
+            Transactions.claimed_by == owner,
+            Transactions.status == TransactionStatus.PENDING,
+        )
+        if transaction_hashes is not None:
+            query = query.filter(Transactions.hash.in_(transaction_hashes))
+        query.update(
+            {Transactions.claimed_by: None, Transactions.claim_expires_at: None},
+            synchronize_session=False,
+        )
+
+    def _get_transaction(self, transaction_hash: str) -> Transactions:
+        """
+        Get the row of a transaction, only querying the database the first time it is accessed in the session.
+
+        The consensus updates the same transaction many times in a row (status, consensus data, rollup record). Going through the identity map instead of a query avoids a SELECT per update and, since queries autoflush the session, an UPDATE/INSERT round trip per update too. Changes are coalesced in the row and rollup records are inserted in a single batch when the session is flushed or committed.
+        """
+        transaction = self.session.get(Transactions, transaction_hash)
+        if transaction is None:
+            raise ValueError(f"Transaction {transaction_hash} not found")
+        return transaction
+
+    def count_pending_transactions(self) -> int:
+        return (
+            self.session.query(Transactions)
+            .filter(Transactions.status == TransactionStatus.PENDING)
+            .count()
+        )
+
     def update_transaction_status(
         self, transaction_hash: str, new_status: TransactionStatus
     ):
-        transaction = (
-            self.session.query(Transactions).filter_by(hash=transaction_hash).one()
-        )
+        transaction = self._get_transaction(transaction_hash)
         transaction.status = new_status
 
     def set_transaction_result(self, transaction_hash: str, consensus_data: dict):
-        transaction = (
-            self.session.query(Transactions).filter_by(hash=transaction_hash).one()
-        )
+        transaction = self._get_transaction(transaction_hash)
         transaction.consensus_data = consensus_data
 
     def create_rollup_transaction(self, transaction_hash: str):
-        transaction = (
-            self.session.query(Transactions).filter_by(hash=transaction_hash).one()
-        )
+        transaction = self._get_transaction(transaction_hash)
         rollup_input_data = self._transaction_data_to_str(
             self._parse_transaction_data(transaction)
         )
@@ -106,3 +106,18 @@ class InvalidTransactionError(Exception):
     ):
         self.message = message
         super().__init__(self.message)
+
+
+class TooManyPendingTransactionsError(Exception):
+    """Exception raised when a transaction is submitted while the consensus is too far behind. The client should retry later."""
+
+    retryable = True
+
+    def __init__(
+        self,
+        pending_transactions: int,
+        message: str = "Too many pending transactions, please retry later.",
+    ):
+        self.pending_transactions = pending_transactions
+        self.message = message
+        super().__init__(self.message)
@@ -7,6 +7,7 @@ from typing import Callable, Optional
 
 from backend.domain.types import Validator, Transaction, TransactionType
 from backend.node.genvm.base import GenVM
+from backend.node.genvm.executor import get_genvm_executor
 from backend.database_handler.contract_snapshot import ContractSnapshot
 from backend.node.genvm.types import Receipt, ExecutionMode, Vote
 from backend.protocol_rpc.message_handler.base import MessageHandler
@@ -57,13 +58,17 @@ class Node:
     def parse_transaction_execution_receipt(self, receipt: Receipt) -> Receipt:
         if (
             self.validator_mode == ExecutionMode.LEADER
-            or self.leader_receipt.contract_state == receipt.contract_state
+            or self.leader_receipt.contract_state_hash == receipt.contract_state_hash
         ):
             receipt.vote = Vote.AGREE
 
         else:
             receipt.vote = Vote.DISAGREE
 
+        if self.validator_mode == ExecutionMode.VALIDATOR:
+            # Only the state computed by the leader is stored, the one of validators is only needed to vote
+            receipt.contract_state = None
+
         return receipt
 
     async def deploy_contract(
@@ -72,14 +77,14 @@ class Node:
         code_to_deploy: str,
         calldata: bytes,
     ) -> Receipt:
-        receipt = await self.genvm.deploy_contract(
-            from_address, code_to_deploy, calldata, self.leader_receipt
+        receipt = await get_genvm_executor().deploy_contract(
+            self.genvm, from_address, code_to_deploy, calldata, self.leader_receipt
         )
         return self.parse_transaction_execution_receipt(receipt)
 
     async def run_contract(self, from_address: str, calldata: bytes) -> Receipt:
-        receipt = await self.genvm.run_contract(
-            from_address, calldata, self.leader_receipt
+        receipt = await get_genvm_executor().run_contract(
+            self.genvm, from_address, calldata, self.leader_receipt
         )
 
         return self.parse_transaction_execution_receipt(receipt)
@@ -87,14 +92,18 @@ class Node:
     def get_contract_data(
         self,
         code: str,
-        state: str,
+        state: bytes | Callable[[], bytes],
         calldata: bytes,
+        contract_address: str | None = None,
+        contract_state_hash: str | None = None,
     ):
         result = self.genvm.get_contract_data(
             code,
             state,
             calldata,
             self.contract_snapshot_factory,
+            contract_address,
+            contract_state_hash,
         )
 
         return result
@@ -5,16 +5,33 @@ import inspect
 import re
 import pickle
 import base64
-import sys
 import traceback
 import io
-from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from contextlib import contextmanager, nullcontext
 from typing import Any, Callable
 
 from backend.database_handler.contract_snapshot import ContractSnapshot
-from backend.node.genvm.equivalence_principle import EquivalencePrinciple
+from backend.database_handler.state_codec import state_hash
+from backend.node.genvm.equivalence_principle import EquivalencePrinciple, call_llm
 from backend.node.genvm.code_enforcement import code_enforcement_check
+from backend.node.genvm.contract_schema import (
+    cache_schema,
+    extract_schema_methods,
+    get_cached_schema,
+)
+from backend.node.genvm.gas import gas_metering
+from backend.node.genvm.code_cache import code_cache
+from backend.node.genvm.state_cache import state_cache
+from backend.node.genvm.runtime import (
+    ContractRunnerProxy,
+    ExecutionContext,
+    contract_proxy,
+    current_execution_context,
+    execution_context,
+    redirect_output,
+)
 from backend.node.genvm.std.vector_store import VectorStore
+from backend.node.genvm.webpage_utils import get_webpage_content
 from backend.node.genvm.types import (
     PendingTransaction,
     Receipt,
@@ -29,33 +46,36 @@ from backend.protocol_rpc.message_handler.types import (
 )
 
 from .calldata import (
-    decode as calldata_decode,
+    LazyArray,
+    accepts_lazy_calldata,
+    decode_lazy as calldata_decode_lazy,
     encode as calldata_encode,
+    materialize as calldata_materialize,
     to_str as calldata_repr,
 )
 
 
-@contextmanager
-def safe_globals(override_globals: dict[str] = None):
-    old_globals = globals().copy()
-    globals().update(
-        {
-            "contract_runner": None,
-            "VectorStore": VectorStore,
-        }
-    )
-    if override_globals:
-        globals().update(override_globals)
-    try:
-        yield
-    finally:
-        globals().clear()
-        globals().update(old_globals)
+def __getattr__(name: str):
+    # Contract code is executed as this module (see `_contract_globals`), so pickle looks its classes up here. They are resolved in the namespace of the contract being executed
+    context = current_execution_context.get(None)
+    if context is not None and name in context.namespace:
+        return context.namespace[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 _FAKE_DECODED_DATA = object()
 
 
+def _method_args(calldata, method: Callable) -> list | LazyArray:
+    """Arguments of the call, decoded on demand if the method accepts lazy calldata"""
+    args = calldata["args"]
+    if not accepts_lazy_calldata(method):
+        args = calldata_materialize(args)
+    if not isinstance(args, (list, LazyArray)):
+        raise Exception(f"Invalid arguments, list expected, got {args}")
+    return args
+
+
 def _calldata_to_str(raw: bytes, decoded):
     if decoded is _FAKE_DECODED_DATA:
         return str(base64.b64encode(raw), encoding="ascii")
@@ -78,6 +98,11 @@ class ContractRunner:
             ExecutionMode.LEADER.value: {}
         }  # the eq principle outputs for the leader and validators
         self.contract_snapshot_factory = contract_snapshot_factory
+        # Set when the execution uses a primitive whose result may differ between nodes (LLM calls, web pages, reads of other contracts), see `Receipt.nondeterministic`
+        self.nondeterministic = False
+        # Non-deterministic primitives, replaced when the contract runs in a sandbox process (see `executor`) so they are called from the main process
+        self.call_llm = call_llm
+        self.get_webpage = get_webpage_content
 
 
 class GenVM:
@@ -107,10 +132,28 @@ class GenVM:
             raise Exception("No class name found")
         return matches[0]
 
+    def _execution_context(
+        self, contract_code: str, contract_factory: Callable[[str], Any]
+    ) -> ExecutionContext:
+        return ExecutionContext(
+            contract_runner=self.contract_runner,
+            namespace=code_cache.get_namespace(contract_code, _contract_globals),
+            contract_factory=contract_factory,
+        )
+
+    @contextmanager
+    def _gas_metering(self):
+        with gas_metering() as gas_meter:
+            try:
+                yield
+            finally:
+                if gas_meter is not None:
+                    self.contract_runner.gas_used += gas_meter.gas_used
+
     def _generate_receipt(
         self,
         class_name: str,
-        encoded_object: str,
+        state: bytes | None,
         calldata: bytes,
         execution_result: ExecutionResultStatus,
         error: Exception,
@@ -120,12 +163,14 @@ class GenVM:
             calldata=calldata,
             gas_used=self.contract_runner.gas_used,
             mode=self.contract_runner.mode,
-            contract_state=encoded_object,
+            contract_state=state,
+            contract_state_hash=state_hash(state) if state is not None else None,
             node_config=self.contract_runner.node_config,
             eq_outputs=self.contract_runner.eq_outputs,
             execution_result=execution_result,
             error=error,
             pending_transactions=self.pending_transactions,
+            nondeterministic=self.contract_runner.nondeterministic,
         )
 
     async def deploy_contract(
@@ -141,7 +186,6 @@ class GenVM:
         execution_result = ExecutionResultStatus.SUCCESS
         error = None
 
-        self.eq_principle.contract_runner = self.contract_runner
         if self.contract_runner.mode == ExecutionMode.VALIDATOR:
             self.contract_runner.eq_outputs[ExecutionMode.LEADER.value] = (
                 leader_receipt.eq_outputs[ExecutionMode.LEADER.value]
@@ -152,48 +196,32 @@ class GenVM:
 
         calldata = _FAKE_DECODED_DATA
 
-        with redirect_stdout(stdout_buffer), safe_globals(
-            {
-                "contract_runner": self.contract_runner,
-                "Contract": partial(
+        with redirect_output(stdout_buffer), execution_context(
+            self._execution_context(
+                code_to_deploy,
+                partial(
                     ExternalContract,
                     self.contract_runner.contract_snapshot_factory,
                     lambda x: self.pending_transactions.append(x),
                     self,
                 ),
-            }
-        ):
-            local_namespace = {}
-            exec(code_to_deploy, globals(), local_namespace)
-
-            contract_class = local_namespace[class_name]
-
-            # Ensure the class and other necessary elements are in the global local_namespace if needed
-            for name, value in local_namespace.items():
-                globals()[name] = value
-
-            module = sys.modules[__name__]
-            setattr(module, class_name, contract_class)
+            )
+        ) as context:
+            contract_class = context.namespace[class_name]
 
-            encoded_pickled_object = None  # Default value in order to have something to return in case of error
+            pickled_object = None  # Default value in order to have something to return in case of error
             try:
-                calldata = calldata_decode(calldata_raw)
-                ctor_args = calldata["args"]
-                if not isinstance(ctor_args, list):
-                    raise Exception(
-                        f"Invalid arguments, list expected, got {ctor_args}"
-                    )
+                calldata = calldata_decode_lazy(calldata_raw)
+                ctor_method = getattr(contract_class, "__init__")
+                ctor_args = _method_args(calldata, ctor_method)
                 # Manual instantiation of the class is done to handle async __init__ methods
                 current_contract = contract_class.__new__(contract_class, *ctor_args)
-                ctor_method = getattr(contract_class, "__init__")
-                if inspect.iscoroutinefunction(ctor_method):
-                    await ctor_method(current_contract, *ctor_args)
-                else:
-                    ctor_method(current_contract, *ctor_args)
+                with self._gas_metering():
+                    if inspect.iscoroutinefunction(ctor_method):
+                        await ctor_method(current_contract, *ctor_args)
+                    else:
+                        ctor_method(current_contract, *ctor_args)
                 pickled_object = pickle.dumps(current_contract)
-                encoded_pickled_object = base64.b64encode(pickled_object).decode(
-                    "utf-8"
-                )
 
             except Exception as e:
                 trace = traceback.format_exc()
@@ -214,9 +242,6 @@ class GenVM:
                     )
                 )
 
-            ## Clean up
-            delattr(module, class_name)
-
         if self.contract_runner.mode == ExecutionMode.LEADER:
             captured_stdout = stdout_buffer.getvalue()
 
@@ -240,7 +265,7 @@ class GenVM:
 
         return self._generate_receipt(
             class_name,
-            encoded_pickled_object,
+            pickled_object,
             calldata_raw,
             execution_result,
             error,
@@ -257,8 +282,6 @@ class GenVM:
         execution_result = ExecutionResultStatus.SUCCESS
         error = None
 
-        self.eq_principle.contract_runner = self.contract_runner
-
         if self.contract_runner.mode == ExecutionMode.VALIDATOR:
             self.contract_runner.eq_outputs[ExecutionMode.LEADER.value] = (
                 leader_receipt.eq_outputs[ExecutionMode.LEADER.value]
@@ -269,43 +292,31 @@ class GenVM:
 
         calldata = _FAKE_DECODED_DATA
 
-        with redirect_stdout(stdout_buffer), safe_globals(
-            {
-                "contract_runner": self.contract_runner,
-                "Contract": partial(
+        with redirect_output(stdout_buffer), execution_context(
+            self._execution_context(
+                contract_code,
+                partial(
                     ExternalContract,
                     self.contract_runner.contract_snapshot_factory,
                     lambda x: self.pending_transactions.append(x),
                     self,
                 ),
-            }
+            )
         ):
-            local_namespace = {}
-            # Execute the code to ensure all classes are defined in the local_namespace
-            exec(contract_code, globals(), local_namespace)
-
-            # Ensure the class and other necessary elements are in the global local_namespace if needed
-            globals().update(local_namespace)
-
-            contract_encoded_state = self.snapshot.encoded_state
-            decoded_pickled_object = base64.b64decode(contract_encoded_state)
-            current_contract = pickle.loads(decoded_pickled_object)
+            current_contract = pickle.loads(self.snapshot.state)
 
             method_name = "<error parsing>"
             method_args = []
             try:
-                calldata = calldata_decode(calldata_raw)
+                calldata = calldata_decode_lazy(calldata_raw)
                 method_name = calldata["method"]
-                method_args = calldata["args"]
-                if not isinstance(method_args, list):
-                    raise Exception(
-                        f"Invalid arguments, list expected, got {method_args}"
-                    )
                 function_to_run = getattr(current_contract, method_name)
-                if inspect.iscoroutinefunction(function_to_run):
-                    await function_to_run(*method_args)
-                else:
-                    function_to_run(*method_args)
+                method_args = _method_args(calldata, function_to_run)
+                with self._gas_metering():
+                    if inspect.iscoroutinefunction(function_to_run):
+                        await function_to_run(*method_args)
+                    else:
+                        function_to_run(*method_args)
             except Exception as e:
                 trace = traceback.format_exc()
                 error = e
@@ -327,7 +338,6 @@ class GenVM:
                 )
 
             pickled_object = pickle.dumps(current_contract)
-            encoded_pickled_object = base64.b64encode(pickled_object).decode("utf-8")
             class_name = self._get_contract_class_name(contract_code)
 
         if self.contract_runner.mode == ExecutionMode.LEADER:
@@ -353,7 +363,7 @@ class GenVM:
 
         return self._generate_receipt(
             class_name,
-            encoded_pickled_object,
+            pickled_object,
             calldata_raw,
             execution_result,
             error,
@@ -361,50 +371,58 @@ class GenVM:
 
     @staticmethod
     def get_contract_schema(contract_code: str) -> dict:
+        contract_schema = get_cached_schema(contract_code)
+        if contract_schema is not None:
+            return contract_schema
 
-        namespace = {}
-        with safe_globals():
-            exec(contract_code, globals(), namespace)
-            class_name = GenVM._get_contract_class_name(contract_code)
+        class_name = GenVM._get_contract_class_name(contract_code)
 
-            iclass = namespace[class_name]
+        methods = extract_schema_methods(contract_code, class_name)
+        if methods is None:
+            namespace = code_cache.get_namespace(contract_code, _contract_globals)
+            methods = GenVM._get_class_schema_methods(namespace[class_name])
 
-            members = inspect.getmembers(iclass)
+        abi = GenVM.generate_abi_from_schema_methods(methods)
 
-            # Find all class methods
-            methods = {}
-            functions_and_methods = [
-                m for m in members if inspect.isfunction(m[1]) or inspect.ismethod(m[1])
-            ]
-            for name, member in functions_and_methods:
-                signature = inspect.signature(member)
+        contract_schema = {
+            "class": class_name,
+            "abi": abi,
+        }
+        cache_schema(contract_code, contract_schema)
 
-                inputs = {}
-                for (
-                    method_variable_name,
-                    method_variable,
-                ) in signature.parameters.items():
-                    if method_variable_name != "self":
-                        annotation = str(method_variable.annotation)[8:-2]
-                        inputs[method_variable_name] = str(annotation)
+        return contract_schema
 
-                return_annotation = str(signature.return_annotation)[8:-2]
+    @staticmethod
+    def _get_class_schema_methods(iclass: type) -> dict:
+        members = inspect.getmembers(iclass)
 
-                if return_annotation == "inspect._empty":
-                    return_annotation = "None"
+        # Find all class methods
+        methods = {}
+        functions_and_methods = [
+            m for m in members if inspect.isfunction(m[1]) or inspect.ismethod(m[1])
+        ]
+        for name, member in functions_and_methods:
+            signature = inspect.signature(member)
 
-                result = {"inputs": inputs, "output": return_annotation}
+            inputs = {}
+            for (
+                method_variable_name,
+                method_variable,
+            ) in signature.parameters.items():
+                if method_variable_name != "self":
+                    annotation = str(method_variable.annotation)[8:-2]
+                    inputs[method_variable_name] = str(annotation)
 
-                methods[name] = result
+            return_annotation = str(signature.return_annotation)[8:-2]
 
-            abi = GenVM.generate_abi_from_schema_methods(methods)
+            if return_annotation == "inspect._empty":
+                return_annotation = "None"
 
-            contract_schema = {
-                "class": class_name,
-                "abi": abi,
-            }
+            result = {"inputs": inputs, "output": return_annotation}
 
-        return contract_schema
+            methods[name] = result
+
+        return methods
 
     @staticmethod
     def get_abi_param_type(param_type: str) -> str:
@@ -472,40 +490,45 @@ class GenVM:
     def get_contract_data(
         self,
         code: str,
-        state: str,
+        state: bytes | Callable[[], bytes],
         calldata_raw: bytes,
         contract_snapshot_factory: Callable[[str], ContractSnapshot],
+        contract_address: str | None = None,
+        contract_state_hash: str | None = None,
     ) -> Any:
+        """
+        `contract_address` allows caching the unpickled state, see `state_cache`.
+        `state` can be a function loading it, it's only called if the state isn't cached.
+        """
+        load_state = state if callable(state) else lambda: state
         result = None
-        decoded_pickled_object = base64.b64decode(state)
         output_buffer = io.StringIO()
 
-        with redirect_stdout(output_buffer), redirect_stderr(
-            output_buffer
-        ), safe_globals(
-            {
-                "Contract": partial(
+        with redirect_output(output_buffer, output_buffer), execution_context(
+            self._execution_context(
+                code,
+                partial(
                     ExternalContract,
                     contract_snapshot_factory,
                     None,  # TODO: should read methods be allowed to add new transactions?
                     self,
-                )
-            }
+                ),
+            )
         ):
-            local_namespace = {}
-            # Execute the code to ensure all classes are defined in the namespace
-            exec(code, globals(), local_namespace)
-
-            # Ensure the class and other necessary elements are in the global namespace if needed
-            globals().update(local_namespace)
-
-            calldata = calldata_decode(calldata_raw)
+            calldata = calldata_decode_lazy(calldata_raw)
             method_name = calldata["method"]
-            method_args = calldata["args"]
 
-            contract_state = pickle.loads(decoded_pickled_object)
-            method_to_call = getattr(contract_state, method_name)
-            result = method_to_call(*method_args)
+            if contract_address is None:
+                contract_state = nullcontext(pickle.loads(load_state()))
+            else:
+                contract_state = state_cache.use_instance(
+                    contract_address,
+                    contract_state_hash or state_hash(load_state()),
+                    load_state,
+                )
+            with contract_state as contract_instance:
+                method_to_call = getattr(contract_instance, method_name)
+                result = method_to_call(*_method_args(calldata, method_to_call))
 
             captured_stdout = output_buffer.getvalue()
 
@@ -548,11 +571,14 @@ class ExternalContract:
     def __getattr__(self, name):
         def method(*args):  # kwargs are not supported yet
             if re.match("get_", name):
+                self.genvm.contract_runner.nondeterministic = True
                 return self.genvm.get_contract_data(
                     self.contract_snapshot.contract_code,
-                    self.contract_snapshot.encoded_state,
+                    lambda: self.contract_snapshot.state,
                     calldata_encode({"method": name, "args": args}),
                     self.contract_snapshot_factory,
+                    self.address,
+                    getattr(self.contract_snapshot, "state_hash", None),
                 )
             else:
                 self.schedule_pending_transaction(
@@ -565,3 +591,12 @@ class ExternalContract:
             return None
 
         return method
+
+
+# Globals the contract code is executed with. Each contract gets its own copy (see `code_cache.get_namespace`), the execution specific ones are resolved through `runtime.current_execution_context`
+_contract_globals = {
+    **{name: value for name, value in globals().items() if name != "__getattr__"},
+    "contract_runner": ContractRunnerProxy(),
+    "Contract": contract_proxy,
+    "VectorStore": VectorStore,
+}
@@ -1,5 +1,6 @@
 from .types import Address
-from typing import Any
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Iterator
 
 BITS_IN_TYPE = 3
 
@@ -18,145 +19,415 @@ SPECIAL_ADDR = (3 << BITS_IN_TYPE) | TYPE_SPECIAL
 
 
 def encode(x: Any) -> bytes:
+    # Dispatches on the exact type of the common values first, other values
+    # (subclasses, addresses, bytes) go through the isinstance checks.
+    # uleb128 prefixes are written inline, this runs for every value
     mem = bytearray()
+    append = mem.append
+    extend = mem.extend
 
     def append_uleb128(i):
         assert i >= 0
-        if i == 0:
-            mem.append(0)
-        while i > 0:
-            cur = i & 0x7F
-            i = i >> 7
-            if i > 0:
-                cur |= 0x80
-            mem.append(cur)
+        while i > 0x7F:
+            append((i & 0x7F) | 0x80)
+            i >>= 7
+        append(i)
 
     def impl(b):
-        if b is None:
-            mem.append(SPECIAL_NULL)
+        typ = type(b)
+        if typ is str:
+            b = b.encode("utf-8")
+            lb = (len(b) << 3) | TYPE_STR
+            while lb > 0x7F:
+                append((lb & 0x7F) | 0x80)
+                lb >>= 7
+            append(lb)
+            extend(b)
+        elif typ is int:
+            if b >= 0:
+                b = (b << 3) | TYPE_PINT
+            else:
+                b = ((-b - 1) << 3) | TYPE_NINT
+            while b > 0x7F:
+                append((b & 0x7F) | 0x80)
+                b >>= 7
+            append(b)
+        elif typ is list or typ is tuple:
+            lb = (len(b) << 3) | TYPE_ARR
+            while lb > 0x7F:
+                append((lb & 0x7F) | 0x80)
+                lb >>= 7
+            append(lb)
+            for x in b:
+                impl(x)
+        elif typ is dict:
+            impl_map(b)
+        elif b is None:
+            append(SPECIAL_NULL)
         elif b is True:
-            mem.append(SPECIAL_TRUE)
+            append(SPECIAL_TRUE)
         elif b is False:
-            mem.append(SPECIAL_FALSE)
+            append(SPECIAL_FALSE)
         elif isinstance(b, int):
             if b >= 0:
-                b = (b << 3) | TYPE_PINT
-                append_uleb128(b)
+                append_uleb128((b << 3) | TYPE_PINT)
             else:
-                b = -b - 1
-                b = (b << 3) | TYPE_NINT
-                append_uleb128(b)
+                append_uleb128(((-b - 1) << 3) | TYPE_NINT)
         elif isinstance(b, Address):
-            mem.append(SPECIAL_ADDR)
-            mem.extend(b.as_bytes)
+            append(SPECIAL_ADDR)
+            extend(b.as_bytes)
         elif isinstance(b, bytes):
-            lb = len(b)
-            lb = (lb << 3) | TYPE_BYTES
-            append_uleb128(lb)
-            mem.extend(b)
+            append_uleb128((len(b) << 3) | TYPE_BYTES)
+            extend(b)
         elif isinstance(b, str):
             b = b.encode("utf-8")
-            lb = len(b)
-            lb = (lb << 3) | TYPE_STR
-            append_uleb128(lb)
-            mem.extend(b)
+            append_uleb128((len(b) << 3) | TYPE_STR)
+            extend(b)
         elif isinstance(b, (list, tuple)):
-            lb = len(b)
-            lb = (lb << 3) | TYPE_ARR
-            append_uleb128(lb)
+            append_uleb128((len(b) << 3) | TYPE_ARR)
             for x in b:
                 impl(x)
         elif isinstance(b, dict):
-            keys = list(b.keys())
-            keys.sort()
-            le = len(keys)
-            le = (le << 3) | TYPE_MAP
-            append_uleb128(le)
-            for k in keys:
-                if not isinstance(k, str):
-                    raise Exception(f"key is not string {type(k)}")
-                bts = k.encode("utf-8")
-                append_uleb128(len(bts))
-                mem.extend(bts)
-                impl(b[k])
+            impl_map(b)
+        elif isinstance(b, (LazyArray, LazyMap)):
+            extend(b.encoded())
         else:
             raise Exception(f"invalid type {type(b)}")
 
+    def impl_map(b: dict):
+        keys = sorted(b.keys())
+        append_uleb128((len(keys) << 3) | TYPE_MAP)
+        for k in keys:
+            if not isinstance(k, str):
+                raise Exception(f"key is not string {type(k)}")
+            bts = k.encode("utf-8")
+            append_uleb128(len(bts))
+            extend(bts)
+            impl(b[k])
+
     impl(x)
     return bytes(mem)
 
 
 def decode(mem0) -> Any:  # type: ignore
-    mem: memoryview = memoryview(mem0)
+    # Reads `mem` at integer offsets instead of slicing it, each value is
+    # returned with the offset following it
+    mem = mem0 if isinstance(mem0, bytes) else bytes(mem0)
+    mem_len = len(mem)
 
-    def read_uleb128() -> int:
-        nonlocal mem
+    def read_uleb128(off: int) -> tuple[int, int]:
         ret = 0
-        off = 0
+        shift = 0
         while True:
-            m = mem[0]
-            ret = ret | ((m & 0x7F) << off)
-            off += 7
-            mem = mem[1:]
+            m = mem[off]
+            off += 1
+            ret |= (m & 0x7F) << shift
+            shift += 7
             if (m & 0x80) == 0:
-                break
-        return ret
+                return ret, off
 
-    def impl() -> Any:
-        nonlocal mem
-        code = read_uleb128()
+    def read_bytes(off: int, size: int) -> tuple[bytes, int]:
+        end = off + size
+        if end > mem_len:
+            raise Exception(f"unexpected end of calldata, {size} bytes at {off}")
+        return mem[off:end], end
+
+    def impl(off: int) -> tuple[Any, int]:
+        code = mem[off]
+        off += 1
+        if code & 0x80:
+            code &= 0x7F
+            shift = 7
+            while True:
+                m = mem[off]
+                off += 1
+                code |= (m & 0x7F) << shift
+                shift += 7
+                if (m & 0x80) == 0:
+                    break
         typ = code & 0x7
         if typ == TYPE_SPECIAL:
             if code == SPECIAL_NULL:
-                return None
+                return None, off
             if code == SPECIAL_FALSE:
-                return False
+                return False, off
             if code == SPECIAL_TRUE:
-                return True
+                return True, off
             if code == SPECIAL_ADDR:
-                ret_addr = mem[: Address.SIZE]
-                mem = mem[Address.SIZE :]
-                return Address(ret_addr)
+                ret_addr, off = read_bytes(off, Address.SIZE)
+                return Address(ret_addr), off
             raise Exception(f"Unknown special {bin(code)} {hex(code)}")
         code = code >> 3
         if typ == TYPE_PINT:
-            return code
-        elif typ == TYPE_NINT:
-            return -code - 1
-        elif typ == TYPE_BYTES:
-            ret_bytes = mem[:code]
-            mem = mem[code:]
-            return bytes(ret_bytes)
+            return code, off
         elif typ == TYPE_STR:
-            ret_str = mem[:code]
-            mem = mem[code:]
-            return str(ret_str, encoding="utf-8")
+            end = off + code
+            if end > mem_len:
+                raise Exception(f"unexpected end of calldata, {code} bytes at {off}")
+            return str(mem[off:end], encoding="utf-8"), end
         elif typ == TYPE_ARR:
-            ret_arr = []
-            for _i in range(code):
-                ret_arr.append(impl())
-            return ret_arr
+            ret_arr = [None] * code
+            for i in range(code):
+                ret_arr[i], off = impl(off)
+            return ret_arr, off
+        elif typ == TYPE_NINT:
+            return -code - 1, off
         elif typ == TYPE_MAP:
             ret_dict: dict[str, Any] = {}
             prev = None
             for _i in range(code):
-                le = read_uleb128()
-                key = str(mem[:le], encoding="utf-8")
-                mem = mem[le:]
+                le = mem[off]
+                if le & 0x80:
+                    le, off = read_uleb128(off)
+                else:
+                    off += 1
+                end = off + le
+                if end > mem_len:
+                    raise Exception(f"unexpected end of calldata, {le} bytes at {off}")
+                key = str(mem[off:end], encoding="utf-8")
+                off = end
                 if prev is not None:
                     assert prev < key
                 prev = key
                 assert key not in ret_dict
-                ret_dict[key] = impl()
-            return ret_dict
+                ret_dict[key], off = impl(off)
+            return ret_dict, off
+        elif typ == TYPE_BYTES:
+            return read_bytes(off, code)
         raise Exception(f"invalid type {typ}")
 
-    res = impl()
-    if len(mem) != 0:
-        raise Exception(f"unparsed end {bytes(mem[:5])!r}... (decoded {res})")
+    res, off = impl(0)
+    if off != mem_len:
+        raise Exception(f"unparsed end {mem[off:off + 5]!r}... (decoded {res})")
+    return res
+
+
+# Lazy decoding
+#
+# Arrays and maps are decoded on demand: `decode_lazy` returns `LazyArray` and
+# `LazyMap` views of the calldata, their items are only decoded when accessed,
+# so methods handling bulk inputs one item at a time don't need the whole
+# decoded structure in memory. Methods opt in with `@lazy_calldata`.
+
+
+def lazy_calldata(function: Callable) -> Callable:
+    """Marks a contract method as accepting `LazyArray` and `LazyMap` arguments"""
+    function.__lazy_calldata__ = True
+    return function
+
+
+def accepts_lazy_calldata(function: Callable) -> bool:
+    return getattr(function, "__lazy_calldata__", False)
+
+
+def _read_uleb128(mem: bytes, off: int) -> tuple[int, int]:
+    ret = 0
+    shift = 0
+    while True:
+        m = mem[off]
+        off += 1
+        ret |= (m & 0x7F) << shift
+        shift += 7
+        if (m & 0x80) == 0:
+            return ret, off
+
+
+def _skip(mem: bytes, off: int) -> int:
+    """Returns the offset following the value at `off`, without decoding it"""
+    # Array items are counted in `pending` instead of recursing
+    pending = 1
+    while pending:
+        pending -= 1
+        code = mem[off]
+        off += 1
+        typ = code & 0x7
+        if typ == TYPE_PINT or typ == TYPE_NINT:
+            if code & 0x80:
+                while mem[off] & 0x80:
+                    off += 1
+                off += 1
+            continue
+        if code & 0x80:
+            code, off = _read_uleb128(mem, off - 1)
+        if typ == TYPE_STR or typ == TYPE_BYTES:
+            off += code >> 3
+        elif typ == TYPE_ARR:
+            pending += code >> 3
+        elif typ == TYPE_MAP:
+            for _i in range(code >> 3):
+                le, off = _read_uleb128(mem, off)
+                off = _skip(mem, off + le)
+        elif code == SPECIAL_ADDR:
+            off += Address.SIZE
+        elif code not in (SPECIAL_NULL, SPECIAL_FALSE, SPECIAL_TRUE):
+            if typ == TYPE_SPECIAL:
+                raise Exception(f"Unknown special {bin(code)} {hex(code)}")
+            raise Exception(f"invalid type {typ}")
+    if off > len(mem):
+        raise Exception(f"unexpected end of calldata at {off}")
+    return off
+
+
+def _decode_lazy(mem: bytes, off: int, end: int | None = None) -> tuple[Any, int]:
+    """Decodes the value at `off`, arrays and maps are returned as lazy views. `end` is the offset following the value, if already known"""
+    code = mem[off]
+    if code & 0x80:
+        code, data_off = _read_uleb128(mem, off)
+    else:
+        data_off = off + 1
+    typ = code & 0x7
+    if typ == TYPE_PINT:
+        return code >> 3, data_off
+    if typ == TYPE_NINT:
+        return -(code >> 3) - 1, data_off
+    if end is None:
+        end = _skip(mem, off)
+    if typ == TYPE_STR:
+        return str(mem[data_off:end], encoding="utf-8"), end
+    if typ == TYPE_ARR:
+        return LazyArray(mem, off, data_off, code >> 3, end), end
+    if typ == TYPE_MAP:
+        return LazyMap(mem, off, data_off, code >> 3, end), end
+    return decode(mem[off:end]), end
+
+
+class LazyArray(Sequence):
+    def __init__(self, mem: bytes, off: int, data_off: int, length: int, end: int):
+        self._mem = mem
+        self._off = off  # Offset of the header
+        self._data_off = data_off  # Offset of the first item
+        self._length = length
+        self._end = end
+        # Offsets of the items followed by `end`, computed on the first access by index
+        self._offsets: list[int] | None = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[Any]:
+        mem = self._mem
+        off = self._data_off
+        for i in range(self._length):
+            # The end of the last item is known, no need to skip over it
+            item, off = _decode_lazy(
+                mem, off, self._end if i == self._length - 1 else None
+            )
+            yield item
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("LazyArray index out of range")
+        if self._offsets is None:
+            offsets = [self._data_off]
+            for _i in range(self._length - 1):
+                offsets.append(_skip(self._mem, offsets[-1]))
+            offsets.append(self._end)
+            self._offsets = offsets
+        return _decode_lazy(self._mem, self._offsets[index], self._offsets[index + 1])[
+            0
+        ]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (LazyArray, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"LazyArray({self._length} items)"
+
+    def __reduce__(self):
+        # Stored in a contract state as a list, not as a view on the calldata
+        return (list, (self.materialize(),))
+
+    def encoded(self) -> bytes:
+        return self._mem[self._off : self._end]
+
+    def materialize(self) -> list:
+        return decode(self.encoded())
+
+
+class LazyMap(Mapping):
+    def __init__(self, mem: bytes, off: int, data_off: int, length: int, end: int):
+        self._mem = mem
+        self._off = off  # Offset of the header
+        self._data_off = data_off  # Offset of the first key
+        self._length = length
+        self._end = end
+        # Offsets of the values by key (start, end), computed on first access
+        self._offsets: dict[str, tuple[int, int]] | None = None
+
+    def _get_offsets(self) -> dict[str, tuple[int, int]]:
+        if self._offsets is None:
+            mem = self._mem
+            offsets = {}
+            prev = None
+            off = self._data_off
+            for i in range(self._length):
+                le, off = _read_uleb128(mem, off)
+                key = str(mem[off : off + le], encoding="utf-8")
+                off += le
+                if prev is not None:
+                    assert prev < key
+                prev = key
+                if i == self._length - 1:
+                    offsets[key] = (off, self._end)
+                else:
+                    value_end = _skip(mem, off)
+                    offsets[key] = (off, value_end)
+                    off = value_end
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._get_offsets())
+
+    def __getitem__(self, key: str) -> Any:
+        return _decode_lazy(self._mem, *self._get_offsets()[key])[0]
+
+    def __contains__(self, key) -> bool:
+        return key in self._get_offsets()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (LazyMap, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"LazyMap({self._length} items)"
+
+    def __reduce__(self):
+        # Stored in a contract state as a dict, not as a view on the calldata
+        return (dict, (self.materialize(),))
+
+    def encoded(self) -> bytes:
+        return self._mem[self._off : self._end]
+
+    def materialize(self) -> dict:
+        return decode(self.encoded())
+
+
+def decode_lazy(mem0) -> Any:
+    mem = mem0 if isinstance(mem0, bytes) else bytes(mem0)
+    res, off = _decode_lazy(mem, 0)
+    if off != len(mem):
+        raise Exception(f"unparsed end {mem[off:off + 5]!r}... (decoded {res})")
     return res
 
 
+def materialize(value: Any) -> Any:
+    """Decodes the whole of a lazily decoded value"""
+    if isinstance(value, (LazyArray, LazyMap)):
+        return value.materialize()
+    return value
+
+
 def to_str(d: Any) -> str:
     buf: list[str] = []
 
@@ -177,7 +448,7 @@ def to_str(d: Any) -> str:
         elif isinstance(d, Address):
             buf.append("addr#")
             buf.append(d.as_bytes.hex())
-        elif isinstance(d, dict):
+        elif isinstance(d, (dict, LazyMap)):
             buf.append("{")
             for k, v in d.items():
                 buf.append(f"{k!r}")
@@ -185,7 +456,7 @@ def to_str(d: Any) -> str:
                 impl(v)
                 buf.append(",")
             buf.append("}")
-        elif isinstance(d, list):
+        elif isinstance(d, (list, LazyArray)):
             buf.append("[")
             for v in d:
                 impl(v)
@@ -0,0 +1,126 @@
+# backend/node/genvm/code_cache.py
+
+"""
+Cache of compiled contract code.
+
+Every validator of every transaction and every `eth_call` used to parse, compile and execute the source of the contract just to get its class. Contracts are now compiled and their top level executed once, the resulting namespace (classes, functions, imports) is kept in an LRU keyed by the hash of the source.
+Since classes are shared between executions, a contract mutating its class attributes would see the changes in later executions of the same process. Contract state must live in the instance, which is what gets persisted anyway.
+"""
+
+import hashlib
+import marshal
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import CodeType
+
+from dotenv import load_dotenv
+
+from backend.node.genvm.gas import CONTRACT_FILENAME, instrument_code
+
+load_dotenv()
+
+DEFAULT_CODE_CACHE_MAX_ENTRIES = 256
+DEFAULT_CODE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class CachedContractCode:
+    code: CodeType
+    # Namespace resulting from executing `code`, None until it is first executed
+    namespace: dict | None
+    size: int
+
+
+class CodeCache:
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, CachedContractCode] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The RPC server (`eth_call`) and the consensus run in different threads
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(contract_code: str) -> str:
+        return hashlib.sha256(contract_code.encode("utf-8")).hexdigest()
+
+    def _get_entry(self, contract_code: str) -> CachedContractCode:
+        key = self._key(contract_code)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        code = compile(contract_code, CONTRACT_FILENAME, "exec")
+        instrument_code(code)
+        entry = CachedContractCode(
+            code=code,
+            namespace=None,
+            size=len(contract_code) + len(marshal.dumps(code)),
+        )
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = entry
+                self.size += entry.size
+                self._evict()
+            return self.entries.get(key, entry)
+
+    def _evict(self):
+        # The entry just added is kept even if it's bigger than `max_bytes` on its own, it's still needed by the caller
+        while len(self.entries) > 1 and (
+            len(self.entries) > self.max_entries or self.size > self.max_bytes
+        ):
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def get_code(self, contract_code: str) -> CodeType:
+        return self._get_entry(contract_code).code
+
+    def get_namespace(self, contract_code: str, globals_: dict) -> dict:
+        """
+        Returns the namespace resulting from executing the top level of `contract_code` in a copy of `globals_`, as `exec(contract_code, namespace)` would.
+        The namespace is both the globals and the locals of the code, so functions of the contract see its classes without touching any module globals.
+        The top level is only executed the first time, callers get a copy of the cached namespace.
+        """
+        entry = self._get_entry(contract_code)
+        if entry.namespace is None:
+            namespace = dict(globals_)
+            exec(entry.code, namespace)
+            entry.namespace = namespace
+        return dict(entry.namespace)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+code_cache = CodeCache(
+    int(os.getenv("GENVM_CODE_CACHE_MAX_ENTRIES", DEFAULT_CODE_CACHE_MAX_ENTRIES)),
+    int(os.getenv("GENVM_CODE_CACHE_MAX_BYTES", DEFAULT_CODE_CACHE_MAX_BYTES)),
+)
+
+
+def get_code_cache_metrics() -> dict:
+    return code_cache.get_metrics()
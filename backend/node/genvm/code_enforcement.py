@@ -1,199 +1,170 @@
 import ast
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Results are memoized by source hash, deploying the same code again is free
+MAX_CACHED_RESULTS = 256
+
+_results: OrderedDict[tuple[str, str], dict] = OrderedDict()
+_results_lock = threading.Lock()
 
 
 def code_enforcement_check(code: str, class_name: str) -> str:
+    key = (hashlib.sha256(code.encode("utf-8")).hexdigest(), class_name)
+    with _results_lock:
+        result = _results.get(key)
+        if result is not None:
+            _results.move_to_end(key)
+            return copy.deepcopy(result)
+
+    result = _code_enforcement_check(code, class_name)
+
+    with _results_lock:
+        _results[key] = result
+        while len(_results) > MAX_CACHED_RESULTS:
+            _results.popitem(last=False)
+    return copy.deepcopy(result)
+
+
+def _code_enforcement_check(code: str, class_name: str) -> dict:
     result = {"status": "error", "message": "", "data": []}
     # Check is valid Python code
-    code_check_result = _check_code(code)
-    if code_check_result:
-        result["message"] = code_check_result
+    try:
+        tree = ast.parse(code)
+    except Exception:
+        result["message"] = "Your code is not valid Python code"
         return result
+    visitor = CodeEnforcementVisitor(class_name)
+    visitor.visit(tree)
     # See if the class exists
-    if not _does_class_exist_in_code(code, class_name):
+    if not visitor.class_exists:
         result["message"] = f"The class {class_name} does not exist in the code"
         return result
     # Make sure there are no raw instantiations of the EquivalencePrinciple class
-    if _code_has_bad_implementations_of_eq_principle(code):
+    if visitor.eq_async_with_linenos != visitor.eq_call_linenos:
         result["message"] = (
             "You cannot directly instantiate the EquivalencePrinciple class"
         )
         return result
     # Make sure that no code modifies self inside an equivalence block
-    linenos_list = _linenos_of_where_code_modifys_self_in_eq_block(code, class_name)
-    if len(linenos_list):
+    if len(visitor.modifies_self_linenos):
         result["message"] = "Self was modified inside an equivalence block"
-        result["data"] = linenos_list
+        result["data"] = visitor.modifies_self_linenos
         return result
     # Make sure no equivalence block variables are referenced outside the block
-    linenos_list = _code_references_eq_block_variables(code, class_name)
-    if len(linenos_list):
+    if len(visitor.referenced_block_variables):
         result["message"] = (
             "Variables declared in the equivalence block are referenced outside of the equivalence block"
         )
-        result["data"] = linenos_list
+        result["data"] = visitor.referenced_block_variables
         return result
     result["status"] = "success"
     return result
 
 
-def _check_code(code: str):
-    try:
-        ast.parse(code)
-        return None
-    except Exception:
-        return "Your code is not valid Python code"
-
-
-def _does_class_exist_in_code(code: str, class_name: str) -> bool:
-    visitor = ClassExistsVisitor(class_name)
-    visitor.visit(ast.parse(code))
-    return visitor.class_exists
-
-
-# Visits each class in the code and checks if the
-# class name matches the class name poassed in
-class ClassExistsVisitor(ast.NodeVisitor):
-    def __init__(self, class_name):
-        self.class_name = class_name
-        self.class_exists = False
-
-    def visit_ClassDef(self, node):
-        if node.name == self.class_name:
-            self.class_exists = True
-        self.generic_visit(node)
-
-
-def _code_has_bad_implementations_of_eq_principle(code: str) -> bool:
-    visitor = EquivalencePrincipleVisitor()
-    visitor.visit(ast.parse(code))
-    if visitor.all_eq_line_nums != visitor.eq_line_nums_inside_async_waith_blocks:
-        return True
-    return False
-
-
-class EquivalencePrincipleVisitor(ast.NodeVisitor):
+def _is_eq_principle_call(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id == "EquivalencePrinciple"
+    )
 
-    def __init__(self):
-        self.all_eq_line_nums = []
-        self.eq_line_nums_inside_async_waith_blocks = []
 
-    # All the places where the EquivalencePrinciple class is called
-    def visit_Call(self, node):
-        if isinstance(node.func, ast.Name) and node.func.id == "EquivalencePrinciple":
-            self.eq_line_nums_inside_async_waith_blocks.append(node.lineno)
-        self.generic_visit(node)
+class CodeEnforcementVisitor:
+    """
+    Runs all the checks in a single walk of the tree.
 
-    # All the places where the EquivalencePrinciple class is called within an async with block
-    def visit_AsyncWith(self, node):
-        async_ctx = node.items[0].context_expr
-        if isinstance(async_ctx, ast.Call) and isinstance(async_ctx.func, ast.Name):
-            if async_ctx.func.id == "EquivalencePrinciple":
-                self.all_eq_line_nums.append(node.lineno)
-        self.generic_visit(node)
-
-
-def _linenos_of_where_code_modifys_self_in_eq_block(code: str, class_name) -> bool:
-    visitor = EquivalencePrincipleModifySelfVisitor(class_name)
-    visitor.visit(ast.parse(code))
-    return visitor.modeifies_self_linenos
-
-
-class EquivalencePrincipleModifySelfVisitor(ast.NodeVisitor):
-
-    def __init__(self, class_name):
-        self.class_name = class_name
-        self.inside_call_method = False
-        self.inside_eq_block = False
-        self.modeifies_self_linenos = []
-
-    # Mark the fact that we are inside the code's class method
-    def visit_ClassDef(self, node):
-        if node.name == self.class_name:
-            for body_item in node.body:
-                if (
-                    isinstance(body_item, ast.AsyncFunctionDef)
-                    and body_item.name != "__init__"
-                ):
-                    self.inside_call_method = True
-                    self.generic_visit(body_item)
-                    self.inside_call_method = False
-
-    # Mark thew fact that we are inside an equivalence block
-    def visit_AsyncWith(self, node):
-        async_ctx = node.items[0].context_expr
-        if isinstance(async_ctx, ast.Call) and isinstance(async_ctx.func, ast.Name):
-            if async_ctx.func.id == "EquivalencePrinciple":
-                self.inside_eq_block = True
-                self.generic_visit(node)
-                self.inside_eq_block = False
-
-    # Record all assignments of class variables done inside an
-    # equivalence block
-    def visit_Assign(self, node):
-        for target in node.targets:
-            if self.inside_call_method and self.inside_eq_block:
-                if (
-                    isinstance(target, ast.Attribute)
-                    and isinstance(target.value, ast.Name)
-                    and target.value.id == "self"
-                ):
-                    self.modeifies_self_linenos.append(target.lineno)
-        self.generic_visit(node)
-
-
-def _code_references_eq_block_variables(code: str, class_name: str) -> list:
-    visitor = EquivalencePrincipleBlockVariables(class_name)
-    visitor.visit(ast.parse(code))
-    return visitor.referenced_block_variables
-
-
-class EquivalencePrincipleBlockVariables(ast.NodeVisitor):
+    The whole tree is walked to find the class and the EquivalencePrinciple calls. The equivalence
+    block checks only apply to the async methods of the class (except `__init__`) and skip the
+    async with blocks that aren't equivalence blocks, those nodes are walked with `in_scope` False.
+    """
 
     def __init__(self, class_name: str):
         self.class_name = class_name
+        self.class_exists = False
+        # All the places where the EquivalencePrinciple class is called
+        self.eq_call_linenos = []
+        # All the places where the EquivalencePrinciple class is called within an async with block
+        self.eq_async_with_linenos = []
         self.inside_call_method = False
         self.inside_eq_block = False
-        self.has_visited_eq_block = False
         self.eq_block_variables = []
+        self.modifies_self_linenos = []
         self.referenced_block_variables = []
 
+    def visit(self, node: ast.AST, in_scope: bool = True):
+        if isinstance(node, ast.ClassDef):
+            self.visit_ClassDef(node, in_scope)
+        elif isinstance(node, ast.AsyncWith):
+            self.visit_AsyncWith(node, in_scope)
+        else:
+            if isinstance(node, ast.Call):
+                self.visit_Call(node)
+            elif in_scope and isinstance(node, ast.Assign):
+                self.visit_Assign(node)
+            elif in_scope and isinstance(node, ast.Name):
+                self.visit_Name(node)
+            self.generic_visit(node, in_scope)
+
+    def generic_visit(self, node: ast.AST, in_scope: bool):
+        for child in ast.iter_child_nodes(node):
+            self.visit(child, in_scope)
+
     # Mark the fact that we are inside the code's class method
-    def visit_ClassDef(self, node):
+    def visit_ClassDef(self, node: ast.ClassDef, in_scope: bool):
         if node.name == self.class_name:
-            for body_item in node.body:
-                if (
-                    isinstance(body_item, ast.AsyncFunctionDef)
-                    and body_item.name != "__init__"
-                ):
-                    self.inside_call_method = True
-                    self.generic_visit(body_item)
-                    self.inside_call_method = False
+            self.class_exists = True
+        if not in_scope or node.name != self.class_name:
+            self.generic_visit(node, False)
+            return
+        for child in ast.iter_child_nodes(node):
+            if (
+                child in node.body
+                and isinstance(child, ast.AsyncFunctionDef)
+                and child.name != "__init__"
+            ):
+                self.inside_call_method = True
+                self.generic_visit(child, True)
+                self.inside_call_method = False
+            else:
+                self.visit(child, False)
+
+    def visit_Call(self, node: ast.Call):
+        if _is_eq_principle_call(node):
+            self.eq_call_linenos.append(node.lineno)
 
     # Mark the fact that we are inside an equivalence block
-    # (and have visited at least one equivalence block)
-    def visit_AsyncWith(self, node):
-        async_ctx = node.items[0].context_expr
-        if isinstance(async_ctx, ast.Call) and isinstance(async_ctx.func, ast.Name):
-            if async_ctx.func.id == "EquivalencePrinciple":
-                self.inside_eq_block = True
-                self.generic_visit(node)
-                self.inside_eq_block = False
-                self.has_visited_eq_block = True
-
-    # Records all the variables declared inside an equivalence block
-    def visit_Assign(self, node):
+    def visit_AsyncWith(self, node: ast.AsyncWith, in_scope: bool):
+        is_eq_block = _is_eq_principle_call(node.items[0].context_expr)
+        if is_eq_block:
+            self.eq_async_with_linenos.append(node.lineno)
+        if in_scope and is_eq_block:
+            self.inside_eq_block = True
+            self.generic_visit(node, True)
+            self.inside_eq_block = False
+        else:
+            self.generic_visit(node, False)
+
+    # Record all assignments of class variables and all variables
+    # declared inside an equivalence block
+    def visit_Assign(self, node: ast.Assign):
+        if not (self.inside_call_method and self.inside_eq_block):
+            return
         for target in node.targets:
             if (
-                isinstance(target, ast.Name)
-                and self.inside_call_method
-                and self.inside_eq_block
+                isinstance(target, ast.Attribute)
+                and isinstance(target.value, ast.Name)
+                and target.value.id == "self"
             ):
+                self.modifies_self_linenos.append(target.lineno)
+            elif isinstance(target, ast.Name):
                 self.eq_block_variables.append(target.id)
-        self.generic_visit(node)
 
     # Records all the variables declared in an equivalence block
     # that are referenced outside of it
-    def visit_Name(self, node):
+    def visit_Name(self, node: ast.Name):
         if (
             self.inside_call_method
             and not self.inside_eq_block
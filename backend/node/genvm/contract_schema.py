@@ -0,0 +1,256 @@
+# backend/node/genvm/contract_schema.py
+
+"""
+Schema extraction of contracts without executing them.
+
+`GenVM.get_contract_schema` used to execute the whole contract, including its imports (e.g. `VectorStore` and sentence-transformers), only to inspect the signatures of its methods. The editor requests the schema every time a contract is saved.
+The methods and their annotations are now read from the AST. Annotations are evaluated on builtin types only, which gives the same `str(annotation)` the introspection of the executed class would. Contracts using anything else in their class or annotations (decorators, imported or user defined types, class attributes that aren't literals, ...) return None and are introspected by executing them as before.
+Contracts are not executed, so errors at the top level of the contract (e.g. a failing import) are only raised when deploying it.
+
+Schemas are cached by the hash of the source, and stored with the contract when it's deployed.
+"""
+
+import ast
+import builtins
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+MAX_CACHED_SCHEMAS = 256
+
+ICONTRACT_MODULE = "backend.node.genvm.icontract"
+
+# Names the annotations can be evaluated with, unless the contract rebinds them
+_ANNOTATION_TYPES = {
+    name: getattr(builtins, name)
+    for name in (
+        "bool",
+        "bytearray",
+        "bytes",
+        "complex",
+        "dict",
+        "float",
+        "frozenset",
+        "int",
+        "list",
+        "object",
+        "set",
+        "str",
+        "tuple",
+        "type",
+    )
+}
+
+# `IContract.__init__` is inherited by contracts without constructor
+_ICONTRACT_INIT = {"inputs": {}, "output": "None"}
+
+
+class _UnsupportedContract(Exception):
+    pass
+
+
+_schemas: OrderedDict[str, dict] = OrderedDict()
+_schemas_lock = threading.Lock()
+
+
+def _key(contract_code: str) -> str:
+    return hashlib.sha256(contract_code.encode("utf-8")).hexdigest()
+
+
+def get_cached_schema(contract_code: str) -> dict | None:
+    key = _key(contract_code)
+    with _schemas_lock:
+        schema = _schemas.get(key)
+        if schema is None:
+            return None
+        _schemas.move_to_end(key)
+    return copy.deepcopy(schema)
+
+
+def cache_schema(contract_code: str, schema: dict):
+    with _schemas_lock:
+        _schemas[_key(contract_code)] = copy.deepcopy(schema)
+        while len(_schemas) > MAX_CACHED_SCHEMAS:
+            _schemas.popitem(last=False)
+
+
+def extract_schema_methods(contract_code: str, class_name: str) -> dict | None:
+    """
+    Returns the methods of the contract class in the format of `GenVM.generate_abi_from_schema_methods`, or None if the contract needs to be executed to get them.
+    """
+    try:
+        tree = ast.parse(contract_code)
+        return _SchemaExtractor(tree, class_name).methods()
+    except (_UnsupportedContract, SyntaxError):
+        return None
+
+
+class _SchemaExtractor:
+    def __init__(self, tree: ast.Module, class_name: str):
+        self.tree = tree
+        self.class_name = class_name
+        # Names bound anywhere in the contract, they could shadow the builtin types in annotations
+        self.bound_names = _bound_names(tree)
+
+    def methods(self) -> dict:
+        class_def = self._class_def()
+
+        functions = {}
+        for node in class_def.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if node.decorator_list:
+                    raise _UnsupportedContract()
+                functions[node.name] = node
+            elif not _is_inert_class_statement(node):
+                raise _UnsupportedContract()
+
+        methods = {}
+        if "__init__" not in functions:
+            methods["__init__"] = dict(_ICONTRACT_INIT)
+        for name, node in functions.items():
+            methods[name] = self._method(node)
+        # Same order as `inspect.getmembers`
+        return dict(sorted(methods.items()))
+
+    def _class_def(self) -> ast.ClassDef:
+        if any(
+            isinstance(node, ast.ImportFrom)
+            and node.module == "__future__"
+            and any(alias.name == "annotations" for alias in node.names)
+            for node in self.tree.body
+        ):
+            # All the annotations are strings
+            raise _UnsupportedContract()
+
+        bindings = {}
+        for node in self.tree.body:
+            for name in _top_level_bindings(node):
+                bindings.setdefault(name, []).append(node)
+
+        class_bindings = bindings.get(self.class_name, [])
+        if len(class_bindings) != 1 or not isinstance(class_bindings[0], ast.ClassDef):
+            raise _UnsupportedContract()
+        class_def = class_bindings[0]
+
+        icontract_bindings = bindings.get("IContract", [])
+        if (
+            len(icontract_bindings) != 1
+            or not isinstance(icontract_bindings[0], ast.ImportFrom)
+            or icontract_bindings[0].module != ICONTRACT_MODULE
+            or any(
+                alias.name == "IContract" and alias.asname not in (None, "IContract")
+                for alias in icontract_bindings[0].names
+            )
+        ):
+            raise _UnsupportedContract()
+
+        if (
+            class_def.decorator_list
+            or class_def.keywords
+            or len(class_def.bases) != 1
+            or not isinstance(class_def.bases[0], ast.Name)
+            or class_def.bases[0].id != "IContract"
+        ):
+            raise _UnsupportedContract()
+        return class_def
+
+    def _method(self, node: ast.FunctionDef | ast.AsyncFunctionDef) -> dict:
+        arguments = node.args
+        parameters = [
+            *arguments.posonlyargs,
+            *arguments.args,
+            *([arguments.vararg] if arguments.vararg else []),
+            *arguments.kwonlyargs,
+            *([arguments.kwarg] if arguments.kwarg else []),
+        ]
+        inputs = {}
+        for parameter in parameters:
+            if parameter.arg != "self":
+                inputs[parameter.arg] = self._annotation(parameter.annotation)
+
+        return_annotation = self._annotation(node.returns)
+        if return_annotation == "inspect._empty":
+            return_annotation = "None"
+
+        return {"inputs": inputs, "output": return_annotation}
+
+    def _annotation(self, node: ast.expr | None) -> str:
+        """Same as `str(annotation)[8:-2]` on the evaluated annotation"""
+        if node is None:
+            return "inspect._empty"
+
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name):
+                if child.id not in _ANNOTATION_TYPES or child.id in self.bound_names:
+                    raise _UnsupportedContract()
+            elif not isinstance(
+                child,
+                (
+                    ast.Constant,
+                    ast.Subscript,
+                    ast.Tuple,
+                    ast.BinOp,
+                    ast.BitOr,
+                    ast.Load,
+                ),
+            ):
+                raise _UnsupportedContract()
+
+        expression = compile(ast.Expression(node), "<annotation>", "eval")
+        try:
+            annotation = eval(expression, {"__builtins__": {}, **_ANNOTATION_TYPES})
+        except Exception:
+            # e.g. `int[str]`, executing the contract raises the actual error
+            raise _UnsupportedContract()
+        return str(annotation)[8:-2]
+
+
+def _is_inert_class_statement(node: ast.stmt) -> bool:
+    """Statements of the class body that can't define methods"""
+    if isinstance(node, (ast.Pass, ast.ClassDef)):
+        return True
+    if isinstance(node, ast.Expr):
+        return isinstance(node.value, ast.Constant)
+    if isinstance(node, (ast.Assign, ast.AnnAssign)):
+        if node.value is None:
+            return True
+        try:
+            ast.literal_eval(node.value)
+        except ValueError:
+            return False
+        return True
+    return False
+
+
+def _top_level_bindings(node: ast.stmt) -> list[str]:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return [node.name]
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        if any(alias.name == "*" for alias in node.names):
+            raise _UnsupportedContract()
+        return [alias.asname or alias.name.split(".")[0] for alias in node.names]
+    # Assignments, conditional definitions, ... anything else binding names at the top level
+    return list(_bound_names(node))
+
+
+def _bound_names(tree: ast.AST) -> set[str]:
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            if any(alias.name == "*" for alias in node.names):
+                raise _UnsupportedContract()
+            names.update(
+                alias.asname or alias.name.split(".")[0] for alias in node.names
+            )
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+    return names
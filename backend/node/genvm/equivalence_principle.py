@@ -3,7 +3,8 @@
 from typing import Any, Optional
 from backend.node.genvm.context_wrapper import enforce_with_context
 from backend.node.genvm import llms
-from backend.node.genvm.webpage_utils import get_webpage_content
+from backend.node.genvm.llm_limiter import call_llm_plugin
+from backend.node.genvm.runtime import get_execution_context
 from backend.node.genvm.types import ExecutionMode
 
 
@@ -22,8 +23,6 @@ def clear_locals(scope):
 
 @enforce_with_context
 class EquivalencePrinciple:
-    contract_runner: Any  # TODO: this should be of type ContractRunner but that raises a cyclic import error
-
     def __init__(
         self,
         result: dict,
@@ -38,7 +37,13 @@ class EquivalencePrinciple:
         self.last_method = None
         self.last_args = []
 
+    @property
+    def contract_runner(self) -> Any:
+        # TODO: this should be of type ContractRunner but that raises a cyclic import error
+        return get_execution_context().contract_runner
+
     async def __aenter__(self):
+        self.contract_runner.nondeterministic = True
         return self
 
     async def __aexit__(self):
@@ -67,7 +72,7 @@ class EquivalencePrinciple:
             # if TRUE => nothing, FALSE => fuera todo y un state de disagree
 
     async def get_webpage(self, url: str, format: str = "text"):
-        url_body = get_webpage_content(url, format)
+        url_body = self.contract_runner.get_webpage(url, format)
         final_response = url_body["response"]
         return final_response
 
@@ -92,10 +97,13 @@ class EquivalencePrinciple:
         self.contract_runner.eq_num += 1
 
     def __get_llm_function(self):
-        return llms.get_llm_plugin(
-            self.contract_runner.node_config["plugin"],
-            self.contract_runner.node_config["plugin_config"],
-        ).call
+        return self.contract_runner.call_llm
+
+
+async def call_llm(node_config: dict, prompt: str, regex: Optional[str], channel):
+    plugin = llms.get_llm_plugin(node_config["plugin"], node_config["plugin_config"])
+    # watch out! as ollama uses GPU resources, calls to each model are limited
+    return await call_llm_plugin(plugin, node_config, prompt, regex, channel)
 
 
 async def call_llm_with_principle(prompt, eq_principle, comparative=True):
@@ -0,0 +1,367 @@
+# backend/node/genvm/executor.py
+
+"""
+Where contracts are executed.
+
+By default (`GENVM_EXECUTOR=inline`) contracts run on the event loop of the consensus, so a CPU-heavy contract blocks every other transaction and validator.
+With `GENVM_EXECUTOR=process` deployments and writes run in a pool of sandbox processes (see `sandbox`), started in advance with the GenVM and its std modules already imported:
+- Calls to LLMs and web pages, reads of other contracts and log messages are proxied back to this process, so LLM limits, database sessions and websockets keep working as usual.
+- Every execution is limited to `GENVM_PROCESS_TIMEOUT` seconds of wall-clock time, and every sandbox to `GENVM_PROCESS_MEMORY_LIMIT` bytes of memory on top of what it uses after startup. A sandbox that times out, dies or whose execution is cancelled (e.g. validators left out of the vote) is replaced in the background, and the execution fails with an error receipt.
+- Reads (`eth_call`) still run inline, they are synchronous and don't go through the consensus loop.
+"""
+
+import asyncio
+import dataclasses
+import os
+import socket
+import subprocess
+import sys
+import traceback
+import weakref
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any
+
+from dotenv import load_dotenv
+
+from backend.node.genvm.base import GenVM
+from backend.node.genvm.equivalence_principle import call_llm
+from backend.node.genvm.types import ExecutionMode, ExecutionResultStatus, Receipt
+from backend.node.genvm.webpage_utils import get_webpage_content
+from backend.protocol_rpc.message_handler.types import LogEvent, EventType, EventScope
+
+load_dotenv()
+
+DEFAULT_GENVM_EXECUTOR = "inline"
+DEFAULT_GENVM_PROCESS_WORKERS = 4
+DEFAULT_GENVM_PROCESS_TIMEOUT = 600
+DEFAULT_GENVM_PROCESS_MEMORY_LIMIT = 1024 * 1024 * 1024
+
+
+class GenVMTimeoutError(Exception):
+    """Exception raised when a contract takes longer than allowed to execute."""
+
+    def __init__(
+        self,
+        timeout: float,
+        message: str = "Contract execution timed out.",
+    ):
+        self.timeout = timeout
+        self.message = message
+        super().__init__(self.message)
+
+
+class GenVMSandboxError(Exception):
+    """Exception raised when the sandbox process executing a contract dies, e.g. when it runs out of memory."""
+
+    def __init__(
+        self,
+        message: str = "Contract sandbox process died.",
+    ):
+        self.message = message
+        super().__init__(self.message)
+
+
+@dataclass
+class SnapshotData:
+    """What the GenVM reads from a `ContractSnapshot`, sent to sandboxes instead of the database backed snapshot"""
+
+    contract_code: str | None
+    state: bytes | None
+    state_hash: str | None = None
+
+
+@dataclass
+class ExecutionRequest:
+    method: str  # "deploy_contract" or "run_contract"
+    snapshot: SnapshotData
+    validator_mode: ExecutionMode
+    validator: dict
+    from_address: str
+    calldata: bytes
+    leader_receipt: Receipt | None
+    code_to_deploy: str | None = None
+
+
+def to_snapshot_data(snapshot: Any) -> SnapshotData:
+    # Snapshots of contracts being deployed don't have code nor state yet
+    return SnapshotData(
+        contract_code=getattr(snapshot, "contract_code", None),
+        state=getattr(snapshot, "state", None),
+        state_hash=getattr(snapshot, "state_hash", None),
+    )
+
+
+class InlineExecutor:
+    async def deploy_contract(
+        self,
+        genvm: GenVM,
+        from_address: str,
+        code_to_deploy: str,
+        calldata: bytes,
+        leader_receipt: Receipt | None,
+    ) -> Receipt:
+        return await genvm.deploy_contract(
+            from_address, code_to_deploy, calldata, leader_receipt
+        )
+
+    async def run_contract(
+        self,
+        genvm: GenVM,
+        from_address: str,
+        calldata: bytes,
+        leader_receipt: Receipt | None,
+    ) -> Receipt:
+        return await genvm.run_contract(from_address, calldata, leader_receipt)
+
+
+class SandboxProcess:
+    """A sandbox process and the connection to it"""
+
+    def __init__(self, memory_limit: int):
+        parent_socket, child_socket = socket.socketpair()
+        with child_socket:
+            self.process = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "backend.node.genvm.sandbox",
+                    "--fd",
+                    str(child_socket.fileno()),
+                    "--memory-limit",
+                    str(memory_limit),
+                ],
+                pass_fds=[child_socket.fileno()],
+                env=_sandbox_environment(),
+            )
+        self.connection = Connection(parent_socket.detach())
+
+    async def recv(self) -> Any:
+        loop = asyncio.get_running_loop()
+        while not self.connection.poll():
+            readable = loop.create_future()
+            loop.add_reader(
+                self.connection.fileno(),
+                lambda: readable.done() or readable.set_result(None),
+            )
+            try:
+                await readable
+            finally:
+                loop.remove_reader(self.connection.fileno())
+        return self.connection.recv()
+
+    def send(self, message: Any):
+        self.connection.send(message)
+
+    def kill(self):
+        self.connection.close()
+        self.process.kill()
+        self.process.wait()
+
+
+def _sandbox_environment() -> dict:
+    # `backend` must be importable by the sandbox whatever the working directory is
+    root = str(Path(__file__).resolve().parents[3])
+    python_path = os.environ.get("PYTHONPATH")
+    return {
+        **os.environ,
+        "PYTHONPATH": root if not python_path else root + os.pathsep + python_path,
+    }
+
+
+class ProcessExecutor:
+    def __init__(self, workers: int, timeout: float, memory_limit: int):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.sandboxes = [SandboxProcess(memory_limit) for _ in range(workers)]
+        self.idle_sandboxes: asyncio.Queue[SandboxProcess] = asyncio.Queue()
+        for sandbox in self.sandboxes:
+            self.idle_sandboxes.put_nowait(sandbox)
+        # Replacements being started, referenced until they are done
+        self.replacements: set[asyncio.Task] = set()
+        self.closed = False
+
+    async def deploy_contract(
+        self,
+        genvm: GenVM,
+        from_address: str,
+        code_to_deploy: str,
+        calldata: bytes,
+        leader_receipt: Receipt | None,
+    ) -> Receipt:
+        return await self._execute(
+            genvm,
+            ExecutionRequest(
+                method="deploy_contract",
+                snapshot=SnapshotData(contract_code=None, state=None),
+                validator_mode=genvm.validator_mode,
+                validator=genvm.contract_runner.node_config,
+                from_address=from_address,
+                calldata=calldata,
+                leader_receipt=_sendable_receipt(leader_receipt),
+                code_to_deploy=code_to_deploy,
+            ),
+        )
+
+    async def run_contract(
+        self,
+        genvm: GenVM,
+        from_address: str,
+        calldata: bytes,
+        leader_receipt: Receipt | None,
+    ) -> Receipt:
+        return await self._execute(
+            genvm,
+            ExecutionRequest(
+                method="run_contract",
+                snapshot=to_snapshot_data(genvm.snapshot),
+                validator_mode=genvm.validator_mode,
+                validator=genvm.contract_runner.node_config,
+                from_address=from_address,
+                calldata=calldata,
+                leader_receipt=_sendable_receipt(leader_receipt),
+            ),
+        )
+
+    async def _execute(self, genvm: GenVM, request: ExecutionRequest) -> Receipt:
+        sandbox = await self.idle_sandboxes.get()
+        try:
+            sandbox.send(request)
+            kind, result = await asyncio.wait_for(
+                self._serve(sandbox, genvm), self.timeout
+            )
+        except asyncio.TimeoutError:
+            self._replace(sandbox)
+            return _error_receipt(genvm, request, GenVMTimeoutError(self.timeout))
+        except (EOFError, OSError):
+            self._replace(sandbox)
+            return _error_receipt(genvm, request, GenVMSandboxError())
+        except BaseException:
+            # e.g. the execution was cancelled, the sandbox is still running it
+            self._replace(sandbox)
+            raise
+        self.idle_sandboxes.put_nowait(sandbox)
+
+        if kind == "raise":
+            raise result
+        return result
+
+    async def _serve(self, sandbox: SandboxProcess, genvm: GenVM) -> tuple[str, Any]:
+        """Answer the requests of the sandbox until it's done executing the contract, returns `("done", receipt)` or `("raise", exception)`"""
+        while True:
+            kind, *args = await sandbox.recv()
+            if kind in ("done", "raise"):
+                return kind, args[0]
+            if kind == "message":
+                genvm.msg_handler.send_message(*args)
+                continue
+
+            try:
+                result = ("ok", await self._handle(genvm, kind, args))
+            except Exception as e:
+                result = ("error", e)
+            sandbox.send(result)
+
+    @staticmethod
+    async def _handle(genvm: GenVM, kind: str, args: list) -> Any:
+        if kind == "call_llm":
+            return await call_llm(*args)
+        if kind == "get_webpage":
+            return await asyncio.to_thread(get_webpage_content, *args)
+        if kind == "contract_snapshot":
+            return to_snapshot_data(
+                genvm.contract_runner.contract_snapshot_factory(*args)
+            )
+        raise ValueError(f"Unknown sandbox request {kind}")
+
+    def _replace(self, sandbox: SandboxProcess):
+        """Replace the sandbox in the background, it's idle again once the new process is started"""
+        replacement = asyncio.create_task(self._start_replacement(sandbox))
+        self.replacements.add(replacement)
+        replacement.add_done_callback(self.replacements.discard)
+
+    async def _start_replacement(self, sandbox: SandboxProcess):
+        # Waiting for the old process and starting a new one block, they would stall every other execution on the loop
+        await asyncio.to_thread(sandbox.kill)
+        while True:
+            try:
+                new_sandbox = await asyncio.to_thread(SandboxProcess, self.memory_limit)
+                break
+            except Exception as e:
+                print("Error starting a GenVM sandbox, retrying", e)
+                await asyncio.sleep(1)
+        self.sandboxes[self.sandboxes.index(sandbox)] = new_sandbox
+        if self.closed:
+            new_sandbox.kill()
+            return
+        self.idle_sandboxes.put_nowait(new_sandbox)
+
+    def close(self):
+        self.closed = True
+        for sandbox in self.sandboxes:
+            sandbox.kill()
+
+
+def _sendable_receipt(receipt: Receipt | None) -> Receipt | None:
+    # Errors can be instances of classes defined by the contract, which the sandbox doesn't know about
+    if receipt is None:
+        return None
+    return dataclasses.replace(receipt, error=None)
+
+
+def _error_receipt(
+    genvm: GenVM, request: ExecutionRequest, error: Exception
+) -> Receipt:
+    code = request.code_to_deploy or request.snapshot.contract_code
+    if genvm.contract_runner.mode == ExecutionMode.LEADER:
+        genvm.msg_handler.send_message(
+            LogEvent(
+                "contract_execution_failed",
+                EventType.ERROR,
+                EventScope.GENVM,
+                "Error executing contract: " + str(error),
+                {"error": str(error), "traceback": f"\n{traceback.format_exc()}"},
+            )
+        )
+    return genvm._generate_receipt(
+        GenVM._get_contract_class_name(code),
+        request.snapshot.state,
+        request.calldata,
+        ExecutionResultStatus.ERROR,
+        error,
+    )
+
+
+# One executor per event loop, since its queue of idle sandboxes belongs to a loop
+_process_executors: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, ProcessExecutor
+] = weakref.WeakKeyDictionary()
+_inline_executor = InlineExecutor()
+
+
+def get_genvm_executor() -> InlineExecutor | ProcessExecutor:
+    executor = os.getenv("GENVM_EXECUTOR", DEFAULT_GENVM_EXECUTOR)
+    if executor == "inline":
+        return _inline_executor
+    if executor != "process":
+        raise ValueError(f"Unknown GENVM_EXECUTOR {executor}")
+
+    loop = asyncio.get_running_loop()
+    if loop not in _process_executors:
+        process_executor = ProcessExecutor(
+            workers=int(
+                os.getenv("GENVM_PROCESS_WORKERS", DEFAULT_GENVM_PROCESS_WORKERS)
+            ),
+            timeout=float(
+                os.getenv("GENVM_PROCESS_TIMEOUT", DEFAULT_GENVM_PROCESS_TIMEOUT)
+            ),
+            memory_limit=int(
+                os.getenv(
+                    "GENVM_PROCESS_MEMORY_LIMIT", DEFAULT_GENVM_PROCESS_MEMORY_LIMIT
+                )
+            ),
+        )
+        _process_executors[loop] = process_executor
+        weakref.finalize(loop, process_executor.close)
+    return _process_executors[loop]
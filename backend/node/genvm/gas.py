@@ -0,0 +1,240 @@
+# backend/node/genvm/gas.py
+
+"""
+Gas metering of contract executions.
+
+When `GENVM_GAS_METERING` is enabled, every line of contract code executed consumes one unit of gas, reported in `Receipt.gas_used`. Executions consuming more than `GENVM_GAS_LIMIT` (0 for no limit) are aborted with `OutOfGas`.
+Only contract code is metered, the std library and the GenVM itself are free. Lines are counted with:
+- `sys.monitoring` (Python 3.12+): `LINE` events are only enabled on the code objects of contracts (see `instrument_code`), so other code runs at full speed.
+- `sys.settrace` otherwise: the global trace function is called for every Python call, but only traces the lines of contract frames. Raising `OutOfGas` from the trace function unsets it, so it's only raised at instructions the frame can't catch it at (see `_catching_ranges`), and the tracer is installed again as soon as the contract calls something or drops the error.
+
+Executions running concurrently in the same thread are told apart with a context variable.
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import CodeType, FrameType
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# File name contracts are compiled with, see `code_cache`
+CONTRACT_FILENAME = "<contract>"
+
+DEFAULT_GENVM_GAS_LIMIT = 0
+
+
+class OutOfGas(Exception):
+    """Exception raised when a contract execution uses more gas than its limit."""
+
+    def __init__(
+        self,
+        gas_limit: int,
+        message: str = "Out of gas.",
+    ):
+        self.gas_limit = gas_limit
+        self.message = message
+        super().__init__(self.message)
+
+
+class GasMeter:
+    def __init__(self, gas_limit: int):
+        self.gas_limit = gas_limit  # 0 for no limit
+        self.gas_used = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return bool(self.gas_limit) and self.gas_used > self.gas_limit
+
+    def consume(self, gas: int):
+        self.gas_used += gas
+        self.check()
+
+    def check(self):
+        if self.exhausted:
+            # Raised on every line from then on, so contracts can't swallow it and keep running
+            raise OutOfGas(self.gas_limit)
+
+
+current_gas_meter: ContextVar[GasMeter | None] = ContextVar(
+    "current_gas_meter", default=None
+)
+
+
+def is_gas_metering_enabled() -> bool:
+    return os.getenv("GENVM_GAS_METERING", "false").lower() == "true"
+
+
+def get_gas_limit() -> int:
+    return int(os.getenv("GENVM_GAS_LIMIT", DEFAULT_GENVM_GAS_LIMIT))
+
+
+def _consume_line():
+    meter = current_gas_meter.get()
+    if meter is not None:
+        meter.consume(1)
+
+
+if hasattr(sys, "monitoring"):
+    # Free tool id, 0-2 and 5 are reserved for debuggers, coverage, profilers and optimizers
+    _TOOL_ID = 4
+    _tool_registered = False
+
+    def _on_line(code: CodeType, line_number: int):
+        _consume_line()
+
+    def _register_tool():
+        global _tool_registered
+        if not _tool_registered:
+            sys.monitoring.use_tool_id(_TOOL_ID, "genvm_gas")
+            sys.monitoring.register_callback(
+                _TOOL_ID, sys.monitoring.events.LINE, _on_line
+            )
+            _tool_registered = True
+
+    def instrument_code(code: CodeType):
+        """Enable line events on a compiled contract and all the functions and classes it defines"""
+        if not is_gas_metering_enabled():
+            return
+        _register_tool()
+        sys.monitoring.set_local_events(_TOOL_ID, code, sys.monitoring.events.LINE)
+        for const in code.co_consts:
+            if isinstance(const, CodeType):
+                instrument_code(const)
+
+    def _install_tracer():
+        pass
+
+    def _uninstall_tracer():
+        pass
+
+else:
+    import dis
+    import threading
+    import weakref
+    from functools import lru_cache
+
+    # Opcodes of the `except` clauses checking the type of the exception
+    _EXCEPTION_MATCHES = {"CHECK_EXC_MATCH", "CHECK_EG_MATCH"}
+
+    # Tracing is per thread, executions running concurrently in the thread share the tracer
+    _thread_tracing = threading.local()
+
+    def instrument_code(code: CodeType):
+        pass
+
+    @lru_cache(maxsize=1024)
+    def _catching_ranges(code: CodeType) -> tuple[tuple[int, int], ...]:
+        """Ranges of instructions whose exceptions are caught by an `except` clause of the same code"""
+        # Exception tables exist since Python 3.11, before that every instruction is assumed to be uncaught
+        parse_exception_table = getattr(dis, "_parse_exception_table", None)
+        if parse_exception_table is None:
+            return ()
+        instructions = list(dis.get_instructions(code))
+        index = {instruction.offset: i for i, instruction in enumerate(instructions)}
+        ranges = []
+        for entry in parse_exception_table(code):
+            # Cleanups (`lasti`) re-raise the exception, `with` blocks call `__exit__`
+            if not entry.lasti and _is_except_clause(
+                instructions[index[entry.target] + 1 :]
+            ):
+                ranges.append((entry.start, entry.end))
+        return tuple(ranges)
+
+    def _is_except_clause(handler: list[dis.Instruction]) -> bool:
+        """Handlers start with a bare `except` or check the type of the exception on their first line, `finally` blocks go on with their body"""
+        if handler[0].opname == "POP_TOP":
+            return True
+        line = handler[0].positions.lineno
+        for instruction in handler:
+            if instruction.positions.lineno != line:
+                return False
+            if instruction.opname in _EXCEPTION_MATCHES:
+                return True
+        return False
+
+    def _is_caught(frame: FrameType) -> bool:
+        return any(
+            start <= frame.f_lasti < end
+            for start, end in _catching_ranges(frame.f_code)
+        )
+
+    def _trace_contract_lines(frame: FrameType, event: str, arg):
+        meter = current_gas_meter.get()
+        if meter is None:
+            return _trace_contract_lines
+        if event == "line":
+            meter.gas_used += 1
+        if meter.exhausted and event in ("line", "opcode"):
+            # Raising unsets the tracer, wait for the first instruction the frame can't catch the error at
+            frame.f_trace_opcodes = True
+            if not _is_caught(frame):
+                error = OutOfGas(meter.gas_limit)
+                # The callers of the frame can still catch it, trace them again as soon as they call something or drop the error
+                sys.setprofile(_on_call)
+                weakref.finalize(error, _rearm_tracer).atexit = False
+                raise error
+        return _trace_contract_lines
+
+    def _trace_calls(frame: FrameType, event: str, arg):
+        if frame.f_code.co_filename == CONTRACT_FILENAME:
+            return _trace_contract_lines
+        return None
+
+    def _on_call(frame: FrameType, event: str, arg):
+        if sys.gettrace() is not _trace_calls:
+            _rearm_tracer()
+
+    def _rearm_tracer():
+        # e.g. the error is collected after the execution ended
+        if getattr(_thread_tracing, "blocks", 0) == 0:
+            return
+        meter = current_gas_meter.get()
+        if meter is None or not meter.exhausted:
+            return
+        sys.settrace(_trace_calls)
+        # The global trace function only applies to new frames
+        frame = sys._getframe()
+        while frame is not None:
+            if frame.f_code.co_filename == CONTRACT_FILENAME:
+                frame.f_trace = _trace_contract_lines
+                frame.f_trace_opcodes = True
+            frame = frame.f_back
+
+    def _install_tracer():
+        blocks = getattr(_thread_tracing, "blocks", 0)
+        if blocks == 0:
+            _thread_tracing.previous = sys.gettrace()
+        _thread_tracing.blocks = blocks + 1
+        if sys.gettrace() is not _trace_calls:
+            sys.settrace(_trace_calls)
+
+    def _uninstall_tracer():
+        _thread_tracing.blocks -= 1
+        if _thread_tracing.blocks == 0:
+            # Before restoring the tracer, `_on_call` would see the call and re-install ours
+            if sys.getprofile() is _on_call:
+                sys.setprofile(None)
+            sys.settrace(_thread_tracing.previous)
+
+
+@contextmanager
+def gas_metering():
+    """Meter the contract code executed in the block, yields the `GasMeter` or None when metering is disabled"""
+    if not is_gas_metering_enabled():
+        yield None
+        return
+
+    _install_tracer()
+    meter = GasMeter(get_gas_limit())
+    token = current_gas_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        current_gas_meter.reset(token)
+        _uninstall_tracer()
+    # e.g. the contract caught `OutOfGas` and returned
+    meter.check()
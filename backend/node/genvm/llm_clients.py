@@ -0,0 +1,156 @@
+# backend/node/genvm/llm_clients.py
+
+"""
+Shared clients of the LLM plugins.
+
+Every LLM call used to create its own client (and aiohttp session for Ollama), paying a new connection and TLS handshake per call. Clients are now created once per (plugin, api_url, api_key_env_var) and reuse their keep-alive connections. A client is recreated if the value of its API key environment variable changes.
+Connections are configured with:
+- `LLM_HTTP_POOL_SIZE`: maximum number of connections of each client
+- `LLM_HTTP_CONNECT_TIMEOUT`: seconds to establish a connection
+- `LLM_HTTP_READ_TIMEOUT`: seconds to wait for data from the LLM, streamed responses can take longer in total
+
+Async clients can't be shared between event loops, so there is one set of clients per loop, closed with `close_llm_clients` before the loop is.
+"""
+
+import asyncio
+import inspect
+import os
+import weakref
+from typing import Any, Callable, Optional
+
+import aiohttp
+import httpx
+from anthropic import AsyncAnthropic
+from anthropic import DefaultAsyncHttpxClient as AnthropicHttpxClient
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from openai import DefaultAsyncHttpxClient as OpenAIHttpxClient
+
+load_dotenv()
+
+DEFAULT_LLM_HTTP_POOL_SIZE = 100
+DEFAULT_LLM_HTTP_CONNECT_TIMEOUT = 10
+DEFAULT_LLM_HTTP_READ_TIMEOUT = 600
+
+
+def get_pool_size() -> int:
+    return int(os.getenv("LLM_HTTP_POOL_SIZE", DEFAULT_LLM_HTTP_POOL_SIZE))
+
+
+def get_connect_timeout() -> float:
+    return float(
+        os.getenv("LLM_HTTP_CONNECT_TIMEOUT", DEFAULT_LLM_HTTP_CONNECT_TIMEOUT)
+    )
+
+
+def get_read_timeout() -> float:
+    return float(os.getenv("LLM_HTTP_READ_TIMEOUT", DEFAULT_LLM_HTTP_READ_TIMEOUT))
+
+
+def _httpx_limits() -> httpx.Limits:
+    pool_size = get_pool_size()
+    return httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+
+
+def _httpx_timeout() -> httpx.Timeout:
+    return httpx.Timeout(get_read_timeout(), connect=get_connect_timeout())
+
+
+class LLMClients:
+    def __init__(self):
+        # (plugin, api_url, api_key_env_var) -> (api key, client)
+        self.clients: dict[tuple[str, Optional[str], Optional[str]], tuple] = {}
+        # Clients replaced after their API key changed, calls may still be using them
+        self.replaced_clients: list[Any] = []
+
+    def get(
+        self,
+        plugin: str,
+        api_url: Optional[str],
+        api_key_env_var: Optional[str],
+        create: Callable[[Optional[str]], Any],
+    ) -> Any:
+        """Returns the client of the key, calling `create` with the API key to create it if needed"""
+        key = (plugin, api_url, api_key_env_var)
+        api_key = os.environ.get(api_key_env_var) if api_key_env_var else None
+        entry = self.clients.get(key)
+        if entry is not None:
+            if entry[0] == api_key:
+                return entry[1]
+            self.replaced_clients.append(entry[1])
+        client = create(api_key)
+        self.clients[key] = (api_key, client)
+        return client
+
+    async def close(self):
+        clients = [client for _, client in self.clients.values()]
+        clients += self.replaced_clients
+        self.clients = {}
+        self.replaced_clients = []
+        for client in clients:
+            closed = client.close()
+            if inspect.isawaitable(closed):
+                await closed
+
+
+_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMClients] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_llm_clients() -> LLMClients:
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = LLMClients()
+    return _clients[loop]
+
+
+async def close_llm_clients():
+    """Close the clients of the running loop"""
+    clients = _clients.pop(asyncio.get_running_loop(), None)
+    if clients is not None:
+        await clients.close()
+
+
+def get_aiohttp_session(plugin: str, api_url: str) -> aiohttp.ClientSession:
+    def create(api_key: Optional[str]) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ssl=False, limit=get_pool_size()),
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                connect=get_connect_timeout(),
+                sock_read=get_read_timeout(),
+            ),
+        )
+
+    return get_llm_clients().get(plugin, api_url, None, create)
+
+
+def get_openai_client(api_key_env_var: str, api_url: Optional[str]) -> AsyncOpenAI:
+    def create(api_key: Optional[str]) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key=api_key,
+            base_url=api_url or None,
+            timeout=_httpx_timeout(),
+            http_client=OpenAIHttpxClient(
+                limits=_httpx_limits(), timeout=_httpx_timeout()
+            ),
+        )
+
+    return get_llm_clients().get("openai", api_url, api_key_env_var, create)
+
+
+def get_anthropic_client(
+    api_key_env_var: str, api_url: Optional[str]
+) -> AsyncAnthropic:
+    def create(api_key: Optional[str]) -> AsyncAnthropic:
+        return AsyncAnthropic(
+            api_key=api_key,
+            base_url=api_url or None,
+            timeout=_httpx_timeout(),
+            http_client=AnthropicHttpxClient(
+                limits=_httpx_limits(), timeout=_httpx_timeout()
+            ),
+        )
+
+    return get_llm_clients().get("anthropic", api_url, api_key_env_var, create)
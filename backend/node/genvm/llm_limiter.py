@@ -0,0 +1,138 @@
+# backend/node/genvm/llm_limiter.py
+
+"""
+Bounds the number of concurrent calls to each LLM endpoint.
+
+Every validator of every transaction being executed may call its LLM at the same time, which is more than a local Ollama can handle. Calls are grouped by (plugin, model, api_url), and for each group at most `max_in_flight` calls run at once, the rest wait in FIFO order.
+The limit is read from `LLM_MAX_IN_FLIGHT_<PLUGIN>` (e.g. `LLM_MAX_IN_FLIGHT_OLLAMA`), falling back to `LLM_MAX_IN_FLIGHT` and then to `DEFAULT_LLM_MAX_IN_FLIGHT`.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Optional
+
+from backend.node.genvm.llms import Plugin
+
+DEFAULT_LLM_MAX_IN_FLIGHT = 4
+
+
+class LLMLimiter:
+    """FIFO limit of in-flight calls, with queue depth and wait time metrics"""
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.calls = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    async def __aenter__(self):
+        started_waiting_at = time.monotonic()
+        if self.in_flight < self.max_in_flight and not self.waiters:
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                # The slot is handed over by `__aexit__`, so `in_flight` is already accounted for
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # We were given the slot right before being cancelled, pass it on
+                    self._release()
+                elif waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                raise
+
+        wait_time = time.monotonic() - started_waiting_at
+        self.calls += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._release()
+
+    def _release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def get_metrics(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self.waiters),
+            "calls": self.calls,
+            "average_wait_time": (
+                self.total_wait_time / self.calls if self.calls else 0.0
+            ),
+            "max_wait_time": self.max_wait_time,
+        }
+
+
+# asyncio primitives can't be shared between event loops, so there is one set of limiters per loop
+_limiters: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[tuple[str, str, Optional[str]], LLMLimiter]
+] = weakref.WeakKeyDictionary()
+# The loops of the consensus threads add limiters while the RPC server reads their metrics
+_limiters_lock = threading.Lock()
+
+
+def get_max_in_flight(plugin: str) -> int:
+    return int(
+        os.getenv(
+            f"LLM_MAX_IN_FLIGHT_{plugin.upper()}",
+            os.getenv("LLM_MAX_IN_FLIGHT", DEFAULT_LLM_MAX_IN_FLIGHT),
+        )
+    )
+
+
+def get_llm_limiter(plugin: str, model: str, api_url: Optional[str]) -> LLMLimiter:
+    loop = asyncio.get_running_loop()
+    key = (plugin, model, api_url)
+    with _limiters_lock:
+        limiters = _limiters.setdefault(loop, {})
+        if key not in limiters:
+            limiters[key] = LLMLimiter(get_max_in_flight(plugin))
+        return limiters[key]
+
+
+async def call_llm_plugin(
+    plugin: Plugin,
+    node_config: dict,
+    prompt: str,
+    regex: Optional[str],
+    return_streaming_channel: Optional[asyncio.Queue],
+) -> str:
+    """Same as `plugin.call`, waiting for a free slot of the (plugin, model, api_url) of `node_config`"""
+    limiter = get_llm_limiter(
+        node_config["plugin"],
+        node_config["model"],
+        node_config["plugin_config"].get("api_url"),
+    )
+    async with limiter:
+        return await plugin.call(node_config, prompt, regex, return_streaming_channel)
+
+
+def get_llm_limiters_metrics() -> list[dict]:
+    with _limiters_lock:
+        limiters_by_loop = [dict(limiters) for limiters in _limiters.values()]
+    return [
+        {
+            "plugin": plugin,
+            "model": model,
+            "api_url": api_url,
+            **limiter.get_metrics(),
+        }
+        for limiters in limiters_by_loop
+        for (plugin, model, api_url), limiter in limiters.items()
+    ]
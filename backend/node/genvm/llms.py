@@ -9,16 +9,17 @@ This file contains the plugins (functions) that are used to interact with the di
 
 from typing import Protocol
 import os
-import re
 import json
 import aiohttp
 import asyncio
 from typing import Optional
-from openai import OpenAI, Stream
+from openai import AsyncOpenAI, AsyncStream
 from openai.types.chat import ChatCompletionChunk
-from anthropic import AsyncAnthropic
 from urllib.parse import urljoin
 
+from backend.node.genvm import llm_clients
+from backend.node.genvm.streaming_regex import StreamingRegexMatcher
+
 from dotenv import load_dotenv
 import requests
 
@@ -27,23 +28,10 @@ load_dotenv()
 plugin_config_key = "plugin_config"
 
 
-async def process_streaming_buffer(buffer: str, chunk: str, regex: str) -> dict:
-    updated_buffer = buffer + chunk
-    if regex:
-        match = re.search(regex, updated_buffer)
-        if match:
-            full_match = match.group(0)
-            return {"stop": True, "match": full_match}
-    return {"stop": False, "match": None}
-
-
-async def stream_http_response(url, data):
-    async with aiohttp.ClientSession(
-        connector=aiohttp.TCPConnector(ssl=False)
-    ) as session:
-        async with session.post(url, json=data, ssl=False) as response:
-            async for chunk in response.content.iter_any():
-                yield chunk
+async def stream_http_response(session: aiohttp.ClientSession, url, data):
+    async with session.post(url, json=data, ssl=False) as response:
+        async for chunk in response.content.iter_any():
+            yield chunk
 
 
 async def call_ollama(
@@ -52,15 +40,17 @@ async def call_ollama(
     regex: Optional[str],
     return_streaming_channel: Optional[asyncio.Queue],
 ) -> str:
-    url = urljoin(node_config[plugin_config_key]["api_url"], "generate")
+    api_url = node_config[plugin_config_key]["api_url"]
+    url = urljoin(api_url, "generate")
+    session = llm_clients.get_aiohttp_session("ollama", api_url)
 
     data = {"model": node_config["model"], "prompt": prompt}
 
     for name, value in node_config["config"].items():
         data[name] = value
 
-    buffer = ""
-    async for chunk_json in stream_http_response(url, data):
+    matcher = StreamingRegexMatcher(regex)
+    async for chunk_json in stream_http_response(session, url, data):
         chunk = json.loads(chunk_json)
         if return_streaming_channel is not None:
             if not chunk.get("done"):
@@ -69,11 +59,10 @@ async def call_ollama(
                 await return_streaming_channel.put({"done": True})
         else:
             if chunk.get("done"):
-                return buffer
-            result = await process_streaming_buffer(buffer, chunk["response"], regex)
-            buffer += chunk["response"]
-            if result["stop"]:
-                return result["match"]
+                return matcher.buffer
+            match = matcher.feed(chunk["response"])
+            if match is not None:
+                return match
 
 
 async def call_openai(
@@ -84,26 +73,21 @@ async def call_openai(
 ) -> str:
     api_key_env_var = node_config[plugin_config_key]["api_key_env_var"]
     url = node_config[plugin_config_key]["api_url"]
-    client = get_openai_client(os.environ.get(api_key_env_var), url)
+    client = llm_clients.get_openai_client(api_key_env_var, url)
     # TODO: OpenAI exceptions need to be caught here
-    stream = get_openai_stream(client, prompt, node_config)
+    stream = await get_openai_stream(client, prompt, node_config)
 
-    return await get_openai_output(stream, regex, return_streaming_channel)
+    try:
+        return await get_openai_output(stream, regex, return_streaming_channel)
+    finally:
+        # Release the connection when the regex stopped the stream early
+        await stream.close()
 
 
-def get_openai_client(api_key: str, url: str = None) -> OpenAI:
-    openai_client = None
-    if url:
-        openai_client = OpenAI(api_key=api_key, base_url=url)
-    else:
-        openai_client = OpenAI(api_key=api_key)
-    return openai_client
-
-
-def get_openai_stream(client: OpenAI, prompt, node_config):
+async def get_openai_stream(client: AsyncOpenAI, prompt, node_config):
     config: dict = node_config["config"]
     if "temperature" in config and "max_tokens" in config:
-        return client.chat.completions.create(
+        return await client.chat.completions.create(
             model=node_config["model"],
             messages=[{"role": "user", "content": prompt}],
             stream=True,
@@ -111,7 +95,7 @@ def get_openai_stream(client: OpenAI, prompt, node_config):
             max_tokens=config["max_tokens"],
         )
     else:
-        return client.chat.completions.create(
+        return await client.chat.completions.create(
             model=node_config["model"],
             messages=[{"role": "user", "content": prompt}],
             stream=True,
@@ -119,28 +103,27 @@ def get_openai_stream(client: OpenAI, prompt, node_config):
 
 
 async def get_openai_output(
-    stream: Stream[ChatCompletionChunk], regex, return_streaming_channel
+    stream: AsyncStream[ChatCompletionChunk], regex, return_streaming_channel
 ):
-    buffer = ""
-    for chunk in stream:
+    matcher = StreamingRegexMatcher(regex)
+    async for chunk in stream:
         chunk_str = chunk.choices[0].delta.content
         if chunk_str is not None:
             if return_streaming_channel is not None:
                 await return_streaming_channel.put(chunk_str)
                 continue
-            result = await process_streaming_buffer(buffer, chunk_str, regex)
-            buffer += chunk_str
-            if result["stop"]:
-                return result["match"]
+            match = matcher.feed(chunk_str)
+            if match is not None:
+                return match
             else:
                 if return_streaming_channel is not None:
                     await return_streaming_channel.put({"done": True})
                 if "done" in chunk_str:
-                    return buffer
+                    return matcher.buffer
         else:
             break
 
-    return buffer
+    return matcher.buffer
 
 
 class Plugin(Protocol):
@@ -230,16 +213,12 @@ class AnthropicPlugin:
         regex: Optional[str],
         return_streaming_channel: Optional[asyncio.Queue],
     ) -> str:
-        client: AsyncAnthropic = None
-        if self.url:
-            client = AsyncAnthropic(api_key=self.get_api_key(), base_url=self.url)
-        else:
-            client = AsyncAnthropic(api_key=self.get_api_key())
+        client = llm_clients.get_anthropic_client(self.api_key_env_var, self.url)
 
         if "max_tokens" not in node_config["config"]:
             raise ValueError("`max_tokens` is required for Anthropic")
 
-        buffer = ""
+        matcher = StreamingRegexMatcher(regex)
 
         # Not using `async with` (https://github.com/anthropics/anthropic-sdk-python?tab=readme-ov-file#streaming-helpers) since I get a `'coroutine' object does not support the asynchronous context manager protocol`. Probably related to how the `EquivalencePrinciple` class implements
         stream = await client.messages.create(
@@ -255,19 +234,21 @@ class AnthropicPlugin:
                 "config"
             ],  # max_tokens, temperature, top_k, top_p, timeout, stop_sequences
         )
-        async for event in stream:
-            if event.type == "content_block_delta":
-                buffer += event.delta.text
-                if return_streaming_channel is not None:
-                    await return_streaming_channel.put(event.text)
-                if regex:
-                    match = re.search(regex, buffer)
-                    if match:
-                        return match.group(0)
-            elif event.type == "content_block_stop":
-                break
-
-        return buffer
+        try:
+            async for event in stream:
+                if event.type == "content_block_delta":
+                    match = matcher.feed(event.delta.text)
+                    if return_streaming_channel is not None:
+                        await return_streaming_channel.put(event.text)
+                    if match is not None:
+                        return match
+                elif event.type == "content_block_stop":
+                    break
+        finally:
+            # Release the connection of the shared client when the stream is stopped early
+            await stream.close()
+
+        return matcher.buffer
 
     def is_available(self) -> bool:
         env_var = self.get_api_key()
@@ -0,0 +1,104 @@
+# backend/node/genvm/runtime.py
+
+"""
+Runtime context of the contract being executed.
+
+The leader and the validators of a transaction (and `eth_call`s) run contracts concurrently in the same process. Instead of swapping module globals, everything a contract needs at runtime (the runner of the node executing it, the namespace its code was executed in) is kept in a context variable, so every asyncio task and thread sees its own execution.
+"""
+
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, TextIO
+
+
+@dataclass
+class ExecutionContext:
+    contract_runner: Any  # ContractRunner, not typed to avoid a cyclic import
+    # Globals of the contract code, where its classes are defined
+    namespace: dict
+    # Builds the `Contract(address)` proxies used to interact with other contracts
+    contract_factory: Callable[[str], Any]
+
+
+current_execution_context: ContextVar[ExecutionContext] = ContextVar(
+    "current_execution_context"
+)
+
+
+def get_execution_context() -> ExecutionContext:
+    try:
+        return current_execution_context.get()
+    except LookupError:
+        raise RuntimeError("No contract is being executed") from None
+
+
+@contextmanager
+def execution_context(context: ExecutionContext):
+    token = current_execution_context.set(context)
+    try:
+        yield context
+    finally:
+        current_execution_context.reset(token)
+
+
+class ContractRunnerProxy:
+    """`contract_runner` global of the contracts, forwards to the runner of the current execution."""
+
+    def __getattr__(self, name):
+        return getattr(get_execution_context().contract_runner, name)
+
+    def __setattr__(self, name, value):
+        setattr(get_execution_context().contract_runner, name, value)
+
+
+def contract_proxy(address: str):
+    """`Contract` global of the contracts, see `ExternalContract`."""
+    return get_execution_context().contract_factory(address)
+
+
+current_stdout: ContextVar[TextIO | None] = ContextVar("current_stdout", default=None)
+current_stderr: ContextVar[TextIO | None] = ContextVar("current_stderr", default=None)
+
+
+class _ContextOutput:
+    """Replaces `sys.stdout`/`sys.stderr`, writes to the buffer of the current execution if any. `contextlib.redirect_stdout` swaps the stream of the whole process, so concurrent executions would capture each other's output."""
+
+    def __init__(self, default: TextIO, target: ContextVar[TextIO | None]):
+        self.default = default
+        self.target = target
+
+    def _stream(self) -> TextIO:
+        stream = self.target.get()
+        return self.default if stream is None else stream
+
+    def write(self, s: str) -> int:
+        return self._stream().write(s)
+
+    def flush(self):
+        self._stream().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream(), name)
+
+
+def _install_context_outputs():
+    if not isinstance(sys.stdout, _ContextOutput):
+        sys.stdout = _ContextOutput(sys.stdout, current_stdout)
+    if not isinstance(sys.stderr, _ContextOutput):
+        sys.stderr = _ContextOutput(sys.stderr, current_stderr)
+
+
+@contextmanager
+def redirect_output(stdout: TextIO, stderr: TextIO | None = None):
+    """Like `contextlib.redirect_stdout` (and `redirect_stderr`), but only for the current context."""
+    _install_context_outputs()
+    stdout_token = current_stdout.set(stdout)
+    stderr_token = current_stderr.set(stderr) if stderr is not None else None
+    try:
+        yield
+    finally:
+        if stderr_token is not None:
+            current_stderr.reset(stderr_token)
+        current_stdout.reset(stdout_token)
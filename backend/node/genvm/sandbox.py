@@ -0,0 +1,124 @@
+# backend/node/genvm/sandbox.py
+
+"""
+Sandbox process executing contracts for `executor.ProcessExecutor`.
+
+Executions are received one at a time through the connection to the main process, which is also where non-deterministic primitives, reads of other contracts and log messages are sent to.
+"""
+
+import argparse
+import asyncio
+import pickle
+import resource
+import traceback
+from multiprocessing.connection import Connection
+from typing import Any
+
+# Imported before executing anything, so that executions don't pay for it
+import backend.node.genvm.std.models  # noqa: F401
+import backend.node.genvm.std.vector_store  # noqa: F401
+from backend.node.genvm.base import GenVM
+from backend.node.genvm.executor import ExecutionRequest, SnapshotData
+from backend.node.genvm.types import Receipt
+
+
+class MainProcess:
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+    def call(self, kind: str, *args) -> Any:
+        self.connection.send((kind, *args))
+        status, result = self.connection.recv()
+        if status == "error":
+            raise result
+        return result
+
+    async def call_llm(self, node_config: dict, prompt: str, regex, channel):
+        # Streaming to a channel of the main process is not supported
+        return self.call("call_llm", node_config, prompt, regex, None)
+
+    def get_webpage(self, url: str, format: str = "text"):
+        return self.call("get_webpage", url, format)
+
+    def contract_snapshot(self, address: str) -> SnapshotData:
+        return self.call("contract_snapshot", address)
+
+    def send_message(self, log_event, log_to_terminal: bool = True):
+        self.connection.send(("message", log_event, log_to_terminal))
+
+
+async def execute(main_process: MainProcess, request: ExecutionRequest) -> Receipt:
+    genvm = GenVM(
+        request.snapshot,
+        request.validator_mode,
+        request.validator,
+        main_process.contract_snapshot,
+        main_process,
+    )
+    genvm.contract_runner.call_llm = main_process.call_llm
+    genvm.contract_runner.get_webpage = main_process.get_webpage
+
+    if request.method == "deploy_contract":
+        receipt = await genvm.deploy_contract(
+            request.from_address,
+            request.code_to_deploy,
+            request.calldata,
+            request.leader_receipt,
+        )
+    else:
+        receipt = await genvm.run_contract(
+            request.from_address, request.calldata, request.leader_receipt
+        )
+
+    receipt.error = sendable_error(receipt.error)
+    receipt.pending_transactions = list(receipt.pending_transactions)
+    return receipt
+
+
+def sendable_error(error: BaseException | None) -> BaseException | None:
+    # Errors can be instances of classes defined by the contract, which the main process doesn't know about
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return Exception(str(error))
+
+
+def limit_memory(memory_limit: int):
+    """Limit the memory of the process to what it already uses plus `memory_limit` bytes, contracts exceeding it get a `MemoryError`"""
+    if memory_limit <= 0:
+        return
+    with open("/proc/self/statm") as statm:
+        used = int(statm.read().split()[0]) * resource.getpagesize()
+    resource.setrlimit(resource.RLIMIT_AS, (used + memory_limit, used + memory_limit))
+
+
+def serve(connection: Connection, memory_limit: int):
+    try:
+        limit_memory(memory_limit)
+    except OSError:
+        traceback.print_exc()
+
+    main_process = MainProcess(connection)
+    loop = asyncio.new_event_loop()
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:  # The main process is gone
+            return
+        try:
+            result = ("done", loop.run_until_complete(execute(main_process, request)))
+        except Exception as e:
+            # Same as when executing inline, errors outside of the contract code are raised to the consensus
+            traceback.print_exc()
+            result = ("raise", sendable_error(e))
+        connection.send(result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GenVM sandbox process")
+    parser.add_argument("--fd", type=int, required=True)
+    parser.add_argument("--memory-limit", type=int, required=True)
+    args = parser.parse_args()
+
+    serve(Connection(args.fd), args.memory_limit)
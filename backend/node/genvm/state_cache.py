@@ -0,0 +1,124 @@
+# backend/node/genvm/state_cache.py
+
+"""
+Cache of unpickled contract states for reads.
+
+Every `eth_call` used to load, decompress and unpickle the whole state of the contract to call a single getter. Read-heavy dApps polling a getter paid that cost on every call. The unpickled instances are now kept in an LRU keyed by (contract address, state hash), so reads of a cached state don't load it at all (see `ContractSnapshot.state`) until the contract is updated (see `ContractSnapshot.update_contract_state`).
+Getters are called on the cached instance itself. They are free to modify it, so after each call the instance is pickled again and only kept if it still matches the state hash: pickling is cheaper than unpickling, and much cheaper than copying the instance before each call.
+An instance is used by one call at a time, concurrent reads of the same state (the RPC server and the consensus run in different threads) unpickle their own.
+"""
+
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from dotenv import load_dotenv
+
+from backend.database_handler.state_codec import state_hash as get_state_hash
+
+load_dotenv()
+
+DEFAULT_STATE_CACHE_MAX_ENTRIES = 64
+
+
+class StateCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        # Keys of the instances being used by a call, they are out of `entries` meanwhile
+        self.in_use: set[tuple[str, str]] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.modifications = 0
+        # The RPC server (`eth_call`) and the consensus run in different threads
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def use_instance(
+        self,
+        contract_address: str,
+        state_hash: str,
+        load_state: Callable[[], bytes],
+    ) -> Iterator[Any]:
+        """
+        Yields the contract instance with the given state, calling `load_state` to get the pickled state if it's not cached.
+        The instance is cached again after the block if it wasn't modified. It has to run in the execution context of the contract, to pickle its classes.
+        """
+        key = (contract_address, state_hash)
+        with self.lock:
+            instance = self.entries.pop(key, None)
+            if instance is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            # Another call is using the cached instance, this one gets its own
+            cacheable = key not in self.in_use and self.max_entries > 0
+            if cacheable:
+                self.in_use.add(key)
+
+        try:
+            if instance is None:
+                instance = pickle.loads(load_state())
+            yield instance
+        finally:
+            if cacheable:
+                unmodified = self._is_unmodified(instance, state_hash)
+                with self.lock:
+                    self.in_use.discard(key)
+                    if unmodified:
+                        self.entries[key] = instance
+                        self._evict()
+                    elif instance is not None:
+                        self.modifications += 1
+
+    @staticmethod
+    def _is_unmodified(instance: Any, state_hash: str) -> bool:
+        if instance is None:
+            return False
+        try:
+            return get_state_hash(pickle.dumps(instance)) == state_hash
+        except Exception:
+            # e.g. the getter stored something that can't be pickled
+            return False
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, contract_address: str):
+        """Drop the cached states of a contract, e.g. when its state is updated"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == contract_address]:
+                del self.entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "modifications": self.modifications,
+            }
+
+
+state_cache = StateCache(
+    int(os.getenv("GENVM_STATE_CACHE_MAX_ENTRIES", DEFAULT_STATE_CACHE_MAX_ENTRIES))
+)
+
+
+def get_state_cache_metrics() -> dict:
+    return state_cache.get_metrics()
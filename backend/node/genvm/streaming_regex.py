@@ -0,0 +1,152 @@
+# backend/node/genvm/streaming_regex.py
+
+"""
+Regex matching on the text streamed by the LLM plugins.
+
+The plugins stop streaming as soon as the text received contains a match of the regex of the call. Searching the whole text again on every chunk made long outputs quadratic.
+`StreamingRegexMatcher` compiles the regex once and resumes each search at the first position a match can still start at:
+- The pattern looks at a bounded number of characters from where it starts (its "reach"), unless it has unbounded repetitions. Positions followed by at least that many characters already failed with all the characters they can look at, so they can't start a match anymore. Patterns like `(yes|no)`, `\\d{1,3}` or `Answer: (True|False)\\b` only search the last chunk and a few characters before it.
+- Patterns with unbounded repetitions (e.g. `\\{.*\\}`) are searched from the first position their bounded head (`\\{`) matches at. Positions where the head fails can't start a match either. A match started early and still open (e.g. a long JSON object) is searched again on every chunk, `re` can't resume a partial match.
+
+The match returned is the same as searching the whole text on every chunk.
+The reach is computed from the undocumented parser of `re`, whose modules and opcodes change between Python versions. On versions it hasn't been checked with (see `ANALYZED_PYTHON_VERSIONS`), or patterns it can't analyze, the matcher searches the whole text on every chunk.
+"""
+
+import math
+import re
+import sys
+from typing import Optional
+
+try:
+    from re import _compiler as compiler, _constants as constants, _parser as parser
+except ImportError:
+    compiler = constants = parser = None
+
+# Versions whose `re._parser` opcodes are all handled by `_item_reach`, see `tests/unit/test_streaming_regex.py`
+ANALYZED_PYTHON_VERSIONS = {(3, 11), (3, 12), (3, 13)}
+
+# Characters looked at from the position of an anchor, `$` looks at a final newline and the end
+_ANCHOR_REACH = 2
+
+
+class UnsupportedOpcode(Exception):
+    """Raised when the parsed pattern contains an opcode the reach analysis doesn't know"""
+
+
+def _pattern_reach(items) -> tuple[float, float]:
+    """Returns how far the pattern can move, and look, past the position it's matched at"""
+    advance, ahead = 0, 0
+    for op, av in items:
+        item_advance, item_ahead = _item_reach(op, av)
+        ahead = max(ahead, advance + item_ahead)
+        advance += item_advance
+    return advance, ahead
+
+
+def _item_reach(op, av) -> tuple[float, float]:
+    if op in (constants.LITERAL, constants.NOT_LITERAL, constants.ANY, constants.IN):
+        return 1, 1
+    if op is constants.AT:
+        return 0, _ANCHOR_REACH
+    if op is constants.SUBPATTERN:
+        return _pattern_reach(av[3])
+    if op is constants.ATOMIC_GROUP:
+        return _pattern_reach(av)
+    if op in (constants.BRANCH, constants.GROUPREF_EXISTS):
+        branches = av[1] if op is constants.BRANCH else [av[1], av[2] or []]
+        reaches = [_pattern_reach(branch) for branch in branches]
+        return max(r[0] for r in reaches), max(r[1] for r in reaches)
+    if op in (constants.ASSERT, constants.ASSERT_NOT):
+        direction, pattern = av
+        # Lookbehinds look before the position, at characters already received
+        return 0, (_pattern_reach(pattern)[1] if direction > 0 else 0)
+    if op in (
+        constants.MAX_REPEAT,
+        constants.MIN_REPEAT,
+        constants.POSSESSIVE_REPEAT,
+    ):
+        _, maximum, pattern = av
+        if maximum == constants.MAXREPEAT:
+            return math.inf, math.inf
+        if maximum == 0:
+            return 0, 0
+        advance, ahead = _pattern_reach(pattern)
+        if math.isinf(ahead):
+            return math.inf, math.inf
+        return maximum * advance, (maximum - 1) * advance + ahead
+    if op is constants.GROUPREF:
+        # Backreferences can look at any part of the text
+        return math.inf, math.inf
+    raise UnsupportedOpcode(op)
+
+
+def get_reach(regex: str) -> Optional[int]:
+    """Returns the number of characters the regex can look at from where it starts, or None if it's unbounded"""
+    ahead = _pattern_reach(parser.parse(regex))[1]
+    return None if math.isinf(ahead) else int(ahead)
+
+
+def _get_head(regex: str) -> tuple[Optional[re.Pattern], int]:
+    """Returns the longest bounded prefix of the regex, compiled, and its reach"""
+    parsed = parser.parse(regex)
+    head, ahead = [], 0
+    for item in parsed.data:
+        item_ahead = _pattern_reach([item])[1]
+        if math.isinf(item_ahead):
+            break
+        head.append(item)
+        ahead = max(ahead, _pattern_reach(head)[1])
+    if not head:
+        return None, 0
+    head_pattern = parser.SubPattern(parsed.state, head)
+    return compiler.compile(head_pattern, parsed.state.flags), int(ahead)
+
+
+class StreamingRegexMatcher:
+    """
+    Accumulates the chunks streamed by a LLM in `buffer`, and returns the first match of the regex as soon as the text contains one.
+    A matcher without regex only accumulates the chunks.
+    """
+
+    def __init__(self, regex: Optional[str]):
+        self.buffer = ""
+        # No match can start before
+        self.resume = 0
+        self.pattern = re.compile(regex) if regex else None
+        if self.pattern is None:
+            return
+        # Without reach nor head, the whole text is searched on every chunk
+        self.reach = None
+        self.head, self.head_reach = None, 0
+        if parser is None or sys.version_info[:2] not in ANALYZED_PYTHON_VERSIONS:
+            return
+        try:
+            self.reach = get_reach(regex)
+            if self.reach is None:
+                self.head, self.head_reach = _get_head(regex)
+        except Exception:
+            self.reach = None
+            self.head, self.head_reach = None, 0
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Adds the chunk to the text, returns the match if the text contains one"""
+        # Without other references, CPython extends the string in place instead of copying it
+        buffer = self.buffer
+        self.buffer = ""
+        buffer += chunk
+        self.buffer = buffer
+        if self.pattern is None:
+            return None
+
+        if self.head is not None:
+            head = self.head.search(buffer, self.resume)
+            settled = max(self.resume, len(buffer) - self.head_reach)
+            self.resume = min(head.start(), settled) if head is not None else settled
+
+        match = self.pattern.search(buffer, self.resume)
+        if match is not None:
+            return match.group(0)
+
+        if self.reach is not None:
+            self.resume = max(self.resume, len(buffer) - self.reach)
+        return None
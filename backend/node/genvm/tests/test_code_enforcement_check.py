@@ -1,78 +1,118 @@
-# from backend.node.genvm.webpage_utils import code_enforcement_check
-
-
-# def test_bad_code():
-#     broken_code = """
-# class A:
-#     method1(self):
-#         pass
-# """
-#     result = code_enforcement_check(broken_code, "A")
-#     result["status"] == "error"
-#     result["message"] == "Your code is not valid Python code"
-#     result["data"] = []
-
-
-# def test_good_code():
-#     with open("genvm/tests/code/working_code.py", "r") as f:
-#         working_code = f.read()
-#         result = code_enforcement_check(working_code, "A")
-#         result["status"] = "success"
-#         result["message"] = ""
-#         result["data"] = []
-
-
-# def test_good_code_class_does_not_exist():
-#     with open("genvm/tests/code/working_code.py", "r") as f:
-#         class_name = "ThisClassDoesNotExist"
-#         working_code = f.read()
-#         result = code_enforcement_check(working_code, class_name)
-#         result["status"] = "error"
-#         result["message"] = f"The class {class_name} does not exist in the code"
-#         result["data"] = []
-
-
-# def test_catch_direct_instatntiation_of_eq_principle():
-#     with open("genvm/tests/code/bad_eq_implementation.py", "r") as f:
-#         bad_eq_implementation = f.read()
-#         result = code_enforcement_check(bad_eq_implementation, "A")
-#         result["status"] == "error"
-#         result[
-#             "message"
-#         ] == "You cannot directly instantiate the EquivalencePrinciple class"
-#         result["data"] = []
-
-
-# def test_inside_eq_with_block_modifys_self():
-#     with open("genvm/tests/code/bad_eq_modifys_self.py", "r") as f:
-#         bad_eq_modifys_self = f.read()
-#         result = code_enforcement_check(bad_eq_modifys_self, "A")
-#         result["status"] == "error"
-#         result["message"] == "Self was modified inside an equivalence block"
-#         result["data"] = [15]
-
-
-# def test_eq_block_variables_not_accessed_outsode_of_block():
-#     with open(
-#         "genvm/tests/code/bad_eq_variables_accessed_outside_of_block.py", "r"
-#     ) as f:
-#         bad_eq_variables_accessed_outside_of_block = f.read()
-#         result = code_enforcement_check(bad_eq_variables_accessed_outside_of_block, "A")
-#         result["status"] == "error"
-#         result[
-#             "message"
-#         ] == "Variables declared in the equivalence block are referenced outside of the equivalence block"
-#         result["data"] = [17]
-
-
-# def test_eq_block_variables_not_accessed_outsode_of_block_complex():
-#     with open(
-#         "genvm/tests/code/bad_eq_variables_accessed_outside_of_block_complex.py", "r"
-#     ) as f:
-#         bad_eq_variables_accessed_outside_of_block = f.read()
-#         result = code_enforcement_check(bad_eq_variables_accessed_outside_of_block, "B")
-#         result["status"] == "error"
-#         result[
-#             "message"
-#         ] == "Variables declared in the equivalence block are referenced outside of the equivalence block"
-#         result["data"] = [18, 28, 29]
+from pathlib import Path
+
+from backend.node.genvm.code_enforcement import code_enforcement_check
+
+CODE_DIR = Path(__file__).parent / "code"
+
+
+def read_code(file_name: str) -> str:
+    return (CODE_DIR / file_name).read_text()
+
+
+def test_bad_code():
+    broken_code = """
+class A:
+    method1(self):
+        pass
+"""
+    result = code_enforcement_check(broken_code, "A")
+    assert result == {
+        "status": "error",
+        "message": "Your code is not valid Python code",
+        "data": [],
+    }
+
+
+def test_good_code():
+    result = code_enforcement_check(read_code("working_code.py"), "A")
+    assert result == {"status": "success", "message": "", "data": []}
+
+
+def test_good_code_class_does_not_exist():
+    class_name = "ThisClassDoesNotExist"
+    result = code_enforcement_check(read_code("working_code.py"), class_name)
+    assert result == {
+        "status": "error",
+        "message": f"The class {class_name} does not exist in the code",
+        "data": [],
+    }
+
+
+def test_catch_direct_instatntiation_of_eq_principle():
+    result = code_enforcement_check(read_code("bad_eq_implementation.py"), "A")
+    assert result == {
+        "status": "error",
+        "message": "You cannot directly instantiate the EquivalencePrinciple class",
+        "data": [],
+    }
+
+
+def test_inside_eq_with_block_modifys_self():
+    result = code_enforcement_check(read_code("bad_eq_modifys_self.py"), "A")
+    assert result == {
+        "status": "error",
+        "message": "Self was modified inside an equivalence block",
+        "data": [16],
+    }
+
+
+def test_eq_block_variables_not_accessed_outsode_of_block():
+    result = code_enforcement_check(
+        read_code("bad_eq_variables_accessed_outside_of_block.py"), "A"
+    )
+    assert result == {
+        "status": "error",
+        "message": "Variables declared in the equivalence block are referenced outside of the equivalence block",
+        "data": [18],
+    }
+
+
+def test_eq_block_variables_not_accessed_outsode_of_block_complex():
+    result = code_enforcement_check(
+        read_code("bad_eq_variables_accessed_outside_of_block_complex.py"), "A"
+    )
+    assert result == {
+        "status": "error",
+        "message": "Variables declared in the equivalence block are referenced outside of the equivalence block",
+        "data": [19, 29, 30],
+    }
+
+
+def test_eq_block_checks_only_apply_to_the_async_methods_of_the_class():
+    code = """
+class Other:
+    async def method(self):
+        async with EquivalencePrinciple(result={}) as eq:
+            self.value = 1
+
+
+class A:
+    async def __init__(self):
+        async with EquivalencePrinciple(result={}) as eq:
+            self.value = 1
+
+    async def method(self):
+        async with EquivalencePrinciple(result={}) as eq:
+            value = 1
+        async with EquivalencePrinciple(result={}) as eq:
+            self.value = 2
+"""
+    result = code_enforcement_check(code, "A")
+    assert result == {
+        "status": "error",
+        "message": "Self was modified inside an equivalence block",
+        "data": [17],
+    }
+
+
+def test_results_are_memoized_per_code_and_class():
+    code = read_code("bad_eq_modifys_self.py")
+    result = code_enforcement_check(code, "A")
+    result["data"].append(0)
+
+    # Callers get their own copy of the memoized result
+    assert code_enforcement_check(code, "A")["data"] == [16]
+    assert code_enforcement_check(code, "B")["status"] == "error"
+    assert code_enforcement_check(code, "B")["message"] == (
+        "The class B does not exist in the code"
+    )
@@ -70,13 +70,17 @@ class Receipt:
     calldata: bytes
     gas_used: int
     mode: ExecutionMode
-    contract_state: str
+    contract_state: Optional[bytes]  # Pickled contract instance
     node_config: dict
     eq_outputs: dict
     execution_result: ExecutionResultStatus
     error: Optional[Exception] = None
     vote: Optional[Vote] = None
     pending_transactions: Iterable[PendingTransaction] = ()
+    # Whether the execution used non-deterministic primitives, when it didn't the consensus can validate it more cheaply
+    nondeterministic: bool = False
+    # SHA-256 of `contract_state`, what receipts are compared and serialized with instead of the full state
+    contract_state_hash: Optional[str] = None
 
     def to_dict(self):
         return {
@@ -86,7 +90,7 @@ class Receipt:
             "calldata": str(base64.b64encode(self.calldata), encoding="ascii"),
             "gas_used": self.gas_used,
             "mode": self.mode.value,
-            "contract_state": self.contract_state,
+            "contract_state_hash": self.contract_state_hash,
             "node_config": self.node_config,
             "eq_outputs": self.eq_outputs,
             "error": str(self.error) if self.error else None,
@@ -94,4 +98,5 @@ class Receipt:
                 pending_transaction.to_dict()
                 for pending_transaction in self.pending_transactions
             ],
+            "nondeterministic": self.nondeterministic,
         }
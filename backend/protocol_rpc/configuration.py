@@ -6,3 +6,8 @@ class GlobalConfiguration:
     @staticmethod
     def get_disabled_info_logs_endpoints() -> list:
         return json.loads(os.environ.get("DISABLE_INFO_LOGS_ENDPOINTS", "[]"))
+
+    @staticmethod
+    def get_database_uri(database: str = "genlayer") -> str:
+        database_name = "genlayer_state" if database == "genlayer" else database
+        return f"postgresql+psycopg2://{os.environ.get('DBUSER')}:{os.environ.get('DBPASSWORD')}@{os.environ.get('DBHOST')}/{database_name}"
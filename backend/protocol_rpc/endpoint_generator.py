@@ -44,6 +44,11 @@ def generate_rpc_endpoint(
             return _serialize(result)
 
         except Exception as e:
+            if getattr(e, "retryable", False):
+                # "Limit exceeded" (EIP-1474), the request can be sent again later as is
+                raise JSONRPCError(
+                    code=-32005, message=str(e), data={"retryable": True}
+                )
             raise JSONRPCError(code=-32000, message=str(e))
 
     endpoint = msg_handler.log_endpoint_info(endpoint)
@@ -1,6 +1,7 @@
 # rpc/endpoints.py
 import random
 import json
+import os
 from functools import partial
 from typing import Any
 from flask_jsonrpc import JSONRPC
@@ -17,6 +18,9 @@ from backend.node.create_nodes.providers import (
     validate_provider,
 )
 from backend.node.genvm.llms import get_llm_plugin
+from backend.node.genvm.llm_limiter import get_llm_limiters_metrics
+from backend.node.genvm.code_cache import get_code_cache_metrics
+from backend.node.genvm.state_cache import get_state_cache_metrics
 from backend.protocol_rpc.message_handler.base import (
     MessageHandler,
     get_client_session_id,
@@ -35,7 +39,11 @@ from backend.protocol_rpc.transactions_parser import (
     decode_method_call_data,
     decode_deployment_data,
 )
-from backend.errors.errors import InvalidAddressError, InvalidTransactionError
+from backend.errors.errors import (
+    InvalidAddressError,
+    InvalidTransactionError,
+    TooManyPendingTransactionsError,
+)
 
 from backend.database_handler.transactions_processor import (
     TransactionAddressFilter,
@@ -46,6 +54,9 @@ from backend.node.genvm.types import ExecutionMode
 
 from flask import request
 
+# Above this number of pending transactions, new ones are rejected until the consensus catches up
+DEFAULT_MAX_PENDING_TRANSACTIONS = 10000
+
 
 ####### HELPER ENDPOINTS #######
 def ping() -> str:
@@ -296,6 +307,10 @@ def get_contract_schema(
             "Contract not deployed.",
         )
 
+    # Stored at deploy time, except for contracts deployed before schemas were stored
+    if contract_account["data"].get("schema"):
+        return contract_account["data"]["schema"]
+
     node = Node(  # Mock node just to get the data from the GenVM
         contract_snapshot=None,
         validator_mode=ExecutionMode.LEADER,
@@ -382,10 +397,62 @@ def call(
     if not accounts_manager.is_valid_address(to_address):
         raise InvalidAddressError(to_address)
 
-    decoded_data = decode_method_call_data(data)
+    accounts_manager.get_account_or_fail(to_address)
+    contract_snapshot = ContractSnapshot(to_address, session)
+    return _call_contract(
+        _read_node(session, msg_handler), contract_snapshot, to_address, data
+    )
 
-    contract_account = accounts_manager.get_account_or_fail(to_address)
-    node = Node(  # Mock node just to get the data from the GenVM
+
+def call_many(
+    session: Session,
+    accounts_manager: AccountsManager,
+    msg_handler: MessageHandler,
+    calls: list[dict],
+    block_tag: str = "latest",
+) -> list[dict]:
+    """
+    Execute many read calls (`{"to", "data", "from"}` like `eth_call`'s params), loading the code and state of each contract once.
+    Results are returned in the order of `calls`, as `{"result": ...}` or `{"error": {"message": ...}}` for each call.
+    """
+    node = _read_node(session, msg_handler)
+    contract_snapshots: dict[str, ContractSnapshot | Exception] = {}
+    results = []
+    for params in calls:
+        try:
+            to_address = params["to"]
+            from_address = params.get("from")
+            if from_address and not accounts_manager.is_valid_address(from_address):
+                raise InvalidAddressError(from_address)
+            if not accounts_manager.is_valid_address(to_address):
+                raise InvalidAddressError(to_address)
+
+            if to_address not in contract_snapshots:
+                try:
+                    accounts_manager.get_account_or_fail(to_address)
+                    contract_snapshots[to_address] = ContractSnapshot(
+                        to_address, session
+                    )
+                except Exception as e:
+                    contract_snapshots[to_address] = e
+            contract_snapshot = contract_snapshots[to_address]
+            if isinstance(contract_snapshot, Exception):
+                raise contract_snapshot
+
+            results.append(
+                {
+                    "result": _call_contract(
+                        node, contract_snapshot, to_address, params["data"]
+                    )
+                }
+            )
+        except Exception as e:
+            results.append({"error": {"message": str(e)}})
+    return results
+
+
+def _read_node(session: Session, msg_handler: MessageHandler) -> Node:
+    return Node(  # Mock node just to get the data from the GenVM
         contract_snapshot=None,
         validator_mode=ExecutionMode.LEADER,
         validator=Validator(
@@ -404,10 +471,17 @@ def call(
         contract_snapshot_factory=partial(ContractSnapshot, session=session),
     )
 
+
+def _call_contract(
+    node: Node, contract_snapshot: ContractSnapshot, to_address: str, data: str
+) -> Any:
+    decoded_data = decode_method_call_data(data)
     return node.get_contract_data(
-        code=contract_account["data"]["code"],
-        state=contract_account["data"]["state"],
+        code=contract_snapshot.contract_code,
+        state=lambda: contract_snapshot.state,
         calldata=decoded_data.calldata,
+        contract_address=to_address,
+        contract_state_hash=contract_snapshot.state_hash,
     )
 
 
@@ -438,6 +512,13 @@ def send_raw_transaction(
     if not transaction_signature_valid:
         raise InvalidTransactionError("Transaction signature verification failed")
 
+    # Admission control, checked last so that invalid transactions get their own error
+    pending_transactions = transactions_processor.count_pending_transactions()
+    if pending_transactions >= int(
+        os.getenv("MAX_PENDING_TRANSACTIONS", DEFAULT_MAX_PENDING_TRANSACTIONS)
+    ):
+        raise TooManyPendingTransactionsError(pending_transactions)
+
     to_address = decoded_transaction.to_address
     nonce = decoded_transaction.nonce
 
@@ -544,6 +625,18 @@ def register_all_rpc_endpoints(
         partial(delete_provider, llm_provider_registry),
         method_name="sim_deleteProvider",
     )
+    register_rpc_endpoint(
+        get_llm_limiters_metrics,
+        method_name="sim_getLlmLimitersMetrics",
+    )
+    register_rpc_endpoint(
+        get_code_cache_metrics,
+        method_name="sim_getGenVMCodeCacheMetrics",
+    )
+    register_rpc_endpoint(
+        get_state_cache_metrics,
+        method_name="sim_getGenVMStateCacheMetrics",
+    )
     register_rpc_endpoint(
         partial(create_validator, validators_registry, accounts_manager),
         method_name="sim_createValidator",
@@ -610,6 +703,10 @@ def register_all_rpc_endpoints(
         partial(call, request_session, accounts_manager, msg_handler),
         method_name="eth_call",
     )
+    register_rpc_endpoint(
+        partial(call_many, request_session, accounts_manager, msg_handler),
+        method_name="gen_callMany",
+    )
     register_rpc_endpoint(
         partial(send_raw_transaction, transactions_processor, accounts_manager),
         method_name="eth_sendRawTransaction",
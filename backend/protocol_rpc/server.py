@@ -1,7 +1,6 @@
 # backend/protocol_rpc/server.py
 
 import os
-from os import environ
 import threading
 import logging
 from flask import Flask
@@ -19,20 +18,19 @@ from backend.protocol_rpc.validators_init import initialize_validators
 from dotenv import load_dotenv
 
 from backend.database_handler.transactions_processor import TransactionsProcessor
+from backend.database_handler.transactions_listener import TransactionsListener
 from backend.database_handler.validators_registry import ValidatorsRegistry
 from backend.database_handler.accounts_manager import AccountsManager
-from backend.consensus.base import ConsensusAlgorithm
+from backend.consensus.base import (
+    DEFAULT_CONSENSUS_LOCAL_WORKERS,
+    consensus_from_env,
+)
 from backend.database_handler.models import Base
 
 
-def get_db_name(database: str) -> str:
-    return "genlayer_state" if database == "genlayer" else database
-
-
 def create_app():
     # DataBase
-    database_name_seed = "genlayer"
-    db_uri = f"postgresql+psycopg2://{environ.get('DBUSER')}:{environ.get('DBPASSWORD')}@{environ.get('DBHOST')}/{get_db_name(database_name_seed)}"
+    db_uri = GlobalConfiguration.get_database_uri()
     sqlalchemy_db = SQLAlchemy(
         model_class=Base,
         session_options={
@@ -52,7 +50,12 @@ def create_app():
     jsonrpc = JSONRPC(
         app, "/api", enable_web_browsable_api=True
     )  # check it out at http://localhost:4000/api/browse/#/
-    socketio = SocketIO(app, cors_allowed_origins="*")
+    # Consensus workers running in other processes emit their events through the message queue
+    socketio = SocketIO(
+        app,
+        cors_allowed_origins="*",
+        message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE"),
+    )
     # Handlers
     msg_handler = MessageHandler(socketio, config=GlobalConfiguration())
     transactions_processor = TransactionsProcessor(sqlalchemy_db.session)
@@ -69,9 +72,16 @@ def create_app():
     )
     initialize_validators_db_session.commit()
 
-    consensus = ConsensusAlgorithm(
-        lambda: Session(engine, expire_on_commit=False), msg_handler
-    )
+    consensus_workers = [
+        consensus_from_env(
+            lambda: Session(engine, expire_on_commit=False),
+            msg_handler,
+            TransactionsListener(engine),
+        )
+        for _ in range(
+            int(os.getenv("CONSENSUS_LOCAL_WORKERS", DEFAULT_CONSENSUS_LOCAL_WORKERS))
+        )
+    ]
     return (
         app,
         jsonrpc,
@@ -81,7 +91,7 @@ def create_app():
         accounts_manager,
         transactions_processor,
         validators_registry,
-        consensus,
+        consensus_workers,
         llm_provider_registry,
         sqlalchemy_db,
     )
@@ -97,7 +107,7 @@ load_dotenv()
     accounts_manager,
     transactions_processor,
     validators_registry,
-    consensus,
+    consensus_workers,
     llm_provider_registry,
     sqlalchemy_db,
 ) = create_app()
@@ -151,10 +161,10 @@ def run_socketio():
 thread_socketio = threading.Thread(target=run_socketio)
 thread_socketio.start()
 
-# Thread for the crawl_snapshot method
-thread_crawl_snapshot = threading.Thread(target=consensus.run_crawl_snapshot_loop)
-thread_crawl_snapshot.start()
-
-# Thread for the run_consensus method
-thread_consensus = threading.Thread(target=consensus.run_consensus_loop)
-thread_consensus.start()
+# Threads for the run_consensus method, which also crawls for new transactions. With `CONSENSUS_LOCAL_WORKERS=0` there are none and transactions are only processed by the standalone workers
+consensus_threads = [
+    threading.Thread(target=consensus.run_consensus_loop)
+    for consensus in consensus_workers
+]
+for thread_consensus in consensus_threads:
+    thread_consensus.start()
@@ -0,0 +1,48 @@
+"""
+Throughput of the calldata codec on large nested arrays and maps.
+
+Run from the root of the repository with `python -m tests.benchmarks.bench_calldata`.
+"""
+
+import time
+
+from backend.node.genvm.calldata import decode, encode
+
+REPEATS = 10
+
+PAYLOADS = {
+    "array of ints": list(range(-100_000, 100_000)),
+    "array of strings": [f"log line {i}" for i in range(100_000)],
+    "array of maps": [
+        {"id": i, "text": f"entry {i}", "tags": ["a", "b"], "active": i % 2 == 0}
+        for i in range(20_000)
+    ],
+    "map of arrays": {f"user_{i}": [i, -i, b"\x00" * 32, None] for i in range(20_000)},
+    "nested arrays": [[[i, [i]] for i in range(100)] for _ in range(500)],
+}
+
+
+def bench(fn, arg) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(arg)
+    return (time.perf_counter() - start) / REPEATS
+
+
+def main():
+    for name, payload in PAYLOADS.items():
+        encoded = encode(payload)
+        assert decode(encoded) == payload
+
+        size = len(encoded) / 1024 / 1024
+        encode_time = bench(encode, payload)
+        decode_time = bench(decode, encoded)
+        print(
+            f"{name:>18}: {len(encoded):>9} bytes, "
+            f"encode {encode_time * 1000:7.1f}ms ({size / encode_time:5.1f}MiB/s), "
+            f"decode {decode_time * 1000:7.1f}ms ({size / decode_time:5.1f}MiB/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
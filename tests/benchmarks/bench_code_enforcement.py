@@ -0,0 +1,53 @@
+"""
+Cost of the code enforcement checks run on every deploy, on the contracts in `examples/contracts`.
+
+Run from the root of the repository with `python -m tests.benchmarks.bench_code_enforcement`.
+"""
+
+import re
+import time
+from pathlib import Path
+
+from backend.node.genvm import code_enforcement
+from backend.node.genvm.code_enforcement import code_enforcement_check
+
+REPEATS = 200
+
+CONTRACTS_DIR = Path(__file__).parents[2] / "examples" / "contracts"
+
+
+def load_contracts() -> list[tuple[str, str]]:
+    contracts = []
+    for path in sorted(CONTRACTS_DIR.glob("*.py")):
+        code = path.read_text()
+        class_name = re.search(r"^class (\w+)", code, re.MULTILINE)
+        if class_name:
+            contracts.append((code, class_name.group(1)))
+    return contracts
+
+
+def bench(contracts: list[tuple[str, str]], memoized: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for code, class_name in contracts:
+            if memoized:
+                code_enforcement_check(code, class_name)
+            else:
+                code_enforcement._code_enforcement_check(code, class_name)
+    return (time.perf_counter() - start) / (REPEATS * len(contracts))
+
+
+def main():
+    contracts = load_contracts()
+    print(f"{len(contracts)} contracts, {REPEATS} checks each")
+
+    uncached = bench(contracts, memoized=False)
+    print(f"single pass: {uncached * 1e6:.1f}us per check")
+
+    code_enforcement._results.clear()
+    memoized = bench(contracts, memoized=True)
+    print(f"memoized:    {memoized * 1e6:.1f}us per check ({uncached / memoized:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
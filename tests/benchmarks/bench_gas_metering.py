@@ -0,0 +1,85 @@
+"""
+Overhead of gas metering on contract executions.
+
+Run from the root of the repository with `python -m tests.benchmarks.bench_gas_metering`.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import Mock
+
+from backend.node.genvm.base import GenVM
+from backend.node.genvm.calldata import encode
+from backend.node.genvm.code_cache import code_cache
+from backend.node.genvm.types import ExecutionMode
+from backend.protocol_rpc.message_handler.base import MessageHandler
+
+CONTRACT_CODE = """
+import json
+from backend.node.genvm.icontract import IContract
+
+
+class Benchmark(IContract):
+    def __init__(self):
+        self.total = 0
+
+    def loop(self, n: int):
+        for i in range(n):
+            self.total += i * i
+
+    def library_calls(self, n: int):
+        # Time spent outside of contract code is not metered
+        for i in range(n // 100):
+            json.loads(json.dumps({"i": i, "values": list(range(100))}))
+"""
+
+ITERATIONS = 1_000_000
+REPEATS = 5
+
+
+class Snapshot:
+    contract_code = CONTRACT_CODE
+
+    def __init__(self, state: bytes):
+        self.state = state
+
+
+async def measure(method: str) -> tuple[float, int]:
+    code_cache.clear()  # Contracts are instrumented when compiled
+    genvm = GenVM(None, ExecutionMode.LEADER, {}, None, Mock(MessageHandler))
+    receipt = await genvm.deploy_contract(
+        "0x0", CONTRACT_CODE, encode({"args": []}), None
+    )
+    state = receipt.contract_state
+
+    best = float("inf")
+    for _ in range(REPEATS):
+        genvm = GenVM(
+            Snapshot(state), ExecutionMode.LEADER, {}, None, Mock(MessageHandler)
+        )
+        started_at = time.perf_counter()
+        receipt = await genvm.run_contract(
+            "0x0", encode({"method": method, "args": [ITERATIONS]}), None
+        )
+        best = min(best, time.perf_counter() - started_at)
+    return best, receipt.gas_used
+
+
+async def main():
+    print(f"Python {sys.version.split()[0]}, best of {REPEATS}")
+    for method in ["loop", "library_calls"]:
+        os.environ["GENVM_GAS_METERING"] = "false"
+        unmetered, _ = await measure(method)
+        os.environ["GENVM_GAS_METERING"] = "true"
+        metered, gas_used = await measure(method)
+        sys.settrace(None)
+        print(
+            f"{method}: {unmetered * 1000:.1f} ms unmetered, {metered * 1000:.1f} ms metered"
+            f" ({metered / unmetered:.2f}x), {gas_used} gas"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+"""
+Peak memory and time of handling a bulk input one item at a time, decoded eagerly or lazily.
+
+Run from the root of the repository with `python -m tests.benchmarks.bench_lazy_calldata`.
+"""
+
+import time
+import tracemalloc
+
+from backend.node.genvm.calldata import decode, decode_lazy, encode
+
+LOGS = [
+    {"level": "error" if i % 100 == 0 else "info", "message": f"log line {i}"}
+    for i in range(100_000)
+]
+
+
+def count_errors(logs) -> int:
+    return sum(1 for log in logs if log["level"] == "error")
+
+
+def bench(decode_fn, calldata: bytes) -> tuple[float, int]:
+    start = time.perf_counter()
+    assert count_errors(decode_fn(calldata)["args"][0]) == 1000
+    elapsed = time.perf_counter() - start
+
+    # Measured separately, tracing allocations slows everything down
+    tracemalloc.start()
+    count_errors(decode_fn(calldata)["args"][0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    calldata = encode({"method": "add_logs", "args": [LOGS]})
+    print(f"{len(LOGS)} logs, {len(calldata) / 1024 / 1024:.1f}MiB of calldata")
+    for name, decode_fn in (("eager", decode), ("lazy", decode_lazy)):
+        elapsed, peak = bench(decode_fn, calldata)
+        print(f"{name:>5}: {elapsed * 1000:6.1f}ms, peak {peak / 1024:8.1f}KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Time spent by a read (`eth_call`) on the state of the contract before and after calling the getter, loading it on every call or using a cached instance.
+
+Run from the root of the repository with `python -m tests.benchmarks.bench_state_cache`.
+"""
+
+import copy
+import pickle
+import time
+
+from backend.database_handler.state_codec import (
+    compress_state,
+    decompress_state,
+    state_hash,
+)
+from backend.node.genvm.state_cache import StateCache
+
+SIZES = (1_000, 10_000, 50_000)
+CALLS = 20
+
+
+class Contract:
+    def __init__(self, size: int):
+        self.balances = {f"0x{i:040x}": i for i in range(size)}
+        self.history = [(i, f"transfer {i}") for i in range(size // 2)]
+
+    def get_balance(self, address: str) -> int:
+        return self.balances.get(address, 0)
+
+
+def load(compressed: bytes, codec: str) -> Contract:
+    """What reads did without cache, the blob fetched from the database isn't included"""
+    return pickle.loads(decompress_state(compressed, codec))
+
+
+def bench(fn, calls: int = CALLS) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    for size in SIZES:
+        state = pickle.dumps(Contract(size))
+        compressed, codec = compress_state(state)
+        hash = state_hash(state)
+        address = f"0x{size:040x}"
+
+        without_cache = bench(lambda: load(compressed, codec).get_balance(address))
+
+        # The previous cache, copying the instance before each call
+        instance = load(compressed, codec)
+        copying = bench(lambda: copy.deepcopy(instance).get_balance(address))
+
+        cache = StateCache(max_entries=1)
+
+        def cached():
+            with cache.use_instance(
+                "0x1", hash, lambda: decompress_state(compressed, codec)
+            ) as contract:
+                return contract.get_balance(address)
+
+        cached()
+        with_cache = bench(cached)
+        assert cache.get_metrics()["misses"] == 1
+
+        print(
+            f"{size:>6} balances ({len(state) / 1e6:4.1f}MB): "
+            f"without cache {without_cache * 1000:6.1f}ms, "
+            f"copying {copying * 1000:6.1f}ms, "
+            f"cached {with_cache * 1000:6.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Time spent matching the stop regex of a call on long streamed outputs, searching the whole text on every chunk or incrementally.
+
+Run from the root of the repository with `python -m tests.benchmarks.bench_streaming_regex`.
+"""
+
+import re
+import time
+
+from backend.node.genvm.streaming_regex import StreamingRegexMatcher
+
+TOKENS = (2_000, 8_000, 32_000)
+
+PATTERNS = {
+    "bounded": r"Answer: (yes|no)\b",
+    "unbounded": r"\{.*\}",
+}
+
+
+def stream(tokens: int, opened: bool = False) -> list[str]:
+    """Chunks of a few characters, as LLMs stream them, matching at the end"""
+    return (
+        (["{"] if opened else [])
+        + [f" word{i % 100}" for i in range(tokens)]
+        + [" Answer: yes {}"]
+    )
+
+
+def search_whole_text(regex: str, chunks: list[str]) -> str:
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        match = re.search(regex, buffer)
+        if match:
+            return match.group(0)
+
+
+def search_streaming(regex: str, chunks: list[str]) -> str:
+    matcher = StreamingRegexMatcher(regex)
+    for chunk in chunks:
+        match = matcher.feed(chunk)
+        if match is not None:
+            return match
+
+
+def bench(fn, regex: str, chunks: list[str]) -> float:
+    start = time.perf_counter()
+    assert fn(regex, chunks) is not None
+    return time.perf_counter() - start
+
+
+def main():
+    cases = [(name, regex, False) for name, regex in PATTERNS.items()]
+    # A match started at the beginning is searched again on every chunk
+    cases.append(("opened", PATTERNS["unbounded"], True))
+    for name, regex, opened in cases:
+        for tokens in TOKENS:
+            chunks = stream(tokens, opened)
+            assert search_whole_text(regex, chunks) == search_streaming(regex, chunks)
+            whole_text_time = bench(search_whole_text, regex, chunks)
+            streaming_time = bench(search_streaming, regex, chunks)
+            print(
+                f"{name:>9} {tokens:>6} tokens: "
+                f"whole text {whole_text_time * 1000:8.1f}ms, "
+                f"incremental {streaming_time * 1000:7.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
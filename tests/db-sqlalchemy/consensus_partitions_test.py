@@ -0,0 +1,52 @@
+from sqlalchemy.orm import Session
+
+from backend.database_handler.consensus_partitions import (
+    ConsensusPartitionsRegistry,
+    address_partition,
+)
+from backend.database_handler.transactions_processor import TransactionsProcessor
+
+
+def test_acquire_partitions(session: Session):
+    registry = ConsensusPartitionsRegistry(session)
+
+    # A single worker takes all the partitions
+    assert registry.acquire_partitions("worker-1", 4, 60) == [0, 1, 2, 3]
+    session.commit()
+
+    # A new worker gets nothing until the first one hands partitions over
+    assert registry.acquire_partitions("worker-2", 4, 60) == []
+    session.commit()
+    assert registry.get_fair_share("worker-1", 4) == 2
+
+    registry.release_partitions("worker-1", [2, 3])
+    assert registry.acquire_partitions("worker-1", 4, 60) == [0, 1]
+    assert registry.acquire_partitions("worker-2", 4, 60) == [2, 3]
+    session.commit()
+
+    # Partitions of a stopped worker are taken over by the remaining ones
+    registry.unregister("worker-2")
+    assert registry.acquire_partitions("worker-1", 4, 60) == [0, 1, 2, 3]
+
+
+def test_claim_pending_transactions_of_partitions(
+    session: Session, transactions_processor: TransactionsProcessor
+):
+    from_address = "0x9F0e84243496AcFB3Cd99D02eA59673c05901501"
+    to_addresses = [f"0x{i:040x}" for i in range(8)]
+    for to_address in to_addresses:
+        transactions_processor.insert_transaction(
+            from_address, to_address, None, 0, 2, 0, False
+        )
+    session.commit()
+
+    claimed = transactions_processor.claim_pending_transactions(
+        "worker-1", 60, 100, partitions=[0, 1], partition_count=4
+    )
+
+    # The SQL and Python partition functions agree
+    assert {transaction["to_address"] for transaction in claimed} == {
+        to_address
+        for to_address in to_addresses
+        if address_partition(to_address, 4) in [0, 1]
+    }
@@ -2,15 +2,20 @@ from sqlalchemy.orm import Session
 
 from backend.database_handler.contract_snapshot import ContractSnapshot
 from backend.database_handler.models import CurrentState
+from backend.database_handler.state_codec import state_hash
 
 
 def test_contract_snapshot_with_contract(session: Session):
     # Pre-load contract
     contract_address = "0x123456"
     contract_code = "code"
-    contract_state = "state"
+    contract_state = b"state"
     contract = CurrentState(
-        id=contract_address, data={"code": contract_code, "state": contract_state}
+        id=contract_address,
+        data={"code": contract_code},
+        state=contract_state,
+        state_hash=state_hash(contract_state),
+        state_codec="none",
     )
 
     session.add(contract)
@@ -21,24 +26,24 @@ def test_contract_snapshot_with_contract(session: Session):
 
     assert contract_snapshot.contract_address == contract_address
     assert contract_snapshot.contract_data["code"] == contract_code
-    assert contract_snapshot.contract_data["state"] == contract_state
+    assert contract_snapshot.contract_code == contract_code
+    assert contract_snapshot.state == contract_state
+    assert contract_snapshot.state_hash == state_hash(contract_state)
 
-    new_state = "new_state"
+    new_state = b"new_state"
     contract_snapshot.update_contract_state(new_state)
 
     actual_contract = session.query(CurrentState).filter_by(id=contract_address).one()
 
-    assert actual_contract.data["state"] == new_state
+    assert actual_contract.state_hash == state_hash(new_state)
     assert actual_contract.data["code"] == contract_code
+    assert ContractSnapshot(contract_address, session).state == new_state
 
 
 def test_contract_snapshot_without_contract(session: Session):
     contract_address = "0x123456"
     contract_code = "code"
-    contract_state = "state"
-    contract = CurrentState(
-        id=contract_address, data={"code": contract_code, "state": contract_state}
-    )
+    contract = CurrentState(id=contract_address, data={"code": contract_code})
     session.add(contract)
 
     contract_snapshot = ContractSnapshot(None, session)
@@ -47,14 +52,12 @@ def test_contract_snapshot_without_contract(session: Session):
     assert "contract_data" not in contract_snapshot.__dict__
     assert "contract_code" not in contract_snapshot.__dict__
 
-    updated_data = {
-        "code": "new_code",
-        "state": "new_state",
-    }
+    updated_data = {"code": "new_code"}
     updated_contract = {"id": contract_address, "data": updated_data}
-    contract_snapshot.register_contract(updated_contract)
+    contract_snapshot.register_contract(updated_contract, b"new_state")
 
     actual_contract = session.query(CurrentState).filter_by(id=contract.id).one()
 
     assert actual_contract.data == updated_data
     assert actual_contract.id == contract_address
+    assert ContractSnapshot(contract_address, session).state == b"new_state"
@@ -0,0 +1,30 @@
+import asyncio
+
+from sqlalchemy import Engine
+
+from backend.database_handler.transactions_listener import TransactionsListener
+from backend.database_handler.transactions_processor import TransactionsProcessor
+
+
+def test_transactions_listener(
+    engine: Engine, transactions_processor: TransactionsProcessor
+):
+    from_address = "0x9F0e84243496AcFB3Cd99D02eA59673c05901501"
+    to_address = "0xAcec3A6d871C25F591aBd4fC24054e524BBbF794"
+
+    with TransactionsListener(engine) as listener:
+        # Nothing has been inserted yet, so the listener times out
+        assert asyncio.run(listener.wait_for_transactions(timeout=0.1)) == []
+
+        transaction_hash = transactions_processor.insert_transaction(
+            from_address, to_address, {"key": "value"}, 0, 2, 0, False
+        )
+
+        # Notifications are only delivered once the transaction is committed
+        assert asyncio.run(listener.wait_for_transactions(timeout=0.1)) == []
+
+        transactions_processor.session.commit()
+
+        assert asyncio.run(listener.wait_for_transactions(timeout=1)) == [
+            transaction_hash
+        ]
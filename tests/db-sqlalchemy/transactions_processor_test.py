@@ -96,3 +96,66 @@ def test_transactions_processor(transactions_processor: TransactionsProcessor):
     assert math.isclose(actual_transaction["value"], value)
     assert actual_transaction["type"] == transaction_type
     assert actual_transaction["created_at"] == created_at
+
+
+def test_claim_pending_transactions(transactions_processor: TransactionsProcessor):
+    from_address = "0x9F0e84243496AcFB3Cd99D02eA59673c05901501"
+    to_address = "0xAcec3A6d871C25F591aBd4fC24054e524BBbF794"
+
+    transaction_hashes = [
+        transactions_processor.insert_transaction(
+            from_address, to_address, {"key": nonce}, 0, 2, nonce, False
+        )
+        for nonce in range(3)
+    ]
+    transactions_processor.session.commit()
+
+    claimed = transactions_processor.claim_pending_transactions("owner_1", 60, 2)
+    transactions_processor.session.commit()
+    assert [transaction["hash"] for transaction in claimed] == transaction_hashes[:2]
+
+    # Claimed transactions are not handed out twice
+    claimed = transactions_processor.claim_pending_transactions("owner_2", 60, 10)
+    transactions_processor.session.commit()
+    assert [transaction["hash"] for transaction in claimed] == transaction_hashes[2:]
+    assert transactions_processor.claim_pending_transactions("owner_2", 60, 10) == []
+
+    # Expired leases can be claimed again
+    transactions_processor.renew_transaction_claims(
+        "owner_1", -1, transaction_hashes[:1]
+    )
+    transactions_processor.session.commit()
+    claimed = transactions_processor.claim_pending_transactions("owner_2", 60, 10)
+    transactions_processor.session.commit()
+    assert [transaction["hash"] for transaction in claimed] == transaction_hashes[:1]
+
+    # Released transactions can be claimed again
+    transactions_processor.release_transaction_claims("owner_2")
+    transactions_processor.session.commit()
+    claimed = transactions_processor.claim_pending_transactions(
+        "owner_1", 60, 10, transaction_hashes[2:]
+    )
+    assert [transaction["hash"] for transaction in claimed] == transaction_hashes[2:]
+
+    # Claims can be released one by one
+    transactions_processor.release_transaction_claims("owner_1", transaction_hashes[2:])
+    transactions_processor.session.commit()
+    claimed = transactions_processor.claim_pending_transactions("owner_2", 60, 10)
+    transactions_processor.session.commit()
+    # The first one was released with all the claims of owner_2
+    assert [transaction["hash"] for transaction in claimed] == [
+        transaction_hashes[0],
+        transaction_hashes[2],
+    ]
+
+    # Only pending transactions can be claimed
+    transactions_processor.release_transaction_claims("owner_1")
+    transactions_processor.release_transaction_claims("owner_2")
+    transactions_processor.update_transaction_status(
+        transaction_hashes[1], TransactionStatus.FINALIZED
+    )
+    transactions_processor.session.commit()
+    claimed = transactions_processor.claim_pending_transactions(
+        "owner_1", 60, 10, transaction_hashes[:2]
+    )
+    assert [transaction["hash"] for transaction in claimed] == transaction_hashes[:1]
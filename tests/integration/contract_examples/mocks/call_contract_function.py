@@ -4,7 +4,7 @@ call_contract_function_response = {
         "leader_receipt": {
             "class_name": str,
             "calldata": str,
-            "contract_state": str,
+            "contract_state_hash": str,
             "eq_outputs": {"leader": dict},
             "error": str | None,
             "execution_result": str,
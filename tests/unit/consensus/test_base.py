@@ -1,10 +1,17 @@
+import asyncio
+import gc
 from collections import defaultdict
 from typing import Callable
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, MagicMock, Mock
 
 import pytest
 
-from backend.consensus.base import ConsensusAlgorithm, rotate
+from backend.consensus.base import (
+    ConsensusAlgorithm,
+    DeterministicValidationMode,
+    consensus_from_env,
+    rotate,
+)
 from backend.database_handler.contract_snapshot import ContractSnapshot
 from backend.database_handler.models import TransactionStatus
 from backend.domain.types import Transaction, TransactionType
@@ -81,7 +88,7 @@ def contract_snapshot_factory(address: str):
         def __init__(self):
             self.address = address
 
-        def update_contract_state(self, state: str):
+        def update_contract_state(self, state: bytes):
             pass
 
     return ContractSnapshotMock()
@@ -148,7 +155,7 @@ async def test_exec_transaction():
                 calldata=b"",
                 mode=mode,
                 gas_used=0,
-                contract_state="",
+                contract_state=b"",
                 node_config={},
                 eq_outputs={},
                 execution_result=ExecutionResultStatus.SUCCESS,
@@ -258,7 +265,7 @@ async def test_exec_transaction_no_consensus():
                 calldata=b"",
                 mode=mode,
                 gas_used=0,
-                contract_state="",
+                contract_state=b"",
                 node_config={},
                 eq_outputs={},
                 execution_result=ExecutionResultStatus.SUCCESS,
@@ -373,7 +380,7 @@ async def test_exec_transaction_one_disagreement():
                 calldata=b"",
                 mode=mode,
                 gas_used=0,
-                contract_state="",
+                contract_state=b"",
                 node_config={},
                 eq_outputs={},
                 execution_result=ExecutionResultStatus.SUCCESS,
@@ -432,3 +439,676 @@ def test_rotate():
 
     with pytest.raises(StopIteration):
         next(iterator)
+
+
+@pytest.mark.asyncio
+async def test_process_queues_fifo_per_address_and_independent_addresses():
+    """
+    Scenario: a slow transaction on one contract must not stall other contracts,
+    and transactions of the same contract must run one after the other in order
+    """
+
+    consensus = ConsensusAlgorithm(None, Mock(MessageHandler), max_concurrency=2)
+
+    executed = []
+    running = set()
+    release = defaultdict(asyncio.Event)
+
+    async def exec_transaction_with_session(transaction: Transaction):
+        assert transaction.to_address not in running  # strict FIFO per address
+        running.add(transaction.to_address)
+        await release[transaction.hash].wait()
+        running.remove(transaction.to_address)
+        executed.append(transaction.hash)
+
+    consensus._exec_transaction_with_session = exec_transaction_with_session
+
+    def transaction(hash: str, to_address: str) -> dict:
+        return transaction_to_dict(
+            Transaction(
+                hash=hash,
+                to_address=to_address,
+                status=TransactionStatus.PENDING,
+                type=TransactionType.RUN_CONTRACT,
+            )
+        )
+
+    await consensus._enqueue_transactions(
+        [
+            transaction("slow_1", "slow_contract"),
+            transaction("slow_2", "slow_contract"),
+            transaction("fast_1", "fast_contract"),
+            transaction("fast_2", "fast_contract"),
+        ]
+    )
+
+    release["fast_1"].set()
+    release["fast_2"].set()
+    await asyncio.sleep(0.01)
+    assert executed == ["fast_1", "fast_2"]
+    assert "fast_contract" not in consensus.workers  # idle workers exit
+
+    release["slow_2"].set()  # doesn't overtake slow_1
+    await asyncio.sleep(0.01)
+    assert executed == ["fast_1", "fast_2"]
+
+    release["slow_1"].set()
+    await asyncio.sleep(0.01)
+    assert executed == ["fast_1", "fast_2", "slow_1", "slow_2"]
+    assert consensus.workers == {}
+    assert consensus.queues == {}  # idle queues are evicted
+    assert consensus.queued_transaction_hashes == set()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("validator_timeout", [None, 0.01])
+async def test_exec_transaction_does_not_wait_for_stragglers(validator_timeout):
+    """
+    Scenario: two validators agree quickly while two others hang
+    Tests that the transaction is accepted without waiting for the hanging validators, either because the quorum is reached or because they time out
+    """
+
+    transaction = Transaction(
+        hash="transaction_hash",
+        from_address="from_address",
+        to_address="to_address",
+        status=TransactionStatus.PENDING,
+        type=TransactionType.RUN_CONTRACT,
+    )
+
+    nodes = [
+        {
+            "address": f"address{i}",
+            "stake": i,
+            "provider": f"provider{i}",
+            "model": f"model{i}",
+            "config": f"config{i}",
+        }
+        for i in range(1, 6)
+    ]
+    validator_addresses = []
+    cancelled_addresses = set()
+
+    def node_factory(
+        node: dict,
+        mode: ExecutionMode,
+        contract_snapshot: ContractSnapshot,
+        receipt: Receipt | None,
+        msg_handler: MessageHandler,
+        contract_snapshot_factory: Callable[[str], ContractSnapshot],
+    ):
+        mock = Mock(Node)
+
+        mock.validator_mode = mode
+        mock.address = node["address"]
+        mock.leader_receipt = receipt
+
+        if mode == ExecutionMode.VALIDATOR:
+            validator_addresses.append(node["address"])
+        # The last two validators hang
+        hangs = len(validator_addresses) > 2
+
+        async def exec_transaction(transaction: Transaction):
+            if hangs:
+                try:
+                    await asyncio.Event().wait()
+                except asyncio.CancelledError:
+                    cancelled_addresses.add(node["address"])
+                    raise
+            return Receipt(
+                vote=Vote.AGREE,
+                class_name="",
+                calldata=b"",
+                mode=mode,
+                gas_used=0,
+                contract_state=b"",
+                node_config={},
+                eq_outputs={},
+                execution_result=ExecutionResultStatus.SUCCESS,
+                error=None,
+            )
+
+        mock.exec_transaction.side_effect = exec_transaction
+
+        return mock
+
+    transactions_processor = TransactionsProcessorMock(
+        [transaction_to_dict(transaction)]
+    )
+
+    await asyncio.wait_for(
+        ConsensusAlgorithm(
+            None, Mock(MessageHandler), validator_timeout=validator_timeout
+        ).exec_transaction(
+            transaction=transaction,
+            transactions_processor=transactions_processor,
+            snapshot=SnapshotMock(nodes),
+            accounts_manager=AccountsManagerMock(),
+            contract_snapshot_factory=contract_snapshot_factory,
+            node_factory=node_factory,
+        ),
+        timeout=1,
+    )
+
+    assert cancelled_addresses == set(validator_addresses[2:])
+    consensus_data = transactions_processor.get_transaction_by_hash(transaction.hash)[
+        "consensus_data"
+    ]
+    assert consensus_data["final"]
+    # Only the leader and the validators that finished are recorded
+    assert len(consensus_data["votes"]) == 3
+    assert not cancelled_addresses & consensus_data["votes"].keys()
+    assert transactions_processor.updated_transaction_status_history == {
+        "transaction_hash": [
+            TransactionStatus.PROPOSING,
+            TransactionStatus.COMMITTING,
+            TransactionStatus.REVEALING,
+            TransactionStatus.ACCEPTED,
+            TransactionStatus.FINALIZED,
+        ]
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "nondeterministic, expected_validators",
+    [
+        pytest.param(False, 1, id="deterministic"),
+        pytest.param(True, 4, id="nondeterministic"),
+    ],
+)
+async def test_exec_transaction_single_validator_for_deterministic_transactions(
+    nondeterministic, expected_validators
+):
+    """
+    Scenario: the leader execution didn't use any non-deterministic primitive
+    Tests that only one validator re-executes the transaction in single validator mode
+    """
+
+    transaction = Transaction(
+        hash="transaction_hash",
+        from_address="from_address",
+        to_address="to_address",
+        status=TransactionStatus.PENDING,
+        type=TransactionType.RUN_CONTRACT,
+    )
+
+    nodes = [
+        {
+            "address": f"address{i}",
+            "stake": i,
+            "provider": f"provider{i}",
+            "model": f"model{i}",
+            "config": f"config{i}",
+        }
+        for i in range(1, 6)
+    ]
+
+    created_nodes = []
+
+    def node_factory(
+        node: dict,
+        mode: ExecutionMode,
+        contract_snapshot: ContractSnapshot,
+        receipt: Receipt | None,
+        msg_handler: MessageHandler,
+        contract_snapshot_factory: Callable[[str], ContractSnapshot],
+    ):
+        mock = Mock(Node)
+
+        mock.validator_mode = mode
+        mock.address = node["address"]
+        mock.leader_receipt = receipt
+
+        mock.exec_transaction = AsyncMock(
+            return_value=Receipt(
+                vote=Vote.AGREE,
+                class_name="",
+                calldata=b"",
+                mode=mode,
+                gas_used=0,
+                contract_state=b"",
+                node_config={},
+                eq_outputs={},
+                execution_result=ExecutionResultStatus.SUCCESS,
+                error=None,
+                nondeterministic=nondeterministic,
+            )
+        )
+
+        created_nodes.append(mock)
+
+        return mock
+
+    transactions_processor = TransactionsProcessorMock(
+        [transaction_to_dict(transaction)]
+    )
+
+    await ConsensusAlgorithm(
+        None,
+        Mock(MessageHandler),
+        deterministic_validation=DeterministicValidationMode.SINGLE_VALIDATOR,
+    ).exec_transaction(
+        transaction=transaction,
+        transactions_processor=transactions_processor,
+        snapshot=SnapshotMock(nodes),
+        accounts_manager=AccountsManagerMock(),
+        contract_snapshot_factory=contract_snapshot_factory,
+        node_factory=node_factory,
+    )
+
+    validators = [
+        node for node in created_nodes if node.validator_mode == ExecutionMode.VALIDATOR
+    ]
+    assert len(validators) == expected_validators
+    for node in created_nodes:
+        node.exec_transaction.assert_awaited_once_with(transaction)
+
+    assert (
+        transactions_processor.get_transaction_by_hash(transaction.hash)["status"]
+        == TransactionStatus.FINALIZED
+    )
+
+
+@pytest.mark.asyncio
+async def test_claim_pending_transactions_up_to_max_queued_transactions(
+    monkeypatch,
+):
+    """
+    Scenario: more transactions are pending than the queues can hold
+    Tests that only enough transactions to fill the queues are claimed
+    """
+
+    pending_transactions = [
+        transaction_to_dict(
+            Transaction(
+                hash=f"hash_{i}",
+                to_address="to_address",
+                status=TransactionStatus.PENDING,
+                type=TransactionType.RUN_CONTRACT,
+            )
+        )
+        for i in range(10)
+    ]
+    requested_limits = []
+
+    class TransactionsProcessorClaimMock:
+        def __init__(self, session):
+            pass
+
+        def claim_pending_transactions(self, owner, lease_duration, limit, *args):
+            requested_limits.append(limit)
+            claimed = pending_transactions[:limit]
+            del pending_transactions[:limit]
+            return claimed
+
+    monkeypatch.setattr(
+        "backend.consensus.base.TransactionsProcessor", TransactionsProcessorClaimMock
+    )
+    consensus = ConsensusAlgorithm(
+        MagicMock, Mock(MessageHandler), max_queued_transactions=4
+    )
+    release = asyncio.Event()
+
+    async def exec_transaction_with_session(transaction: Transaction):
+        await release.wait()
+
+    consensus._exec_transaction_with_session = exec_transaction_with_session
+
+    assert not await consensus._claim_pending_transactions()
+    await asyncio.sleep(0)
+    # The first transaction is being executed, so it is no longer queued
+    assert len(consensus.queued_transaction_hashes) == 3
+    assert not await consensus._claim_pending_transactions()
+    assert requested_limits == [4, 1]
+    assert len(pending_transactions) == 5
+
+    # The rest are claimed as the queues drain
+    release.set()
+    while not await consensus._claim_pending_transactions():
+        await asyncio.sleep(0.01)
+    assert pending_transactions == []
+
+
+@pytest.mark.asyncio
+async def test_exec_transaction_speculative_leaders():
+    """
+    Scenario: the first round disagrees, the second agrees and the third never ends
+    Tests that speculative rounds run in parallel, are recorded in order and the ones that are not needed are cancelled
+    """
+
+    transaction = Transaction(
+        hash="transaction_hash",
+        from_address="from_address",
+        to_address="to_address",
+        status=TransactionStatus.PENDING,
+        type=TransactionType.RUN_CONTRACT,
+    )
+
+    nodes = [
+        {
+            "address": f"address{i}",
+            "stake": i,
+            "provider": f"provider{i}",
+            "model": f"model{i}",
+            "config": f"config{i}",
+        }
+        for i in range(1, 4)
+    ]
+
+    started_leaders = []
+    cancelled_rounds = []
+    # Set when the leaders of the first two rounds start executing
+    leaders_running = [asyncio.Event(), asyncio.Event()]
+
+    def node_factory(
+        node: dict,
+        mode: ExecutionMode,
+        contract_snapshot: ContractSnapshot,
+        receipt: Receipt | None,
+        msg_handler: MessageHandler,
+        contract_snapshot_factory: Callable[[str], ContractSnapshot],
+    ):
+        mock = Mock(Node)
+
+        mock.validator_mode = mode
+        mock.address = node["address"]
+        mock.leader_receipt = receipt
+
+        if mode == ExecutionMode.LEADER:
+            round = len(started_leaders)
+            started_leaders.append(round)
+        else:
+            round = receipt.node_config["round"]
+
+        async def exec_transaction(transaction: Transaction):
+            try:
+                if round in [0, 1] and mode == ExecutionMode.LEADER:
+                    leaders_running[round].set()
+                    # Only returns once the other leader is running, so the rounds have to overlap
+                    await leaders_running[1 - round].wait()
+                elif round == 2:
+                    await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled_rounds.append(round)
+                raise
+            return Receipt(
+                vote=Vote.AGREE if round == 1 else Vote.DISAGREE,
+                class_name="",
+                calldata=b"",
+                mode=mode,
+                gas_used=0,
+                contract_state=b"",
+                node_config={"round": round},
+                eq_outputs={},
+                execution_result=ExecutionResultStatus.SUCCESS,
+                error=None,
+            )
+
+        mock.exec_transaction.side_effect = exec_transaction
+
+        return mock
+
+    transactions_processor = TransactionsProcessorMock(
+        [transaction_to_dict(transaction)]
+    )
+
+    await asyncio.wait_for(
+        ConsensusAlgorithm(
+            None, Mock(MessageHandler), speculative_leaders=3
+        ).exec_transaction(
+            transaction=transaction,
+            transactions_processor=transactions_processor,
+            snapshot=SnapshotMock(nodes),
+            accounts_manager=AccountsManagerMock(),
+            contract_snapshot_factory=contract_snapshot_factory,
+            node_factory=node_factory,
+        ),
+        # Running the first two rounds one after the other never ends
+        timeout=10,
+    )
+
+    assert started_leaders == [0, 1, 2]
+    assert cancelled_rounds == [2]
+    consensus_data = transactions_processor.get_transaction_by_hash(transaction.hash)[
+        "consensus_data"
+    ]
+    assert consensus_data["leader_receipt"]["node_config"] == {"round": 1}
+    assert transactions_processor.updated_transaction_status_history == {
+        "transaction_hash": [
+            TransactionStatus.PROPOSING,  # leader 1
+            TransactionStatus.COMMITTING,
+            TransactionStatus.REVEALING,
+            TransactionStatus.PROPOSING,  # rotation, leader 2
+            TransactionStatus.COMMITTING,
+            TransactionStatus.REVEALING,
+            TransactionStatus.ACCEPTED,
+            TransactionStatus.FINALIZED,
+        ]
+    }
+
+
+@pytest.mark.asyncio
+async def test_claims_are_not_left_behind(monkeypatch):
+    """
+    Scenario: a queued transaction is claimed again after its lease expired, and another one fails to execute
+    Tests that the first one is not queued twice and the claim of the second one is released
+    """
+
+    def pending_transaction(hash: str) -> dict:
+        return transaction_to_dict(
+            Transaction(
+                hash=hash,
+                to_address="to_address",
+                status=TransactionStatus.PENDING,
+                type=TransactionType.RUN_CONTRACT,
+            )
+        )
+
+    released = []
+
+    class TransactionsProcessorClaimMock:
+        def __init__(self, session):
+            pass
+
+        def release_transaction_claims(self, owner, transaction_hashes=None):
+            released.append(transaction_hashes)
+
+    monkeypatch.setattr(
+        "backend.consensus.base.TransactionsProcessor", TransactionsProcessorClaimMock
+    )
+    consensus = ConsensusAlgorithm(MagicMock, Mock(MessageHandler))
+    release = asyncio.Event()
+    executed = []
+
+    async def exec_transaction_with_session(transaction: Transaction):
+        executed.append(transaction.hash)
+        await release.wait()
+        if transaction.hash == "failing":
+            raise Exception("execution failed")
+
+    consensus._exec_transaction_with_session = exec_transaction_with_session
+
+    await consensus._enqueue_transactions(
+        [pending_transaction("executing"), pending_transaction("failing")]
+    )
+    await asyncio.sleep(0)
+    await consensus._enqueue_transactions(
+        [pending_transaction("executing"), pending_transaction("failing")]
+    )
+    assert consensus.queued_transaction_hashes == {"failing"}
+    assert consensus.executing_transaction_hashes == {"executing"}
+
+    release.set()
+    while consensus.workers:
+        await asyncio.sleep(0.01)
+
+    assert executed == ["executing", "failing"]
+    assert released == [["failing"]]
+    assert not consensus.executing_transaction_hashes
+
+
+@pytest.mark.asyncio
+async def test_default_owners_do_not_share_claims(monkeypatch):
+    """
+    Scenario: two consensus workers built with the default arguments in the same process, one of them stops
+    Tests that the claims of the other one are kept
+    """
+
+    pending = {
+        f"hash_{i}": transaction_to_dict(
+            Transaction(
+                hash=f"hash_{i}",
+                to_address=f"to_address_{i}",
+                status=TransactionStatus.PENDING,
+                type=TransactionType.RUN_CONTRACT,
+            )
+        )
+        for i in range(2)
+    }
+    claims: dict[str, str] = {}
+
+    class TransactionsProcessorClaimMock:
+        def __init__(self, session):
+            pass
+
+        def claim_pending_transactions(self, owner, lease_duration, limit, *args):
+            claimed = [hash for hash in pending if hash not in claims][:limit]
+            for hash in claimed:
+                claims[hash] = owner
+            return [pending[hash] for hash in claimed]
+
+        def release_transaction_claims(self, owner, transaction_hashes=None):
+            for hash, claim_owner in list(claims.items()):
+                if claim_owner == owner:
+                    del claims[hash]
+
+    monkeypatch.setattr(
+        "backend.consensus.base.TransactionsProcessor", TransactionsProcessorClaimMock
+    )
+    workers = [
+        ConsensusAlgorithm(MagicMock, Mock(MessageHandler), max_queued_transactions=1)
+        for _ in range(2)
+    ]
+    release = asyncio.Event()
+
+    async def exec_transaction_with_session(transaction: Transaction):
+        await release.wait()
+
+    for worker in workers:
+        worker._exec_transaction_with_session = exec_transaction_with_session
+        await worker._claim_pending_transactions()
+
+    assert workers[0].owner != workers[1].owner
+    assert set(claims.values()) == {workers[0].owner, workers[1].owner}
+
+    workers[1]._unregister()
+
+    assert list(claims.values()) == [workers[0].owner]
+    release.set()
+    while any(worker.workers for worker in workers):
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_exec_transaction_speculative_leaders_leader_error():
+    """
+    Scenario: the first leader raises while the next speculative rounds are running, one of them having failed too
+    Tests that the error is raised and the other rounds are cancelled and awaited, without unretrieved errors
+    """
+
+    transaction = Transaction(
+        hash="transaction_hash",
+        from_address="from_address",
+        to_address="to_address",
+        status=TransactionStatus.PENDING,
+        type=TransactionType.RUN_CONTRACT,
+    )
+
+    nodes = [
+        {
+            "address": f"address{i}",
+            "stake": i,
+            "provider": f"provider{i}",
+            "model": f"model{i}",
+            "config": f"config{i}",
+        }
+        for i in range(1, 4)
+    ]
+
+    started_leaders = []
+    cancelled_rounds = []
+
+    def node_factory(
+        node: dict,
+        mode: ExecutionMode,
+        contract_snapshot: ContractSnapshot,
+        receipt: Receipt | None,
+        msg_handler: MessageHandler,
+        contract_snapshot_factory: Callable[[str], ContractSnapshot],
+    ):
+        mock = Mock(Node)
+        round = len(started_leaders)
+        started_leaders.append(round)
+
+        async def exec_transaction(transaction: Transaction):
+            try:
+                if round == 0:
+                    await asyncio.sleep(0.01)
+                    raise ValueError("leader 0 failed")
+                if round == 1:
+                    raise ValueError("leader 1 failed")
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled_rounds.append(round)
+                raise
+
+        mock.exec_transaction.side_effect = exec_transaction
+        return mock
+
+    unhandled_errors = []
+    loop = asyncio.get_running_loop()
+    loop.set_exception_handler(lambda loop, context: unhandled_errors.append(context))
+    try:
+        with pytest.raises(ValueError, match="leader 0 failed"):
+            await ConsensusAlgorithm(
+                None, Mock(MessageHandler), speculative_leaders=3
+            ).exec_transaction(
+                transaction=transaction,
+                transactions_processor=TransactionsProcessorMock(
+                    [transaction_to_dict(transaction)]
+                ),
+                snapshot=SnapshotMock(nodes),
+                accounts_manager=AccountsManagerMock(),
+                contract_snapshot_factory=contract_snapshot_factory,
+                node_factory=node_factory,
+            )
+        # Unretrieved errors are reported when their task or future is collected
+        gc.collect()
+        await asyncio.sleep(0)
+    finally:
+        loop.set_exception_handler(None)
+
+    assert started_leaders == [0, 1, 2]
+    assert cancelled_rounds == [2]
+    assert unhandled_errors == []
+
+
+def test_consensus_from_env(monkeypatch):
+    monkeypatch.setenv("CONSENSUS_MAX_QUEUED_TRANSACTIONS", "5")
+    monkeypatch.setenv("CONSENSUS_PARTITIONS", "4")
+    monkeypatch.setenv("CONSENSUS_VALIDATOR_TIMEOUT", "1.5")
+    monkeypatch.setenv("CONSENSUS_DETERMINISTIC_VALIDATION", "single_validator")
+    monkeypatch.setenv("CONSENSUS_SPECULATIVE_LEADERS", "2")
+
+    consensus = consensus_from_env(MagicMock(), Mock(MessageHandler), owner="owner")
+
+    assert consensus.owner == "owner"
+    assert consensus.max_queued_transactions == 5
+    assert consensus.partition_count == 4
+    assert consensus.validator_timeout == 1.5
+    assert (
+        consensus.deterministic_validation
+        == DeterministicValidationMode.SINGLE_VALIDATOR
+    )
+    assert consensus.speculative_leaders == 2
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+from backend.node.genvm import llm_clients
+from backend.node.genvm.llms import AnthropicPlugin
+
+CHUNKS = ["The answer", " is ", "42", "."]
+
+
+class Stream:
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        for text in CHUNKS:
+            yield SimpleNamespace(
+                type="content_block_delta", delta=SimpleNamespace(text=text)
+            )
+        yield SimpleNamespace(type="content_block_stop")
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    streams = []
+
+    async def create(**kwargs):
+        streams.append(Stream())
+        return streams[-1]
+
+    client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    monkeypatch.setattr(llm_clients, "get_anthropic_client", lambda *args: client)
+    return streams
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("regex,output", [(None, "".join(CHUNKS)), (r"\d+", "42")])
+async def test_streams_are_closed(streams, regex, output):
+    plugin = AnthropicPlugin({"api_key_env_var": "KEY", "api_url": None})
+    node_config = {"model": "claude", "config": {"max_tokens": 100}}
+
+    assert await plugin.call(node_config, "prompt", regex, None) == output
+    # The connection goes back to the pool of the shared client
+    assert streams[0].closed
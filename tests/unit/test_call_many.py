@@ -0,0 +1,92 @@
+from unittest.mock import Mock
+
+import pytest
+import rlp
+
+from backend.database_handler.errors import AccountNotFoundError
+from backend.node.genvm.base import GenVM
+from backend.node.genvm.calldata import encode
+from backend.node.genvm.types import ExecutionMode
+from backend.protocol_rpc import endpoints
+from backend.protocol_rpc.message_handler.base import MessageHandler
+from backend.protocol_rpc.transactions_parser import MethodCallTransactionPayload
+
+CONTRACT_CODE = """
+from backend.node.genvm.icontract import IContract
+
+
+class Storage(IContract):
+    def __init__(self, storage: str):
+        self.storage = storage
+
+    def get_storage(self) -> str:
+        return self.storage
+
+    def get_fail(self) -> str:
+        raise Exception("getter failed")
+"""
+
+CONTRACT_A = "0x" + "a" * 40
+CONTRACT_B = "0x" + "b" * 40
+MISSING_CONTRACT = "0x" + "c" * 40
+
+
+def call_data(method: str) -> str:
+    payload = MethodCallTransactionPayload(
+        calldata=encode({"method": method, "args": []}), leader_only=False
+    )
+    return "0x" + rlp.encode(payload).hex()
+
+
+async def deploy(storage: str) -> bytes:
+    genvm = GenVM(None, ExecutionMode.LEADER, {}, None, Mock(MessageHandler))
+    receipt = await genvm.deploy_contract(
+        "0x0", CONTRACT_CODE, encode({"args": [storage]}), None
+    )
+    return receipt.contract_state
+
+
+@pytest.mark.asyncio
+async def test_call_many(monkeypatch):
+    states = {CONTRACT_A: await deploy("a"), CONTRACT_B: await deploy("b")}
+    loaded_contracts = []
+
+    class ContractSnapshot:
+        def __init__(self, contract_address: str, session):
+            loaded_contracts.append(contract_address)
+            self.contract_code = CONTRACT_CODE
+            self.state = states[contract_address]
+            self.state_hash = None
+
+    monkeypatch.setattr(endpoints, "ContractSnapshot", ContractSnapshot)
+
+    def get_account_or_fail(address: str):
+        if address == MISSING_CONTRACT:
+            raise AccountNotFoundError(address, f"Account {address} does not exist.")
+
+    accounts_manager = Mock()
+    accounts_manager.is_valid_address.return_value = True
+    accounts_manager.get_account_or_fail.side_effect = get_account_or_fail
+
+    results = endpoints.call_many(
+        None,
+        accounts_manager,
+        Mock(MessageHandler),
+        [
+            {"to": CONTRACT_A, "data": call_data("get_storage")},
+            {"to": CONTRACT_B, "data": call_data("get_storage")},
+            {"to": CONTRACT_A, "data": call_data("get_fail")},
+            {"to": MISSING_CONTRACT, "data": call_data("get_storage")},
+            {"to": CONTRACT_A, "data": call_data("get_storage")},
+        ],
+    )
+
+    assert results == [
+        {"result": "a"},
+        {"result": "b"},
+        {"error": {"message": "getter failed"}},
+        {"error": {"message": f"Account {MISSING_CONTRACT} does not exist."}},
+        {"result": "a"},
+    ]
+    # Each contract is loaded once
+    assert loaded_contracts == [CONTRACT_A, CONTRACT_B]
@@ -0,0 +1,185 @@
+import pickle
+import random
+from enum import IntEnum
+
+import pytest
+
+from backend.node.genvm.calldata import (
+    LazyArray,
+    LazyMap,
+    decode,
+    decode_lazy,
+    encode,
+    materialize,
+    to_str,
+)
+from backend.node.genvm.types import Address
+
+FUZZ_ITERATIONS = 2000
+
+
+class Color(IntEnum):
+    RED = 300
+
+
+def random_key(rng: random.Random) -> str:
+    length = rng.randrange(200) if rng.random() < 0.1 else rng.randrange(5)
+    return "".join(rng.choice("abcé€😀") for _ in range(length))
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(10 if depth < 4 else 7)
+    if kind == 0:
+        return rng.choice([None, True, False])
+    if kind == 1:
+        # Around the uleb128 byte boundaries, and big ints
+        bits = rng.randrange(80)
+        return rng.choice([1, -1]) * rng.randrange(2**bits) + rng.choice([-1, 0, 1])
+    if kind == 2:
+        return rng.randbytes(rng.randrange(300))
+    if kind == 3:
+        return random_key(rng)
+    if kind == 4:
+        return Address(rng.randbytes(Address.SIZE))
+    if kind == 5:
+        return Color.RED
+    if kind == 6:
+        return "x" * rng.randrange(20, 2000)
+    if kind == 7:
+        length = rng.randrange(300) if rng.random() < 0.05 else rng.randrange(6)
+        return [random_value(rng, depth + 1) for _ in range(length)]
+    if kind == 8:
+        return tuple(random_value(rng, depth + 1) for _ in range(rng.randrange(4)))
+    return {
+        random_key(rng): random_value(rng, depth + 1) for _ in range(rng.randrange(6))
+    }
+
+
+def normalize(value):
+    """What decoding an encoded value returns"""
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, Color):
+        return int(value)
+    return value
+
+
+def test_wire_format():
+    value = {
+        "method": "transfer",
+        "args": [
+            None,
+            True,
+            False,
+            0,
+            63,
+            64,
+            -1,
+            -65,
+            2**64,
+            b"\x00\xff",
+            "é€",
+            [1, [2]],
+            {"b": 1, "a": {}},
+            Address(bytes(range(32))),
+        ],
+    }
+    encoded = bytes.fromhex(
+        "1604617267737500100801f9038104028204818080808080808080101300ff2cc3a9e282ac"
+        "15090d111601610601620918000102030405060708090a0b0c0d0e0f101112131415161718"
+        "191a1b1c1d1e1f066d6574686f64447472616e73666572"
+    )
+
+    assert encode(value) == encoded
+    assert decode(encoded) == value
+
+
+def test_fuzz_round_trip():
+    rng = random.Random(0)
+    for _ in range(FUZZ_ITERATIONS):
+        value = random_value(rng)
+        encoded = encode(value)
+
+        assert decode(encoded) == normalize(value)
+        assert decode(memoryview(encoded)) == normalize(value)
+        assert encode(decode(encoded)) == encoded
+
+
+@pytest.mark.parametrize(
+    "encoded",
+    [
+        b"",
+        encode("abc")[:-1],
+        encode([1, 2, "abc"])[:-2],
+        encode(2**64)[:-1],
+        encode({"key": 1})[:3],
+    ],
+)
+def test_decode_truncated(encoded):
+    with pytest.raises(Exception):
+        decode(encoded)
+
+
+def test_decode_unparsed_end():
+    with pytest.raises(Exception, match="unparsed end"):
+        decode(encode([1, 2]) + b"\x00")
+
+
+@pytest.mark.parametrize(
+    "value,message",
+    [
+        (1.5, "invalid type"),
+        ({1: 2}, "key is not string"),
+        ([bytearray(b"abc")], "invalid type"),
+    ],
+)
+def test_encode_invalid(value, message):
+    with pytest.raises(Exception, match=message):
+        encode(value)
+
+
+def test_fuzz_lazy_decode():
+    rng = random.Random(1)
+    for _ in range(FUZZ_ITERATIONS // 4):
+        value = random_value(rng)
+        encoded = encode(value)
+
+        lazy = decode_lazy(encoded)
+
+        assert lazy == normalize(value)
+        assert materialize(lazy) == normalize(value)
+        assert encode(lazy) == encoded
+        assert to_str(lazy) == to_str(decode(encoded))
+
+
+def test_lazy_containers():
+    value = {"args": [[{"id": i, "tags": ["a", str(i)]} for i in range(10)], "x"]}
+
+    calldata = decode_lazy(encode(value))
+
+    assert isinstance(calldata, LazyMap)
+    assert list(calldata) == ["args"]
+    assert "args" in calldata and "method" not in calldata
+    args = calldata["args"]
+    assert isinstance(args, LazyArray)
+    assert len(args) == 2
+    assert args[-1] == "x"
+    entries = args[0]
+    assert isinstance(entries[3], LazyMap)
+    assert entries[3]["tags"][1] == "3"
+    assert [entry["id"] for entry in entries] == list(range(10))
+    assert entries[2:4] == [value["args"][0][2], value["args"][0][3]]
+    with pytest.raises(IndexError):
+        entries[10]
+
+
+def test_lazy_containers_are_pickled_as_plain_values():
+    value = [{"id": 1, "items": [1, 2]}, "x"]
+
+    unpickled = pickle.loads(pickle.dumps(decode_lazy(encode(value))))
+
+    assert type(unpickled) is list
+    assert type(unpickled[0]) is dict
+    assert unpickled == value
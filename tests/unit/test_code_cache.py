@@ -0,0 +1,56 @@
+from backend.node.genvm.code_cache import CodeCache
+
+
+def contract_code(name: str) -> str:
+    return f"""
+executions.append("{name}")
+
+
+class {name}:
+    pass
+"""
+
+
+def test_namespace_is_executed_once_per_code():
+    cache = CodeCache(max_entries=10, max_bytes=1024 * 1024)
+    executions = []
+
+    first = cache.get_namespace(contract_code("A"), {"executions": executions})
+    second = cache.get_namespace(contract_code("A"), {"executions": executions})
+
+    assert executions == ["A"]
+    assert first["A"] is second["A"]
+    # Callers can't alter the cached namespace
+    first["B"] = None
+    assert "B" not in cache.get_namespace(contract_code("A"), {})
+
+    metrics = cache.get_metrics()
+    assert metrics["hits"] == 2
+    assert metrics["misses"] == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = CodeCache(max_entries=2, max_bytes=1024 * 1024)
+
+    cache.get_code(contract_code("A"))
+    cache.get_code(contract_code("B"))
+    cache.get_code(contract_code("A"))
+    cache.get_code(contract_code("C"))  # evicts B
+
+    assert cache.get_metrics()["evictions"] == 1
+    cache.get_code(contract_code("A"))
+    assert cache.get_metrics()["misses"] == 3
+    cache.get_code(contract_code("B"))
+    assert cache.get_metrics()["misses"] == 4
+
+
+def test_entries_are_evicted_when_too_big():
+    cache = CodeCache(max_entries=10, max_bytes=1)
+
+    cache.get_code(contract_code("A"))
+    cache.get_code(contract_code("B"))
+
+    # The last entry is kept even if it doesn't fit
+    metrics = cache.get_metrics()
+    assert metrics["entries"] == 1
+    assert metrics["evictions"] == 1
@@ -0,0 +1,164 @@
+from pathlib import Path
+
+import pytest
+
+from backend.node.genvm import contract_schema
+from backend.node.genvm.base import GenVM, _contract_globals
+from backend.node.genvm.code_cache import code_cache
+from backend.node.genvm.contract_schema import extract_schema_methods
+
+EXAMPLE_CONTRACTS = sorted(
+    (Path(__file__).parents[2] / "examples" / "contracts").glob("*.py")
+)
+
+HEADER = """
+from backend.node.genvm.icontract import IContract
+
+
+"""
+
+SUPPORTED_CONTRACTS = [
+    """
+class Contract(IContract):
+    def __init__(self, a: int, b: str, c: bool, d: dict, e: list, f: float):
+        pass
+
+    def get_nothing(self):
+        pass
+
+    def get_none(self) -> None:
+        pass
+
+    async def set_untyped(self, a, *args, b: bytes = b"", **kwargs) -> str:
+        return ""
+""",
+    """
+class Contract(IContract):
+    \"\"\"Without constructor\"\"\"
+
+    counter = 0
+    names: list = []
+
+    def get_generics(self, a: list[str], b: dict[str, int]) -> dict[str, list[int]]:
+        return {}
+
+    def get_unions(self, a: int | None, b: tuple[int, ...]) -> "str":
+        return ""
+""",
+]
+
+UNSUPPORTED_CONTRACTS = [
+    """
+from dataclasses import dataclass
+
+
+@dataclass
+class Point:
+    x: int
+
+
+class Contract(IContract):
+    def __init__(self, point: Point):
+        pass
+""",
+    """
+class Contract(IContract):
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def get_static(self, a: int) -> int:
+        return a
+
+    @classmethod
+    def get_class(cls, a: int) -> int:
+        return a
+""",
+    """
+class Contract(IContract):
+    def __init__(self):
+        pass
+
+    get_alias = __init__
+""",
+    """
+str = int
+
+
+class Contract(IContract):
+    def __init__(self, a: str):
+        pass
+""",
+]
+
+FUTURE_ANNOTATIONS_CONTRACT = """
+from __future__ import annotations
+
+from backend.node.genvm.icontract import IContract
+
+
+class Contract(IContract):
+    def __init__(self, a: int):
+        pass
+"""
+
+
+def executed_schema_methods(contract_code: str) -> dict:
+    namespace = code_cache.get_namespace(contract_code, _contract_globals)
+    class_name = GenVM._get_contract_class_name(contract_code)
+    return GenVM._get_class_schema_methods(namespace[class_name])
+
+
+@pytest.mark.parametrize("path", EXAMPLE_CONTRACTS, ids=lambda path: path.name)
+def test_example_contracts_schema_is_extracted_without_executing(path):
+    contract_code = path.read_text()
+    class_name = GenVM._get_contract_class_name(contract_code)
+
+    methods = extract_schema_methods(contract_code, class_name)
+
+    assert methods is not None
+    assert methods == executed_schema_methods(contract_code)
+
+
+@pytest.mark.parametrize("contract_code", SUPPORTED_CONTRACTS)
+def test_extracted_schema_matches_executed_schema(contract_code):
+    contract_code = HEADER + contract_code
+
+    methods = extract_schema_methods(contract_code, "Contract")
+
+    assert methods is not None
+    assert methods == executed_schema_methods(contract_code)
+
+
+@pytest.mark.parametrize("contract_code", UNSUPPORTED_CONTRACTS)
+def test_contracts_needing_execution_fall_back(contract_code):
+    contract_code = HEADER + contract_code
+
+    assert extract_schema_methods(contract_code, "Contract") is None
+    # Same schema as executing the contract
+    assert GenVM.get_contract_schema(contract_code) == {
+        "class": "Contract",
+        "abi": GenVM.generate_abi_from_schema_methods(
+            executed_schema_methods(contract_code)
+        ),
+    }
+
+
+def test_future_annotations_fall_back():
+    # All the annotations are strings
+    assert extract_schema_methods(FUTURE_ANNOTATIONS_CONTRACT, "Contract") is None
+
+
+def test_schemas_are_cached(monkeypatch):
+    contract_code = HEADER + SUPPORTED_CONTRACTS[0]
+    schema = GenVM.get_contract_schema(contract_code)
+    schema["abi"].clear()
+
+    def fail(*args):
+        raise AssertionError("schema should be cached")
+
+    monkeypatch.setattr(contract_schema, "_SchemaExtractor", fail)
+
+    assert GenVM.get_contract_schema(contract_code)["abi"] == (
+        GenVM.generate_abi_from_schema_methods(executed_schema_methods(contract_code))
+    )
@@ -0,0 +1,138 @@
+import gc
+import sys
+from unittest.mock import Mock
+
+import pytest
+
+from backend.node.genvm.base import GenVM
+from backend.node.genvm.calldata import encode
+from backend.node.genvm.code_cache import code_cache
+from backend.node.genvm.gas import OutOfGas
+from backend.node.genvm.types import ExecutionMode, ExecutionResultStatus
+from backend.protocol_rpc.message_handler.base import MessageHandler
+
+CONTRACT_CODE = """
+from backend.node.genvm.icontract import IContract
+
+
+class Counter(IContract):
+    def __init__(self):
+        self.count = 0
+
+    def count_to(self, n: int):
+        for _ in range(n):
+            self.count += 1
+
+    def swallow_errors(self):
+        while True:
+            try:
+                self.count += 1
+            except Exception:
+                pass
+
+    def keep_errors(self):
+        while True:
+            try:
+                self.count += 1
+            except BaseException as e:
+                self.error = e
+
+    def count_forever(self):
+        while True:
+            self.count += 1
+
+    def swallow_errors_of_calls(self):
+        while True:
+            try:
+                self.count_forever()
+            except Exception as e:
+                self.error = e
+
+    def swallow_errors_once(self):
+        try:
+            self.count_forever()
+        except Exception:
+            pass
+        self.count_forever()
+
+    def loop_in_finally(self):
+        try:
+            while True:
+                self.count += 1
+        finally:
+            self.count = 0
+"""
+
+
+class Snapshot:
+    contract_code = CONTRACT_CODE
+
+    def __init__(self, state: bytes):
+        self.state = state
+
+
+@pytest.fixture
+def gas_metering(monkeypatch):
+    monkeypatch.setenv("GENVM_GAS_METERING", "true")
+    # Contracts are instrumented when compiled
+    code_cache.clear()
+    yield
+    code_cache.clear()
+
+
+async def run(state: bytes, method: str, args: list):
+    genvm = GenVM(Snapshot(state), ExecutionMode.LEADER, {}, None, Mock(MessageHandler))
+    return await genvm.run_contract(
+        "0x0", encode({"method": method, "args": args}), None
+    )
+
+
+@pytest.mark.asyncio
+async def test_gas_used_grows_with_executed_code(gas_metering):
+    genvm = GenVM(None, ExecutionMode.LEADER, {}, None, Mock(MessageHandler))
+    receipt = await genvm.deploy_contract(
+        "0x0", CONTRACT_CODE, encode({"args": []}), None
+    )
+    assert receipt.gas_used > 0
+    state = receipt.contract_state
+
+    short = await run(state, "count_to", [10])
+    long = await run(state, "count_to", [100])
+
+    assert short.execution_result == ExecutionResultStatus.SUCCESS
+    assert long.gas_used - short.gas_used == 2 * 90  # Two lines per iteration
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("gas_limit", [1, 10, 1000, 1001, 1002, 1003])
+@pytest.mark.parametrize(
+    "method",
+    [
+        "count_forever",
+        "swallow_errors",
+        "keep_errors",
+        "swallow_errors_of_calls",
+        "swallow_errors_once",
+        "loop_in_finally",
+    ],
+)
+async def test_executions_are_aborted_when_out_of_gas(
+    gas_metering, monkeypatch, gas_limit, method
+):
+    genvm = GenVM(None, ExecutionMode.LEADER, {}, None, Mock(MessageHandler))
+    state = (
+        await genvm.deploy_contract("0x0", CONTRACT_CODE, encode({"args": []}), None)
+    ).contract_state
+    monkeypatch.setenv("GENVM_GAS_LIMIT", str(gas_limit))
+    tracer = sys.gettrace()
+
+    receipt = await run(state, method, [])
+
+    assert receipt.execution_result == ExecutionResultStatus.ERROR
+    assert isinstance(receipt.error, OutOfGas)
+    assert receipt.gas_used > gas_limit
+    # The tracer of the fallback is removed when the execution ends, and isn't installed again when the error is collected
+    assert sys.gettrace() is tracer
+    del receipt
+    gc.collect()
+    assert sys.gettrace() is tracer
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from backend.node.genvm import executor
+from backend.node.genvm.base import GenVM
+from backend.node.genvm.calldata import encode
+from backend.node.genvm.executor import (
+    GenVMTimeoutError,
+    ProcessExecutor,
+    SnapshotData,
+)
+from backend.node.genvm.types import ExecutionMode, ExecutionResultStatus
+from backend.protocol_rpc.message_handler.base import MessageHandler
+
+CONTRACT_CODE = """
+from backend.node.genvm.icontract import IContract
+from backend.node.genvm.equivalence_principle import call_llm_with_principle
+
+
+class Storage(IContract):
+    def __init__(self, storage: str):
+        self.storage = storage
+        self.sender = None
+
+    async def ask(self, prompt: str):
+        self.storage = await call_llm_with_principle(prompt, eq_principle="Same")
+        self.sender = contract_runner.from_address
+
+    def spin(self):
+        while True:
+            pass
+
+    def get_storage(self) -> list:
+        return [self.storage, self.sender]
+"""
+
+
+def genvm(state: bytes | None = None) -> GenVM:
+    return GenVM(
+        SnapshotData(contract_code=CONTRACT_CODE, state=state),
+        ExecutionMode.LEADER,
+        {"plugin": "ollama", "plugin_config": {}},
+        lambda _: None,
+        Mock(MessageHandler),
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_executor(monkeypatch):
+    llm_calls = []
+
+    async def call_llm(node_config, prompt, regex, channel):
+        llm_calls.append(prompt)
+        return prompt.upper()
+
+    # LLM calls are made by the main process
+    monkeypatch.setattr(executor, "call_llm", call_llm)
+
+    process_executor = ProcessExecutor(
+        workers=1, timeout=30, memory_limit=executor.DEFAULT_GENVM_PROCESS_MEMORY_LIMIT
+    )
+    try:
+        receipt = await process_executor.deploy_contract(
+            genvm(), "0x0", CONTRACT_CODE, encode({"args": ["initial"]}), None
+        )
+        assert receipt.execution_result == ExecutionResultStatus.SUCCESS
+
+        receipt = await process_executor.run_contract(
+            genvm(receipt.contract_state),
+            "0xa",
+            encode({"method": "ask", "args": ["hello"]}),
+            None,
+        )
+        assert receipt.execution_result == ExecutionResultStatus.SUCCESS
+        assert receipt.nondeterministic
+        assert llm_calls == ["hello"]
+        state = receipt.contract_state
+
+        process_executor.timeout = 1
+        receipt = await process_executor.run_contract(
+            genvm(state), "0xa", encode({"method": "spin", "args": []}), None
+        )
+        assert receipt.execution_result == ExecutionResultStatus.ERROR
+        assert isinstance(receipt.error, GenVMTimeoutError)
+        assert receipt.contract_state == state
+
+        # The sandbox that timed out was replaced
+        assert genvm().get_contract_data(
+            CONTRACT_CODE,
+            state,
+            encode({"method": "get_storage", "args": []}),
+            lambda _: None,
+        ) == ["HELLO", "0xa"]
+        process_executor.timeout = 30
+        receipt = await process_executor.run_contract(
+            genvm(state), "0xb", encode({"method": "ask", "args": ["again"]}), None
+        )
+        assert receipt.execution_result == ExecutionResultStatus.SUCCESS
+    finally:
+        process_executor.close()
+
+
+@pytest.mark.asyncio
+async def test_sandboxes_are_replaced_without_blocking_the_loop(monkeypatch):
+    class SlowSandboxProcess:
+        """Hangs on every execution, and takes a while to start once the first one is started"""
+
+        started = 0
+
+        def __init__(self, memory_limit: int):
+            if SlowSandboxProcess.started:
+                time.sleep(0.3)
+            SlowSandboxProcess.started += 1
+            self.killed = False
+
+        def send(self, message):
+            pass
+
+        async def recv(self):
+            await asyncio.Event().wait()
+
+        def kill(self):
+            self.killed = True
+
+    monkeypatch.setattr(executor, "SandboxProcess", SlowSandboxProcess)
+    process_executor = ProcessExecutor(workers=1, timeout=0.05, memory_limit=0)
+    sandbox = process_executor.sandboxes[0]
+
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    try:
+        receipt = await process_executor.run_contract(
+            genvm(), "0xa", encode({"method": "spin", "args": []}), None
+        )
+        assert isinstance(receipt.error, GenVMTimeoutError)
+
+        # Waits for the replacement
+        receipt = await process_executor.run_contract(
+            genvm(), "0xa", encode({"method": "spin", "args": []}), None
+        )
+        assert isinstance(receipt.error, GenVMTimeoutError)
+        await asyncio.gather(*process_executor.replacements)
+    finally:
+        ticker.cancel()
+        process_executor.close()
+
+    assert sandbox.killed
+    assert SlowSandboxProcess.started >= 2
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.2
@@ -0,0 +1,95 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from backend.node.genvm.base import GenVM
+from backend.node.genvm.calldata import encode
+from backend.node.genvm.types import ExecutionMode, ExecutionResultStatus
+from backend.protocol_rpc.message_handler.base import MessageHandler
+
+
+def contract_code(tag: str) -> str:
+    # Both contracts define classes with the same names
+    return f"""
+import asyncio
+from backend.node.genvm.icontract import IContract
+
+
+class Holder:
+    def __init__(self):
+        self.tag = "{tag}"
+
+
+class Storage(IContract):
+    def __init__(self):
+        self.holder = Holder()
+        self.sender = None
+
+    async def update(self, delay: int):
+        await asyncio.sleep(delay / 100)
+        self.sender = contract_runner.from_address
+        print("{tag}", contract_runner.from_address)
+
+    def get_storage(self) -> list:
+        return [self.holder.tag, self.sender]
+"""
+
+
+class Snapshot:
+    def __init__(self, contract_code: str, state: bytes | None = None):
+        self.contract_code = contract_code
+        self.state = state
+
+
+def genvm(snapshot: Snapshot, msg_handler: MessageHandler) -> GenVM:
+    return GenVM(
+        snapshot,
+        ExecutionMode.LEADER,
+        {"plugin": "ollama"},
+        lambda _: None,
+        msg_handler,
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_executions_are_isolated():
+    msg_handler = Mock(MessageHandler)
+    snapshots = {}
+    for tag in ["A", "B"]:
+        code = contract_code(tag)
+        receipt = await genvm(Snapshot(code), msg_handler).deploy_contract(
+            "0x0", code, encode({"args": []}), None
+        )
+        assert receipt.execution_result == ExecutionResultStatus.SUCCESS
+        snapshots[tag] = Snapshot(code, receipt.contract_state)
+
+    async def update(tag: str, from_address: str, delay: int):
+        return await genvm(snapshots[tag], msg_handler).run_contract(
+            from_address, encode({"method": "update", "args": [delay]}), None
+        )
+
+    # A starts first and finishes last, while B runs in between
+    receipt_a, receipt_b = await asyncio.gather(
+        update("A", "0xa", 5), update("B", "0xb", 1)
+    )
+
+    for tag, receipt, from_address in [
+        ("A", receipt_a, "0xa"),
+        ("B", receipt_b, "0xb"),
+    ]:
+        assert receipt.execution_result == ExecutionResultStatus.SUCCESS
+        snapshot = snapshots[tag]
+        assert genvm(snapshot, msg_handler).get_contract_data(
+            snapshot.contract_code,
+            receipt.contract_state,
+            encode({"method": "get_storage", "args": []}),
+            lambda _: None,
+        ) == [tag, from_address]
+
+    outputs = [
+        call.args[0].data["output"]
+        for call in msg_handler.send_message.call_args_list
+        if call.args[0].name == "write_contract"
+    ]
+    assert sorted(outputs) == ["A 0xa\n", "B 0xb\n"]
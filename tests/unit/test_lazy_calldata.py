@@ -0,0 +1,95 @@
+from unittest.mock import Mock
+
+import pytest
+
+from backend.node.genvm.base import GenVM
+from backend.node.genvm.calldata import encode
+from backend.node.genvm.types import ExecutionMode, ExecutionResultStatus
+from backend.protocol_rpc.message_handler.base import MessageHandler
+
+CONTRACT_CODE = """
+from backend.node.genvm.calldata import LazyArray, lazy_calldata
+from backend.node.genvm.icontract import IContract
+
+
+class Logs(IContract):
+    def __init__(self):
+        self.count = 0
+        self.logs = []
+
+    @lazy_calldata
+    def add_logs(self, logs):
+        assert isinstance(logs, LazyArray)
+        for log in logs:
+            self.count += 1
+            if log["level"] == "error":
+                self.logs.append(log)
+
+    def add_logs_eagerly(self, logs):
+        assert type(logs) is list
+        self.count += len(logs)
+
+    def get_logs(self) -> list:
+        return self.logs
+
+    @lazy_calldata
+    def get_error_count(self, logs) -> int:
+        return sum(1 for log in logs if log["level"] == "error")
+"""
+
+LOGS = [
+    {"level": "error" if i % 10 == 0 else "info", "message": f"log {i}"}
+    for i in range(100)
+]
+
+
+class Snapshot:
+    contract_code = CONTRACT_CODE
+
+    def __init__(self, state: bytes):
+        self.state = state
+
+
+def genvm(state: bytes | None = None) -> GenVM:
+    return GenVM(
+        Snapshot(state) if state is not None else None,
+        ExecutionMode.LEADER,
+        {},
+        None,
+        Mock(MessageHandler),
+    )
+
+
+@pytest.mark.asyncio
+async def test_methods_opting_in_get_lazy_arguments():
+    receipt = await genvm().deploy_contract(
+        "0x0", CONTRACT_CODE, encode({"args": []}), None
+    )
+
+    receipt = await genvm(receipt.contract_state).run_contract(
+        "0x0", encode({"method": "add_logs", "args": [LOGS]}), None
+    )
+    assert receipt.execution_result == ExecutionResultStatus.SUCCESS
+
+    receipt = await genvm(receipt.contract_state).run_contract(
+        "0x0", encode({"method": "add_logs_eagerly", "args": [LOGS]}), None
+    )
+    assert receipt.execution_result == ExecutionResultStatus.SUCCESS
+
+    # The kept logs are stored as plain dicts
+    logs = genvm().get_contract_data(
+        CONTRACT_CODE,
+        receipt.contract_state,
+        encode({"method": "get_logs", "args": []}),
+        None,
+    )
+    assert logs == LOGS[::10]
+    assert all(type(log) is dict for log in logs)
+
+    error_count = genvm().get_contract_data(
+        CONTRACT_CODE,
+        receipt.contract_state,
+        encode({"method": "get_error_count", "args": [LOGS]}),
+        None,
+    )
+    assert error_count == 10
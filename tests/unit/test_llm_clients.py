@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from backend.node.genvm import llm_clients
+from backend.node.genvm.llm_clients import (
+    close_llm_clients,
+    get_aiohttp_session,
+    get_anthropic_client,
+    get_openai_client,
+)
+from backend.node.genvm.llms import call_ollama
+
+
+@pytest_asyncio.fixture
+async def ollama_server():
+    peers = []
+
+    async def generate(request):
+        peers.append(request.transport.get_extra_info("peername"))
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(json.dumps({"response": "hello", "done": False}).encode())
+        await asyncio.sleep(0.01)
+        await response.write(json.dumps({"response": "", "done": True}).encode())
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/api/generate", generate)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/api/", peers
+    await close_llm_clients()
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_ollama_calls_reuse_connections(ollama_server):
+    api_url, peers = ollama_server
+    node_config = {
+        "model": "llama3",
+        "config": {},
+        "plugin_config": {"api_url": api_url},
+    }
+
+    for _ in range(3):
+        assert await call_ollama(node_config, "prompt", None, None) == "hello"
+
+    assert len(peers) == 3
+    assert len(set(peers)) == 1
+
+
+@pytest.mark.asyncio
+async def test_clients_are_shared_by_plugin_url_and_key(monkeypatch):
+    monkeypatch.setenv("LLM_KEY", "key 1")
+    monkeypatch.setenv("LLM_HTTP_POOL_SIZE", "7")
+
+    client = get_openai_client("LLM_KEY", None)
+    assert get_openai_client("LLM_KEY", None) is client
+    assert get_openai_client("LLM_KEY", "http://other/v1") is not client
+    assert get_anthropic_client("LLM_KEY", None) is get_anthropic_client(
+        "LLM_KEY", None
+    )
+    assert client._client._transport._pool._max_connections == 7
+
+    # Clients are recreated when their key changes
+    monkeypatch.setenv("LLM_KEY", "key 2")
+    new_client = get_openai_client("LLM_KEY", None)
+    assert new_client is not client
+    assert new_client.api_key == "key 2"
+
+    session = get_aiohttp_session("ollama", "http://ollama:11434/api/")
+    await close_llm_clients()
+
+    assert session.closed
+    assert client.is_closed() and new_client.is_closed()
+    # New clients are created after closing them
+    assert get_aiohttp_session("ollama", "http://ollama:11434/api/") is not session
+    await close_llm_clients()
+
+
+def test_clients_are_not_shared_between_loops():
+    async def get_session():
+        return get_aiohttp_session("ollama", "http://ollama:11434/api/")
+
+    loops = [asyncio.new_event_loop() for _ in range(2)]
+    try:
+        sessions = [loop.run_until_complete(get_session()) for loop in loops]
+        assert sessions[0] is not sessions[1]
+        assert loops[0].run_until_complete(get_session()) is sessions[0]
+    finally:
+        for loop in loops:
+            loop.run_until_complete(close_llm_clients())
+            loop.close()
+    assert not llm_clients._clients
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from backend.node.genvm.llm_limiter import (
+    call_llm_plugin,
+    get_llm_limiter,
+    get_llm_limiters_metrics,
+)
+
+
+class PluginMock:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def call(self, node_config, prompt, regex, return_streaming_channel):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.calls.append(prompt)
+        await self.release.wait()
+        self.running -= 1
+        return prompt
+
+
+node_config = {
+    "plugin": "ollama",
+    "model": "llama3",
+    "plugin_config": {"api_url": "http://ollama:11434/api/"},
+}
+
+
+@pytest.mark.asyncio
+async def test_calls_are_limited_and_fifo(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_IN_FLIGHT_OLLAMA", "2")
+    plugin = PluginMock()
+
+    calls = [
+        asyncio.create_task(
+            call_llm_plugin(plugin, node_config, f"prompt {i}", None, None)
+        )
+        for i in range(5)
+    ]
+    await asyncio.sleep(0.01)
+
+    assert plugin.calls == ["prompt 0", "prompt 1"]
+    limiter = get_llm_limiter("ollama", "llama3", "http://ollama:11434/api/")
+    assert limiter.get_metrics()["queue_depth"] == 3
+    assert limiter.get_metrics()["in_flight"] == 2
+
+    # A waiting call that gets cancelled gives up its place in the queue
+    calls[2].cancel()
+    plugin.release.set()
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    assert plugin.max_running == 2
+    assert plugin.calls == ["prompt 0", "prompt 1", "prompt 3", "prompt 4"]
+    assert isinstance(results[2], asyncio.CancelledError)
+    assert [
+        metrics
+        for metrics in get_llm_limiters_metrics()
+        if metrics["model"] == "llama3"
+    ] == [
+        {
+            "plugin": "ollama",
+            "model": "llama3",
+            "api_url": "http://ollama:11434/api/",
+            "max_in_flight": 2,
+            "in_flight": 0,
+            "queue_depth": 0,
+            "calls": 4,
+            "average_wait_time": pytest.approx(limiter.total_wait_time / 4),
+            "max_wait_time": limiter.max_wait_time,
+        }
+    ]
@@ -0,0 +1,52 @@
+from backend.domain.types import LLMProvider, Validator
+from backend.node.base import Node
+from backend.node.genvm.types import ExecutionMode, ExecutionResultStatus, Receipt, Vote
+from backend.database_handler.state_codec import state_hash
+
+
+def receipt(state: bytes) -> Receipt:
+    return Receipt(
+        class_name="Storage",
+        calldata=b"",
+        gas_used=0,
+        mode=ExecutionMode.VALIDATOR,
+        contract_state=state,
+        node_config={},
+        eq_outputs={},
+        execution_result=ExecutionResultStatus.SUCCESS,
+        contract_state_hash=state_hash(state),
+    )
+
+
+def validator_node(leader_receipt: Receipt) -> Node:
+    return Node(
+        contract_snapshot=None,
+        validator_mode=ExecutionMode.VALIDATOR,
+        validator=Validator(
+            address="0x1234",
+            stake=100,
+            llmprovider=LLMProvider(
+                provider="provider",
+                model="model",
+                config={},
+                plugin="plugin",
+                plugin_config={},
+            ),
+        ),
+        contract_snapshot_factory=None,
+        leader_receipt=leader_receipt,
+    )
+
+
+def test_validators_vote_on_the_state_hash():
+    node = validator_node(receipt(b"state"))
+
+    agreeing = node.parse_transaction_execution_receipt(receipt(b"state"))
+    disagreeing = node.parse_transaction_execution_receipt(receipt(b"other state"))
+
+    assert agreeing.vote == Vote.AGREE
+    assert disagreeing.vote == Vote.DISAGREE
+    # Only the hash of the state of validators is kept
+    assert agreeing.contract_state is None
+    assert agreeing.to_dict()["contract_state_hash"] == state_hash(b"state")
+    assert "contract_state" not in agreeing.to_dict()
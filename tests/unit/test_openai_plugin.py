@@ -0,0 +1,104 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from backend.node.genvm.llm_clients import close_llm_clients
+from backend.node.genvm.llms import OpenAIPlugin
+
+CHUNKS = ["The answer", " is ", "42", "."]
+CHUNK_DELAY = 0.1
+CONCURRENT_CALLS = 5
+
+
+def sse_chunk(content: str | None, finish_reason: str | None = None) -> bytes:
+    chunk = {
+        "id": "chatcmpl-1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [
+            {
+                "index": 0,
+                "delta": {"content": content} if content is not None else {},
+                "finish_reason": finish_reason,
+            }
+        ],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+def start_openai_server() -> tuple[asyncio.AbstractEventLoop, web.AppRunner, int]:
+    async def chat_completions(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for content in CHUNKS:
+            # The delay of the LLM generating the next tokens
+            await asyncio.sleep(CHUNK_DELAY)
+            await response.write(sse_chunk(content))
+        await response.write(sse_chunk(None, "stop"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start() -> tuple[web.AppRunner, int]:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", chat_completions)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return runner, site._server.sockets[0].getsockname()[1]
+
+    # The server has its own loop, a plugin blocking the loop of the test fails the test instead of deadlocking it
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    runner, port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    return loop, runner, port
+
+
+@pytest_asyncio.fixture
+async def openai_server(monkeypatch):
+    loop, runner, port = start_openai_server()
+    monkeypatch.setenv("TEST_OPENAI_API_KEY", "key")
+    yield {
+        "model": "gpt-4o",
+        "config": {},
+        "plugin_config": {
+            "api_key_env_var": "TEST_OPENAI_API_KEY",
+            "api_url": f"http://127.0.0.1:{port}/v1",
+        },
+    }
+    await close_llm_clients()
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+async def call(node_config: dict, regex: str | None = None) -> str:
+    plugin = OpenAIPlugin(node_config["plugin_config"])
+    return await plugin.call(node_config, "prompt", regex, None)
+
+
+@pytest.mark.asyncio
+async def test_openai_call(openai_server):
+    assert await call(openai_server) == "".join(CHUNKS)
+    assert await call(openai_server, r"\d+") == "42"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_openai_calls_overlap(openai_server):
+    single_call_time = len(CHUNKS) * CHUNK_DELAY
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(call(openai_server) for _ in range(CONCURRENT_CALLS))
+    )
+    elapsed = time.perf_counter() - start
+
+    assert results == ["".join(CHUNKS)] * CONCURRENT_CALLS
+    # Blocking the event loop while streaming would take CONCURRENT_CALLS * single_call_time
+    assert elapsed < 2 * single_call_time
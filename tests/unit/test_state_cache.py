@@ -0,0 +1,108 @@
+import pickle
+import threading
+
+from backend.database_handler.state_codec import state_hash
+from backend.node.genvm.state_cache import StateCache
+
+
+class Contract:
+    def __init__(self):
+        self.items = []
+
+
+STATE = pickle.dumps(Contract())
+OTHER_STATE = pickle.dumps(["other"])
+
+
+def use(cache: StateCache, contract_address: str, state: bytes = STATE) -> Contract:
+    with cache.use_instance(contract_address, state_hash(state), lambda: state) as c:
+        return c
+
+
+def test_states_are_loaded_once():
+    cache = StateCache(max_entries=10)
+    loads = []
+
+    def load_state():
+        loads.append(1)
+        return STATE
+
+    for _ in range(3):
+        with cache.use_instance("0x1", state_hash(STATE), load_state) as contract:
+            assert contract.items == []
+
+    assert len(loads) == 1
+    metrics = cache.get_metrics()
+    assert metrics["hits"] == 2
+    assert metrics["misses"] == 1
+
+
+def test_modified_states_are_dropped():
+    cache = StateCache(max_entries=10)
+    with cache.use_instance("0x1", state_hash(STATE), lambda: STATE) as contract:
+        contract.items.append("modified by a getter")
+
+    assert use(cache, "0x1").items == []
+    metrics = cache.get_metrics()
+    assert metrics["modifications"] == 1
+    assert metrics["misses"] == 2
+
+
+def test_states_modified_by_failing_getters_are_dropped():
+    cache = StateCache(max_entries=10)
+    try:
+        with cache.use_instance("0x1", state_hash(STATE), lambda: STATE) as contract:
+            contract.items.append("modified by a getter")
+            raise ValueError()
+    except ValueError:
+        pass
+
+    assert use(cache, "0x1").items == []
+
+
+def test_instances_are_used_by_one_call_at_a_time():
+    cache = StateCache(max_entries=10)
+    used = []
+    first_call = threading.Event()
+    second_call = threading.Event()
+
+    def read():
+        with cache.use_instance("0x1", state_hash(STATE), lambda: STATE) as contract:
+            used.append(contract)
+            first_call.set()
+            second_call.wait(5)
+
+    use(cache, "0x1")
+    thread = threading.Thread(target=read)
+    thread.start()
+    first_call.wait(5)
+    used.append(use(cache, "0x1"))
+    second_call.set()
+    thread.join()
+
+    assert used[0] is not used[1]
+    assert cache.get_metrics()["entries"] == 1
+
+
+def test_states_are_invalidated_per_contract():
+    cache = StateCache(max_entries=10)
+    use(cache, "0x1", STATE)
+    use(cache, "0x1", OTHER_STATE)
+    use(cache, "0x2", STATE)
+
+    cache.invalidate("0x1")
+
+    metrics = cache.get_metrics()
+    assert metrics["entries"] == 1
+    assert metrics["invalidations"] == 2
+
+
+def test_least_recently_used_states_are_evicted():
+    cache = StateCache(max_entries=1)
+    use(cache, "0x1")
+    use(cache, "0x2")
+    use(cache, "0x1")
+
+    metrics = cache.get_metrics()
+    assert metrics["evictions"] == 2
+    assert metrics["misses"] == 3
@@ -0,0 +1,28 @@
+import pytest
+
+from backend.database_handler.state_codec import (
+    compress_state,
+    decompress_state,
+    state_hash,
+)
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib"])
+def test_state_round_trip(monkeypatch, codec):
+    monkeypatch.setenv("CONTRACT_STATE_COMPRESSION", codec)
+    state = b"contract state" * 100
+
+    compressed, used_codec = compress_state(state)
+
+    assert used_codec == codec
+    assert decompress_state(compressed, used_codec) == state
+
+
+def test_state_hash_is_independent_of_compression():
+    assert state_hash(b"state") == state_hash(decompress_state(b"state", "none"))
+
+
+def test_unknown_codec(monkeypatch):
+    monkeypatch.setenv("CONTRACT_STATE_COMPRESSION", "brotli")
+    with pytest.raises(ValueError):
+        compress_state(b"state")
@@ -0,0 +1,155 @@
+import random
+import re
+import sys
+
+import pytest
+
+from backend.node.genvm import streaming_regex
+from backend.node.genvm.streaming_regex import (
+    ANALYZED_PYTHON_VERSIONS,
+    StreamingRegexMatcher,
+    UnsupportedOpcode,
+    get_reach,
+)
+
+FUZZ_ITERATIONS = 3000
+
+PATTERNS = [
+    r"ab",
+    r"a|bc",
+    r"\d{1,3}",
+    r"a{2,4}?b",
+    r"(yes|no)\b",
+    r"\bab\b",
+    r"^ab",
+    r"(?m)^b.$",
+    r"ab$",
+    r"a\Z",
+    r"\Aa",
+    r"(?<=ab)c",
+    r"(?<!a)bc",
+    r"a(?=bc)",
+    r"a(?!b)",
+    r"(?:ab|c){2}",
+    r"(a)?(?(1)b|c)",
+    r"(?>ab|a)c",
+    r"a++b",
+    r"(?i)AB",
+    r"[^ab\n]c",
+    r"a*",
+    r"\{.*\}",
+    r"\{.*?\}",
+    r"(?s)a.+c",
+    r"(a)b\1",
+    r"a\d+c",
+    r"(?m)^b.*c",
+    r"(?<=a)b.*c$",
+    r"(?:a{1,2}){1,2}(?:b*)",
+]
+
+
+def search_whole_text(regex: str, chunks: list[str]) -> tuple[int, str | None]:
+    """What the plugins used to do, searching the whole text on every chunk"""
+    buffer = ""
+    for index, chunk in enumerate(chunks):
+        buffer += chunk
+        match = re.search(regex, buffer)
+        if match:
+            return index, match.group(0)
+    return len(chunks), None
+
+
+def search_streaming(regex: str, chunks: list[str]) -> tuple[int, str | None]:
+    matcher = StreamingRegexMatcher(regex)
+    for index, chunk in enumerate(chunks):
+        match = matcher.feed(chunk)
+        if match is not None:
+            assert matcher.buffer == "".join(chunks[: index + 1])
+            return index, match
+    assert matcher.buffer == "".join(chunks)
+    return len(chunks), None
+
+
+def test_fuzz_same_matches_as_searching_the_whole_text():
+    rng = random.Random(0)
+    for _ in range(FUZZ_ITERATIONS):
+        regex = rng.choice(PATTERNS)
+        text = "".join(
+            rng.choice(["a", "b", "c", "\n", " ", "{", "}", "1", "yes", "ab"])
+            for _ in range(rng.randrange(60))
+        )
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text), 8)))
+        chunks = [text[i:j] for i, j in zip([0, *cuts], [*cuts, len(text)])]
+
+        assert search_streaming(regex, chunks) == search_whole_text(regex, chunks)
+
+
+def test_long_output():
+    chunks = [f"token {i} " for i in range(5000)] + ["Answer: yes."]
+
+    assert search_streaming(r"Answer: (yes|no)\b", chunks) == (5000, "Answer: yes")
+
+
+@pytest.mark.parametrize(
+    "regex,ahead",
+    [
+        (r"ab", 2),
+        (r"\d{1,3}", 3),
+        (r"(yes|no)\b", 5),
+        (r"a(?=bcd)", 4),
+        (r"\{.*\}", None),
+        (r"(a)b\1", None),
+    ],
+)
+def test_reach(regex, ahead):
+    assert get_reach(regex) == ahead
+
+
+def test_without_regex():
+    matcher = StreamingRegexMatcher(None)
+
+    assert matcher.feed("abc") is None
+    assert matcher.feed("def") is None
+    assert matcher.buffer == "abcdef"
+
+
+def test_python_version_is_analyzed():
+    # Check that `_item_reach` handles all the opcodes of `re._parser` before adding a version
+    assert sys.version_info[:2] in ANALYZED_PYTHON_VERSIONS
+
+
+@pytest.mark.parametrize(
+    "regex",
+    PATTERNS + [r"[^a]", r"[a-z\d]", r"\w\s", r"(?P<n>a)(?P=n)", r"(?i:a)"],
+)
+def test_all_opcodes_are_known(regex):
+    # Raises `UnsupportedOpcode` on opcodes added by new Python versions
+    get_reach(regex)
+
+
+def test_unknown_opcodes_raise():
+    # Categories are only valid inside sets
+    category = streaming_regex.parser.parse(r"[\d]")[0][1][0]
+
+    with pytest.raises(UnsupportedOpcode):
+        streaming_regex._pattern_reach([category])
+
+
+@pytest.mark.parametrize("fallback", ["missing_parser", "unknown_version", "error"])
+def test_fallback_searches_the_whole_text(monkeypatch, fallback):
+    if fallback == "missing_parser":
+        monkeypatch.setattr(streaming_regex, "parser", None)
+    elif fallback == "unknown_version":
+        monkeypatch.setattr(streaming_regex, "ANALYZED_PYTHON_VERSIONS", set())
+    else:
+
+        def get_reach(regex: str):
+            raise UnsupportedOpcode("OPCODE")
+
+        monkeypatch.setattr(streaming_regex, "get_reach", get_reach)
+
+    chunks = ["{", "a", "b} Answer", ": yes", "."]
+    for regex in [r"Answer: (yes|no)\b", r"\{.*\}", r"(a)b\1"]:
+        matcher = StreamingRegexMatcher(regex)
+        assert matcher.reach is None and matcher.head is None
+        assert search_streaming(regex, chunks) == search_whole_text(regex, chunks)